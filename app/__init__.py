@@ -2,6 +2,8 @@ from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 import os
+import atexit
+from datetime import timedelta
 
 # App configuration
 LSTM_MODEL_PATH = "./config/plant_health_lstm_model.h5"
@@ -10,7 +12,98 @@ LABEL_ENCODER_PATH = "./config/label_encoder.pkl"
 FEATURE_COLUMNS_PATH = "./config/feature_columns.pkl"
 MODEL_CONFIG_PATH = "./config/model_config.pkl"
 MODEL_PATH = "./data/processed/plant_health_prediction_model.joblib"
-HISTORY_FILE = "./data/history/plant_history.json"
+HISTORY_FILE = "./data/history/plant_history.tsc"  # Compressed; seeded from plant_history.json if missing
+
+# Readings older than this are dropped as new ones arrive; raise it before backfilling longer histories (None keeps all)
+HISTORY_RETENTION_DAYS = 30
+
+# Memory budget for plant histories; least recently used plants spill to disk (None disables)
+HISTORY_MEMORY_BUDGET = 256 * 1024 * 1024  # Bytes
+HISTORY_SPILL_DIR = "./data/history/spill"
+
+# Feature store: model features materialized with each stored reading, for inference and training
+FEATURE_STORE_ENABLED = True
+
+# Fleet overview: plants without a reading for this long count as stale
+OVERVIEW_STALE_AFTER = 600.0  # Seconds
+OVERVIEW_PUSH_INTERVAL = 1.0  # Seconds between summary stream pushes of changed plants
+OVERVIEW_MAX_PAGE = 500
+
+# Streaming history export: rows per batch, each followed by a resume cursor
+EXPORT_BATCH_ROWS = 1000
+
+# Historical backfill import: readings parsed and stored per chunk
+BACKFILL_CHUNK_ROWS = 50000
+
+# Versioned model artifacts: MODEL_REGISTRY_DIR/<version>/; the paths above are the fallback
+MODEL_REGISTRY_DIR = "./config/models"
+
+# Batch sizes the compiled LSTM predict is warmed up for at load time
+LSTM_WARMUP_BATCH_SIZES = (1, 32)
+
+# Request profiling (opt-in)
+PROFILING_ENABLED = False
+PROFILE_SAMPLE_RATE = 0.01  # Fraction of profiled endpoints to sample
+PROFILE_HEADER = "X-Profile-Request"  # Requests with this header are always profiled
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_HISTORY_SIZE = 50
+
+# Background forecast precomputation
+FORECAST_SCHEDULER_ENABLED = True
+FORECAST_WORKERS = 2
+FORECAST_CPU_BUDGET = 1.0  # Cores the forecast workers may use on average
+
+# Latency budget of /forecast requests without ?budget_ms=; late forecasts are degraded (None waits)
+FORECAST_BUDGET_MS = 1000
+
+# Weight of each model in /predict/<id>?mode=ensemble
+ENSEMBLE_WEIGHTS = {"traditional": 0.5, "lstm": 0.5}
+
+# Change-detection gate: readings that barely moved reuse the last inference
+CHANGE_DETECTION_ENABLED = True
+CHANGE_DETECTION_ALPHA = 0.1  # EWMA weight of the newest reading
+CHANGE_DETECTION_THRESHOLD = 3.0  # Drift, in EWMA standard deviations, that forces inference
+CHANGE_DETECTION_MAX_STALENESS = 300.0  # Seconds a reused result may age before inference reruns
+CHANGE_DETECTION_WARMUP = 10  # Readings per plant that always run inference
+
+# Server-side alerts, evaluated as readings are stored; durations in seconds, rates per hour
+ALERTS_ENABLED = True
+ALERT_RULES = [
+    {"id": "soil_moisture_low", "sensor": "Soil_Moisture", "condition": "below", "value": 20,
+     "duration": 6 * 3600, "severity": "warning", "message": "Soil moisture below 20% for 6 hours"},
+    {"id": "soil_moisture_critical", "sensor": "Soil_Moisture", "condition": "below", "value": 10,
+     "duration": 3600, "severity": "critical", "message": "Soil moisture below 10% for an hour"},
+    {"id": "soil_moisture_drop", "sensor": "Soil_Moisture", "condition": "rate_below", "value": -10,
+     "duration": 1800, "severity": "warning", "message": "Soil moisture dropping faster than 10% per hour"},
+    {"id": "soil_temperature_high", "sensor": "Soil_Temperature", "condition": "above", "value": 35,
+     "duration": 3600, "severity": "warning", "message": "Soil temperature above 35°C for an hour"},
+    {"id": "soil_ph_low", "sensor": "Soil_pH", "condition": "below", "value": 5.5,
+     "duration": 3 * 3600, "severity": "warning"},
+    {"id": "soil_ph_high", "sensor": "Soil_pH", "condition": "above", "value": 8.0,
+     "duration": 3 * 3600, "severity": "warning"},
+    {"id": "high_stress", "condition": "health", "value": "High Stress", "severity": "critical",
+     "message": "Plant predicted to be under high stress"}
+]
+ALERT_RATE_SPAN = 15 * 60  # Seconds a rate of change is measured over, at least
+
+# Admission control for HTTP ingest; reads keep reserved capacity
+ADMISSION_CONTROL_ENABLED = True
+INGEST_DEVICE_RATE = 5.0  # Readings per second per plant
+INGEST_DEVICE_BURST = 20
+INGEST_MAX_DEVICES = 10000  # Device buckets kept, least recently used dropped first
+INGEST_GLOBAL_RATE = 200.0  # Readings per second across all plants
+INGEST_GLOBAL_BURST = 400
+MAX_IN_FLIGHT_REQUESTS = 16
+RESERVED_READ_SLOTS = 4  # In-flight slots ingest may never take
+ADMISSION_QUEUE_TIMEOUT = 0.25  # Seconds a request may wait for a slot before a 429
+
+# Binary sensor frame ingestion (disabled when None)
+UDP_INGEST_HOST = "0.0.0.0"
+UDP_INGEST_PORT = None
+MQTT_BROKER_HOST = None
+MQTT_BROKER_PORT = 1883
+MQTT_INGEST_TOPIC = "plants/+/frames"
+BINARY_PERSIST_INTERVAL = 5.0  # Seconds between history saves for binary ingestion
 
 def create_app():
     # Create Flask app
@@ -30,16 +123,98 @@ def create_app():
     from app.services.data_service import DataService
     from app.services.model_service import ModelService
     from app.services.forecast_service import ForecastService
+    from app.services.ingest_service import IngestService
+    from app.services.export_service import ExportService
+    from app.services.backfill_service import BackfillService
+    
+    retention = timedelta(days=HISTORY_RETENTION_DAYS) if HISTORY_RETENTION_DAYS is not None else None
+    
+    # Features are computed over the retained history, as process_for_prediction sees it
+    feature_store = None
+    if FEATURE_STORE_ENABLED:
+        from app.services.feature_store import FeatureStore
+        feature_store = FeatureStore(window=retention)
     
     # Initialize services
-    data_service = DataService(HISTORY_FILE)
+    data_service = DataService(HISTORY_FILE, HISTORY_MEMORY_BUDGET, HISTORY_SPILL_DIR, OVERVIEW_STALE_AFTER,
+                               feature_store, retention)
     model_service = ModelService(MODEL_PATH, LSTM_MODEL_PATH, FEATURE_SCALER_PATH, 
-                                LABEL_ENCODER_PATH, FEATURE_COLUMNS_PATH, MODEL_CONFIG_PATH)
-    forecast_service = ForecastService(model_service, data_service)
+                                LABEL_ENCODER_PATH, FEATURE_COLUMNS_PATH, MODEL_CONFIG_PATH,
+                                lstm_warmup_batch_sizes=LSTM_WARMUP_BATCH_SIZES,
+                                registry_dir=MODEL_REGISTRY_DIR)
+    forecast_service = ForecastService(model_service, data_service, ENSEMBLE_WEIGHTS)
+    model_service.swap_listeners.append(forecast_service.on_model_swap)
+    export_service = ExportService(data_service, EXPORT_BATCH_ROWS)
+    
+    forecast_scheduler = None
+    if FORECAST_SCHEDULER_ENABLED:
+        from app.services.forecast_scheduler import ForecastScheduler
+        forecast_scheduler = ForecastScheduler(
+            forecast_service, data_service, FORECAST_WORKERS, FORECAST_CPU_BUDGET
+        )
+        model_service.swap_listeners.append(forecast_scheduler.notify_model_changed)
+    
+    change_detector = None
+    if CHANGE_DETECTION_ENABLED:
+        from app.services.change_detector import ChangeDetector
+        from app.services.ingest_service import CHANGE_FIELDS
+        change_detector = ChangeDetector(CHANGE_FIELDS, CHANGE_DETECTION_ALPHA, CHANGE_DETECTION_THRESHOLD,
+                                         CHANGE_DETECTION_MAX_STALENESS, CHANGE_DETECTION_WARMUP)
+    
+    alert_engine = None
+    if ALERTS_ENABLED:
+        from app.services.alert_engine import AlertEngine
+        alert_engine = AlertEngine(ALERT_RULES, rate_span=ALERT_RATE_SPAN)
+        data_service.append_listeners.append(alert_engine.observe)
+    
+    ingest_service = IngestService(data_service, forecast_service, forecast_scheduler, change_detector,
+                                   alert_engine)
+    backfill_service = BackfillService(data_service, ingest_service, BACKFILL_CHUNK_ROWS)
+    
+    profiling_service = None
+    if PROFILING_ENABLED:
+        from app.services.profiling_service import ProfilingService
+        profiling_service = ProfilingService(PROFILE_SAMPLE_RATE, PROFILE_INTERVAL,
+                                             PROFILE_HISTORY_SIZE)
+    
+    admission_controller = None
+    if ADMISSION_CONTROL_ENABLED:
+        from app.services.admission_service import AdmissionController
+        admission_controller = AdmissionController(INGEST_DEVICE_RATE, INGEST_DEVICE_BURST, INGEST_GLOBAL_RATE,
+                                                   INGEST_GLOBAL_BURST, MAX_IN_FLIGHT_REQUESTS,
+                                                   RESERVED_READ_SLOTS, ADMISSION_QUEUE_TIMEOUT, INGEST_MAX_DEVICES)
     
     # Register routes
     from app.routes.api import register_routes
-    register_routes(flask_app, socketio, model_service, data_service, forecast_service)
+    register_routes(flask_app, socketio, model_service, data_service, forecast_service, ingest_service,
+                    profiling_service=profiling_service, profile_header=PROFILE_HEADER,
+                    forecast_scheduler=forecast_scheduler, admission_controller=admission_controller,
+                    alert_engine=alert_engine, overview_push_interval=OVERVIEW_PUSH_INTERVAL,
+                    overview_max_page=OVERVIEW_MAX_PAGE, export_service=export_service,
+                    backfill_service=backfill_service, forecast_budget_ms=FORECAST_BUDGET_MS)
+    
+    if forecast_scheduler is not None:
+        forecast_scheduler.start()
+    
+    # Start binary ingestion listeners
+    # Listeners save the history on a timer; stopping them saves what is left
+    if UDP_INGEST_PORT is not None:
+        from app.services.binary_ingest import UdpIngestListener
+        udp_listener = UdpIngestListener(ingest_service, UDP_INGEST_HOST, UDP_INGEST_PORT,
+                                         persist_interval=BINARY_PERSIST_INTERVAL)
+        udp_listener.start()
+        atexit.register(udp_listener.stop)
+    
+    if MQTT_BROKER_HOST is not None:
+        import paho.mqtt.client as mqtt
+        from app.services.binary_ingest import MqttIngestListener
+        mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        mqtt_client.connect(MQTT_BROKER_HOST, MQTT_BROKER_PORT)
+        mqtt_listener = MqttIngestListener(ingest_service, mqtt_client, MQTT_INGEST_TOPIC,
+                                           persist_interval=BINARY_PERSIST_INTERVAL)
+        mqtt_listener.start()
+        atexit.register(mqtt_listener.stop)
+        mqtt_client.loop_start()
     
     # Create an app instance object that holds both the Flask app and socketio
     class AppInstance:
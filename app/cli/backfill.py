@@ -0,0 +1,76 @@
+# backfill.py
+# Bulk-import months of historical readings into plant history.
+#
+#   python -m app.cli.backfill data/raw/plant_health_data.csv
+#   python -m app.cli.backfill logger.ndjson --retention-days 400
+#   python -m app.cli.backfill data/raw/plant_health_data.csv --url http://localhost:5000
+#
+# Readings are streamed in chunks and bulk-appended per plant, sorted and
+# deduplicated, with no per-reading inference or history saves. By default the
+# history file is imported into directly, so the service must be stopped; it
+# keeps at most HISTORY_RETENTION_DAYS of history, so raise that for longer
+# backfills; --retention-days should match the service's setting, since stored
+# features are computed over that window. With --url the file is streamed to a running service's
+# POST /backfill instead, which also runs one catch-up inference per plant.
+import sys
+import json
+import argparse
+from datetime import timedelta
+
+from app.utils.history_readers import iter_readings
+
+def import_local(args):
+    import app as app_pkg
+    from app.services.data_service import DataService
+    from app.services.backfill_service import BackfillService
+
+    retention = timedelta(days=args.retention_days) if args.retention_days is not None else None
+    feature_store = None
+    if app_pkg.FEATURE_STORE_ENABLED:
+        from app.services.feature_store import FeatureStore
+        feature_store = FeatureStore(window=retention)
+
+    data_service = DataService(args.history_file, app_pkg.HISTORY_MEMORY_BUDGET, app_pkg.HISTORY_SPILL_DIR,
+                               feature_store=feature_store, retention=retention)
+    backfill_service = BackfillService(data_service, chunk_rows=args.chunk_rows)
+    return backfill_service.run(iter_readings(args.input, args.chunk_rows), catch_up=False)
+
+def import_remote(args):
+    import requests
+
+    data_format = 'csv' if args.input.endswith('.csv') else 'ndjson'
+    with open(args.input, 'rb') as f:
+        response = requests.post(f"{args.url.rstrip('/')}/backfill", data=f, params={"format": data_format},
+                                 headers={"Content-Type": "text/csv" if data_format == 'csv'
+                                          else "application/x-ndjson"})
+    summary = response.json()
+    if response.status_code != 200:
+        raise RuntimeError(summary.get('error', f"HTTP {response.status_code}"))
+    return summary
+
+def main():
+    import app as app_pkg
+
+    parser = argparse.ArgumentParser(description='Bulk-import historical plant readings')
+    parser.add_argument('input', help='Readings: raw CSV or NDJSON (history JSON and .tsc work locally too)')
+    parser.add_argument('--url', help='Send to a running service instead of the history file')
+    parser.add_argument('--history-file', default=app_pkg.HISTORY_FILE)
+    parser.add_argument('--retention-days', type=int, default=app_pkg.HISTORY_RETENTION_DAYS,
+                        help='Drop readings older than this many days (local import)')
+    parser.add_argument('--chunk-rows', type=int, default=app_pkg.BACKFILL_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    try:
+        summary = import_remote(args) if args.url else import_local(args)
+    except Exception as e:
+        print(f"Error importing {args.input}: {e}")
+        sys.exit(1)
+
+    print(json.dumps(summary, indent=2))
+    print(f"Stored {summary['stored']} of {summary['readings']} readings for {summary['plants']} plants "
+          f"in {summary['seconds']:.1f}s ({summary['readings_per_second']:,} readings/s)")
+    if summary.get('errors'):
+        print(f"Skipped {summary['invalid']} invalid readings; {len(summary['errors'])} errors listed above")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# score.py
+# Offline batch scoring of exported plant history.
+#
+#   python -m app.cli.score data/history/plant_history.json -o scores.parquet
+#   python -m app.cli.score data/raw/plant_health_data.csv -o scores.csv --workers 8
+#   python -m app.cli.score history.ndjson -o scores.parquet --forecast-days 3
+#
+# Every reading gets the health label the service would have given it when it
+# arrived: readings are featurized against the plant's trailing retention
+# window with the vectorized data_processor logic and scored across a process
+# pool. Histories the service saved carry those features already and are
+# scored as stored. Input is streamed in chunks and only a retention window per
+# plant is carried between chunks, so memory stays bounded whatever the file size.
+import os
+import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet output is optional; CSV is always available
+    pyarrow = None
+
+from app.services.data_service import DataService, HISTORY_RETENTION
+from app.utils.data_processor import featurize_history, prediction_feature_columns
+from app.utils.history_readers import iter_readings
+
+# Per-process model state, set by _init_worker
+_worker = {}
+
+def _init_worker(with_forecasts):
+    """Load the active model version once per worker process"""
+    import app as app_pkg
+    from app.services.model_service import ModelService, ModelBundle, LEGACY_VERSION, read_active_version
+
+    if with_forecasts:
+        # Forecasts need the LSTM and the full service
+        model_service = ModelService(app_pkg.MODEL_PATH, app_pkg.LSTM_MODEL_PATH, app_pkg.FEATURE_SCALER_PATH,
+                                     app_pkg.LABEL_ENCODER_PATH, app_pkg.FEATURE_COLUMNS_PATH,
+                                     app_pkg.MODEL_CONFIG_PATH, registry_dir=app_pkg.MODEL_REGISTRY_DIR)
+        _worker['model_service'] = model_service
+        _worker['bundle'] = model_service.get_bundle()
+    else:
+        # Labels only need the traditional model of the active version
+        version = read_active_version(app_pkg.MODEL_REGISTRY_DIR)
+        if version is not None:
+            bundle = ModelBundle.from_directory(version, os.path.join(app_pkg.MODEL_REGISTRY_DIR, version))
+        else:
+            bundle = ModelBundle(LEGACY_VERSION, app_pkg.MODEL_PATH, app_pkg.LSTM_MODEL_PATH,
+                                 app_pkg.FEATURE_SCALER_PATH, app_pkg.LABEL_ENCODER_PATH,
+                                 app_pkg.FEATURE_COLUMNS_PATH, app_pkg.MODEL_CONFIG_PATH)
+        bundle._load_traditional_model()
+        _worker['bundle'] = bundle
+
+def score_rows(history, is_new):
+    """Featurize a plant's rows and score the new ones; the rest is carried context"""
+    bundle = _worker['bundle']
+    if set(prediction_feature_columns(history.columns)) <= set(history.columns):
+        # Exported with the features the service materialized on arrival
+        featurized = history[is_new]
+    else:
+        featurized = featurize_history(history)[is_new]
+
+    # Present features in the order the model was fitted with
+    columns = getattr(bundle.model, 'feature_names_in_', None)
+    model_input = featurized[list(columns)] if columns is not None else featurized
+    proba = bundle.predict_traditional_proba(model_input)
+    if proba is None:
+        raise RuntimeError("Traditional model unavailable")
+    classes, probabilities = proba
+
+    scores = pd.DataFrame({
+        'Plant_ID': featurized['Plant_ID'].to_numpy(),
+        'Timestamp': featurized['Timestamp'].to_numpy(),
+        'predicted_health': classes[probabilities.argmax(axis=1)],
+    })
+    for i, class_name in enumerate(classes):
+        scores[f'confidence_{class_name}'] = probabilities[:, i]
+    if 'Plant_Health_Status' in featurized.columns:
+        scores['actual_health'] = featurized['Plant_Health_Status'].to_numpy()
+    scores['model_version'] = bundle.version
+    return scores
+
+def forecast_plant(plant_id, history, days):
+    """Forecast from the end of a plant's history with the service's forecast logic"""
+    from app.services.forecast_service import ForecastService
+
+    forecast_service = ForecastService(_worker['model_service'], _OfflineHistory({plant_id: history}))
+    forecast_data = forecast_service.generate_plant_forecast_data(plant_id, days)
+    if not forecast_data:
+        return None
+
+    rows = []
+    for entry in forecast_data['forecast']:
+        row = {key: value for key, value in entry.items() if key not in ('confidence', 'date')}
+        for class_name, probability in (entry.get('confidence') or {}).items():
+            row[f'confidence_{class_name}'] = probability
+        row['plant_id'] = plant_id
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+class _OfflineHistory:
+    """Read-only stand-in for DataService over histories that are not retention-trimmed"""
+
+    feature_store = None
+
+    def __init__(self, frames):
+        from app.services.history_store import PlantHistory
+        self.histories = {plant_id: PlantHistory(frame) for plant_id, frame in frames.items()}
+
+    def get_snapshot(self, plant_id):
+        history = self.histories.get(plant_id)
+        return history.snapshot() if history is not None else None
+
+class ColumnarWriter:
+    """Appends result frames to a Parquet file (row group per write) or a CSV file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        if self.parquet and pyarrow is None:
+            raise RuntimeError("Parquet output needs pyarrow; install it or write to a .csv path")
+        self._writer = None
+        self._schema = None
+        self.rows = 0
+
+    def write(self, frame):
+        if len(frame) == 0:
+            return
+        if self.parquet:
+            table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = pyarrow.parquet.ParquetWriter(self.path, self._schema, compression='zstd')
+            self._writer.write_table(table.cast(self._schema))
+        else:
+            frame.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def _write_result(writer, plant_id, future):
+    """Write one worker result; a failing plant is reported and skipped"""
+    try:
+        result = future.result()
+    except Exception as e:
+        print(f"Error scoring plant {plant_id}: {e}")
+        return
+    if result is not None:
+        writer.write(result)
+
+def run(args):
+    with_forecasts = args.forecast_days > 0
+    writer = ColumnarWriter(args.output)
+    carried = {}
+    pending = deque()
+    max_pending = args.workers * 4
+    readings = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(with_forecasts,)) as pool:
+        for chunk in iter_readings(args.input, args.chunk_rows):
+            chunk['Timestamp'] = DataService._parse_timestamps(chunk['Timestamp'])
+            readings += len(chunk)
+
+            for plant_id, rows in chunk.groupby('Plant_ID', sort=False):
+                rows = rows.sort_values('Timestamp', kind='stable')
+                context = carried.get(plant_id)
+                if context is not None:
+                    history = pd.concat([context, rows], ignore_index=True)
+                    order = np.argsort(history['Timestamp'].to_numpy(), kind='stable')
+                    history = history.take(order).reset_index(drop=True)
+                    is_new = order >= len(context)
+                else:
+                    history = rows.reset_index(drop=True)
+                    is_new = np.ones(len(history), dtype=bool)
+
+                pending.append((plant_id, pool.submit(score_rows, history, is_new)))
+
+                # Carry the readings still inside the retention window
+                cutoff = history['Timestamp'].iloc[-1] - HISTORY_RETENTION
+                start_row = history['Timestamp'].searchsorted(cutoff, side='right')
+                carried[plant_id] = history.iloc[start_row:].reset_index(drop=True)
+
+                # Bound memory: write finished results in submission order
+                while len(pending) >= max_pending:
+                    _write_result(writer, *pending.popleft())
+
+        while pending:
+            _write_result(writer, *pending.popleft())
+
+        if with_forecasts:
+            forecast_writer = ColumnarWriter(args.forecast_output)
+            futures = [(plant_id, pool.submit(forecast_plant, int(plant_id), history, args.forecast_days))
+                       for plant_id, history in carried.items()]
+            for plant_id, future in futures:
+                _write_result(forecast_writer, plant_id, future)
+            forecast_writer.close()
+
+    writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"Scored {writer.rows} of {readings} readings for {len(carried)} plants "
+          f"in {elapsed:.1f}s ({writer.rows / max(elapsed, 1e-9):,.0f} readings/s) -> {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch-score exported plant history')
+    parser.add_argument('input', help='History JSON, raw CSV or NDJSON export')
+    parser.add_argument('-o', '--output', required=True, help='Output .parquet or .csv path')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--forecast-days', type=int, default=0,
+                        help='Also forecast each plant from the end of its history')
+    parser.add_argument('--forecast-output', help='Forecast output path (default: <output>.forecast.<ext>)')
+    args = parser.parse_args()
+
+    if args.forecast_days > 0 and not args.forecast_output:
+        root, ext = os.path.splitext(args.output)
+        args.forecast_output = f"{root}.forecast{ext}"
+
+    try:
+        run(args)
+    except Exception as e:
+        print(f"Error scoring {args.input}: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
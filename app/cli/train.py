@@ -0,0 +1,58 @@
+# train.py
+# Retrain the LSTM forecaster and publish it as a model registry version.
+#
+#   python -m app.cli.train data/raw/plant_health_data.csv --version 2025-05-01
+#   python -m app.cli.train history.ndjson --version v3 --epochs 30 --threads 8
+#
+# The new version is written to config/models/<version>/ together with the
+# active RandomForest; activate it with POST /models/activate.
+import os
+import sys
+import argparse
+
+from app.utils.history_readers import iter_readings
+
+def main():
+    import app as app_pkg
+    from app.models.lstm_forecaster import LSTMForecaster
+    from app.services.model_service import MODEL_FILE, read_active_version
+
+    parser = argparse.ArgumentParser(description='Train the LSTM forecaster')
+    parser.add_argument('input', help='Labelled readings: raw CSV, history JSON or NDJSON')
+    parser.add_argument('--version', required=True, help='Registry version to write')
+    parser.add_argument('--registry-dir', default=app_pkg.MODEL_REGISTRY_DIR)
+    parser.add_argument('--sequence-length', type=int, default=6)
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--work-dir', help='Where to keep the on-disk feature file while training')
+    args = parser.parse_args()
+
+    directory = os.path.join(args.registry_dir, args.version)
+    if os.path.exists(directory):
+        print(f"Model version {args.version} already exists in {args.registry_dir}")
+        sys.exit(1)
+
+    # Pair the new LSTM with the RandomForest currently in service
+    active = read_active_version(args.registry_dir)
+    traditional_model_path = (os.path.join(args.registry_dir, active, MODEL_FILE)
+                              if active is not None else app_pkg.MODEL_PATH)
+
+    forecaster = LSTMForecaster(sequence_length=args.sequence_length, epochs=args.epochs,
+                                batch_size=args.batch_size, threads=args.threads,
+                                work_dir=args.work_dir)
+    try:
+        history = forecaster.fit(iter_readings(args.input, args.chunk_rows))
+        forecaster.save(directory, traditional_model_path)
+    except Exception as e:
+        print(f"Error training LSTM forecaster: {e}")
+        sys.exit(1)
+    finally:
+        forecaster.cleanup()
+
+    best = min(history.get('val_loss') or history['loss'])
+    print(f"Saved model version {args.version} to {directory} (best loss {best:.4f})")
+
+if __name__ == "__main__":
+    main()
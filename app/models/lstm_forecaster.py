@@ -1,13 +1,269 @@
-# This file would contain your complete LSTM forecaster class 
-# from your original code, for reference and if needed.
+import os
+import shutil
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import MinMaxScaler, LabelEncoder
+from app.utils.data_processor import process_for_lstm, stored_feature_columns, raw_columns
+from app.services.model_service import (LSTM_MODEL_FILE, FEATURE_SCALER_FILE, LABEL_ENCODER_FILE,
+                                        FEATURE_COLUMNS_FILE, MODEL_CONFIG_FILE, MODEL_FILE)
 
-# You can keep a clean version of your LSTM algorithm here for reference 
-# or for direct use if needed.
+LABEL_COLUMN = 'Plant_Health_Status'
+
+# Columns process_for_lstm keeps that are not model inputs
+NON_FEATURE_COLUMNS = {'Plant_ID', 'Timestamp', LABEL_COLUMN}
 
 class LSTMForecaster:
-    """LSTM-based model for plant health forecasting"""
-    
-    def __init__(self):
-        """LSTM forecaster initialization"""
-        # Implementation moved to ModelService class
-        pass
\ No newline at end of file
+    """LSTM-based model for plant health forecasting
+
+    Training streams readings in chunks. Each plant's rows go through
+    process_for_lstm, carrying a few rows between chunks so rolling features
+    and windows continue across chunk boundaries; histories saved by the
+    service already carry those features and are used as stored. The unscaled float32
+    features are appended to a disk-backed file while the MinMaxScaler is
+    fitted incrementally. Training batches are then gathered from strided
+    sliding-window views over a memory map, scaled per batch and fed through
+    tf.data. Peak memory is one chunk plus a few batches, plus a 4-byte
+    window index and a 1-byte label per reading.
+    """
+
+    def __init__(self, sequence_length=6, feature_columns=None, lstm_units=(64, 32), dropout=0.2,
+                 batch_size=256, epochs=20, learning_rate=1e-3, validation_split=0.1,
+                 threads=None, work_dir=None, seed=0):
+        self.sequence_length = sequence_length
+        self.feature_columns = list(feature_columns) if feature_columns else None
+        self.lstm_units = lstm_units
+        self.dropout = dropout
+        self.batch_size = batch_size
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.validation_split = validation_split
+        self.threads = threads or os.cpu_count() or 1
+        self.work_dir = work_dir
+        self.seed = seed
+
+        # Fitted artifacts
+        self.model = None
+        self.feature_scaler = None
+        self.label_encoder = None
+        self.history = None
+
+        # Prepared dataset
+        self.features = None  # Memory-mapped (rows, n_features) float32, unscaled
+        self.labels = None    # Label code per row
+        self.window_ends = None  # Row index of the last reading of every valid window
+        self._tmp_dir = None
+
+    def prepare(self, chunks):
+        """First pass: featurize chunks to disk, fit the scaler and index the windows
+
+        chunks is an iterable of reading DataFrames, e.g. history_readers.iter_readings.
+        """
+        self._tmp_dir = tempfile.mkdtemp(prefix='lstm-train-', dir=self.work_dir)
+        features_path = os.path.join(self._tmp_dir, 'features.f32')
+
+        scaler = MinMaxScaler()
+        class_codes = {}
+        raw_tails = {}
+        feature_tails = {}
+        label_tails = {}
+        label_parts = []
+        window_parts = []
+        rows_written = 0
+        context = self.sequence_length - 1
+
+        with open(features_path, 'wb') as features_file:
+            for chunk in chunks:
+                if LABEL_COLUMN not in chunk.columns:
+                    raise ValueError(f"Training data needs a {LABEL_COLUMN} column")
+                chunk = chunk.copy()
+                chunk['Timestamp'] = pd.to_datetime(chunk['Timestamp'], format='ISO8601')
+                if self.feature_columns is None:
+                    self.feature_columns = self._infer_feature_columns(chunk)
+                stored = set(stored_feature_columns(raw_columns(chunk.columns))) <= set(chunk.columns)
+
+                for plant_id, rows in chunk.groupby('Plant_ID', sort=False):
+                    rows = rows.sort_values('Timestamp', kind='stable')
+
+                    if stored:
+                        # Materialized by the service's FeatureStore, exactly what it predicted from
+                        processed = rows
+                    else:
+                        # Two raw rows keep rolling means and change rates continuous
+                        raw_tail = raw_tails.get(plant_id)
+                        frame = pd.concat([raw_tail, rows], ignore_index=True) if raw_tail is not None else rows
+                        processed = process_for_lstm(frame.reset_index(drop=True)).iloc[len(frame) - len(rows):]
+                        raw_tails[plant_id] = frame.iloc[-2:]
+
+                    values = self._feature_matrix(processed)
+                    codes = np.array([class_codes.setdefault(label, len(class_codes))
+                                      for label in processed[LABEL_COLUMN]], dtype=np.int8)
+                    scaler.partial_fit(values)
+
+                    # Prefix the previous rows so windows span chunk boundaries
+                    tail = feature_tails.get(plant_id)
+                    if tail is not None:
+                        values = np.concatenate([tail, values])
+                        codes = np.concatenate([label_tails[plant_id], codes])
+                    carried = len(values) - len(processed)
+
+                    features_file.write(values.tobytes())
+                    label_parts.append(codes)
+
+                    # A window ends at every new row with a full sequence behind it
+                    first_end = max(carried, context)
+                    if first_end < len(values):
+                        window_parts.append(np.arange(rows_written + first_end, rows_written + len(values),
+                                                      dtype=np.uint32))
+                    rows_written += len(values)
+
+                    feature_tails[plant_id] = values[-context:] if context else values[:0]
+                    label_tails[plant_id] = codes[-context:] if context else codes[:0]
+
+        if not window_parts:
+            raise ValueError(f"No plant has {self.sequence_length} consecutive readings to train on")
+
+        self.features = np.memmap(features_path, dtype=np.float32, mode='r',
+                                  shape=(rows_written, len(self.feature_columns)))
+
+        # Fit the encoder on sorted class names and remap the provisional codes
+        self.label_encoder = LabelEncoder().fit(sorted(class_codes))
+        remap = np.empty(len(class_codes), dtype=np.int8)
+        for label, code in class_codes.items():
+            remap[code] = self.label_encoder.transform([label])[0]
+        self.labels = remap[np.concatenate(label_parts)]
+
+        self.feature_scaler = scaler
+        self.window_ends = np.concatenate(window_parts)
+        return len(self.window_ends)
+
+    def batches(self, window_ends, shuffle=True, epoch=0):
+        """Yield scaled (X, y) batches gathered from strided window views"""
+        # windows[i] views rows i .. i + sequence_length - 1 without copying
+        windows = sliding_window_view(self.features, self.sequence_length, axis=0)
+
+        # MinMaxScaler as one fused affine transform: X * scale_ + min_
+        scale = self.feature_scaler.scale_.astype(np.float32)
+        offset = self.feature_scaler.min_.astype(np.float32)
+
+        order = window_ends
+        if shuffle:
+            order = np.random.default_rng(self.seed + epoch).permutation(window_ends)
+
+        for start in range(0, len(order), self.batch_size):
+            ends = order[start:start + self.batch_size]
+            X = windows[ends - (self.sequence_length - 1)].transpose(0, 2, 1)
+            yield X * scale + offset, self.labels[ends].astype(np.int32)
+
+    def fit(self, chunks):
+        """Prepare the dataset and train the LSTM on CPU threads"""
+        import tensorflow as tf
+
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(self.threads)
+            tf.config.threading.set_inter_op_parallelism_threads(max(2, self.threads // 2))
+        except RuntimeError:
+            # The runtime is already initialized; keep its thread pools
+            pass
+        tf.keras.utils.set_random_seed(self.seed)
+
+        self.prepare(chunks)
+
+        # Hold out a random share of windows for validation
+        shuffled = np.random.default_rng(self.seed).permutation(self.window_ends)
+        n_validation = int(len(shuffled) * self.validation_split)
+        validation_ends = np.sort(shuffled[:n_validation])
+        train_ends = shuffled[n_validation:]
+
+        self.model = self._build_model(tf)
+        signature = (
+            tf.TensorSpec(shape=(None, self.sequence_length, len(self.feature_columns)), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.int32)
+        )
+        epochs_seen = iter(range(self.epochs))
+        train = tf.data.Dataset.from_generator(
+            lambda: self.batches(train_ends, shuffle=True, epoch=next(epochs_seen, self.epochs)),
+            output_signature=signature
+        ).prefetch(tf.data.AUTOTUNE)
+
+        validation = None
+        if n_validation:
+            validation = tf.data.Dataset.from_generator(
+                lambda: self.batches(validation_ends, shuffle=False),
+                output_signature=signature
+            ).prefetch(tf.data.AUTOTUNE)
+
+        callbacks = [tf.keras.callbacks.EarlyStopping(
+            monitor='val_loss' if validation is not None else 'loss',
+            patience=3, restore_best_weights=True
+        )]
+        result = self.model.fit(train, validation_data=validation, epochs=self.epochs,
+                                callbacks=callbacks, verbose=2)
+        self.history = result.history
+        return self.history
+
+    def save(self, directory, traditional_model_path=None):
+        """Write the artifacts ModelService loads
+
+        With traditional_model_path the RandomForest is copied too, making the
+        directory a complete model registry version.
+        """
+        if self.model is None:
+            raise RuntimeError("Train the forecaster before saving it")
+        os.makedirs(directory, exist_ok=True)
+
+        self.model.save(os.path.join(directory, LSTM_MODEL_FILE))
+        with open(os.path.join(directory, FEATURE_SCALER_FILE), 'wb') as f:
+            pickle.dump(self.feature_scaler, f)
+        with open(os.path.join(directory, LABEL_ENCODER_FILE), 'wb') as f:
+            pickle.dump(self.label_encoder, f)
+        with open(os.path.join(directory, FEATURE_COLUMNS_FILE), 'wb') as f:
+            pickle.dump(self.feature_columns, f)
+        with open(os.path.join(directory, MODEL_CONFIG_FILE), 'wb') as f:
+            pickle.dump({
+                'sequence_length': self.sequence_length,
+                'feature_columns': self.feature_columns,
+                'label_mapping': dict(enumerate(self.label_encoder.classes_))
+            }, f)
+
+        if traditional_model_path:
+            shutil.copy(traditional_model_path, os.path.join(directory, MODEL_FILE))
+
+    def cleanup(self):
+        """Remove the on-disk feature file"""
+        self.features = None
+        if self._tmp_dir:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+    def _build_model(self, tf):
+        layers = [tf.keras.Input(shape=(self.sequence_length, len(self.feature_columns)))]
+        for i, units in enumerate(self.lstm_units):
+            layers.append(tf.keras.layers.LSTM(units, return_sequences=i < len(self.lstm_units) - 1))
+            layers.append(tf.keras.layers.Dropout(self.dropout))
+        layers.append(tf.keras.layers.Dense(32, activation='relu'))
+        layers.append(tf.keras.layers.Dense(len(self.label_encoder.classes_), activation='softmax'))
+
+        model = tf.keras.Sequential(layers)
+        model.compile(optimizer=tf.keras.optimizers.Adam(self.learning_rate),
+                      loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+        return model
+
+    def _infer_feature_columns(self, chunk):
+        """Numeric columns process_for_lstm produces, in its order"""
+        # Stored prediction-only features (24h averages, stress flags) are not LSTM inputs
+        sample = process_for_lstm(chunk[raw_columns(chunk.columns)].iloc[:3].reset_index(drop=True))
+        return [column for column in sample.columns
+                if column not in NON_FEATURE_COLUMNS and pd.api.types.is_numeric_dtype(sample[column])]
+
+    def _feature_matrix(self, processed):
+        """Feature columns as float32, zeros for missing ones (as the service does)"""
+        values = np.zeros((len(processed), len(self.feature_columns)), dtype=np.float32)
+        for i, feature in enumerate(self.feature_columns):
+            if feature in processed.columns:
+                values[:, i] = processed[feature].to_numpy(dtype=np.float32)
+        
+        # Change rates divide by zero on flat readings
+        return np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
@@ -1,8 +1,89 @@
-from flask import request, jsonify
-from datetime import datetime, timedelta
+from flask import request, jsonify, g, Response, stream_with_context
+from flask_socketio import join_room, leave_room
+import json
+import math
+import time
+from app.utils.encoding import (available_mimetypes, encode_payload, JSON_MIMETYPE,
+                                MSGPACK_MIMETYPE, msgpack)
 
-def register_routes(app, socketio, model_service, data_service, forecast_service):
+# Socket payload encodings clients may opt into: (mimetype, gzip)
+SOCKET_ENCODINGS = {
+    'msgpack': (MSGPACK_MIMETYPE, False),
+    'msgpack+gzip': (MSGPACK_MIMETYPE, True)
+}
+
+def encoded_response(payload):
+    """Respond in the format the client accepts; plain JSON unless asked otherwise"""
+    mimetype = request.accept_mimetypes.best_match(available_mimetypes(), default=JSON_MIMETYPE)
+    if mimetype == JSON_MIMETYPE:
+        return jsonify(payload)
+    
+    compress = 'gzip' in request.accept_encodings
+    response = Response(encode_payload(payload, mimetype, compress), mimetype=mimetype)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    return response
+
+# Endpoints eligible for request profiling
+PROFILED_ENDPOINTS = {'receive_sensor_data', 'predict_plant_health', 'predict_batch',
+                      'forecast_plant_health'}
+
+# Endpoints under admission control: ingest is rate limited, reads get reserved capacity
+ADMISSION_INGEST_ENDPOINTS = {'receive_sensor_data'}
+ADMISSION_READ_ENDPOINTS = {'health_check', 'predict_plant_health', 'predict_batch', 'forecast_plant_health',
+                            'get_alerts', 'plants_overview'}
+
+def register_routes(app, socketio, model_service, data_service, forecast_service, ingest_service,
+                    profiling_service=None, profile_header="X-Profile-Request",
+                    forecast_scheduler=None, admission_controller=None, alert_engine=None,
+                    overview_push_interval=1.0, overview_max_page=500, export_service=None,
+                    backfill_service=None, forecast_budget_ms=None):
     """Register all API routes"""
+    from app.services.latest_index import OVERVIEW_SORTS
+    from app.services.backfill_service import BACKFILL_FORMATS
+    from app.utils.history_readers import iter_stream_readings
+    
+    # Encoding chosen by each socket client, by session id
+    socket_encodings = {}
+    
+    # Summary stream: started by the first overview subscriber
+    overview_stream = {'started': False}
+    
+    def push_overview_changes():
+        """Push the overview rows of plants that changed since the last push"""
+        while True:
+            socketio.sleep(overview_push_interval)
+            rows = data_service.latest.drain_changes()
+            if rows:
+                socketio.emit('overview_update', {'plants': rows}, to='overview')
+    
+    def parse_overview_args(args):
+        """Overview query parameters, or an error message"""
+        sort = args.get('sort', 'stalest')
+        if sort not in OVERVIEW_SORTS:
+            return None, f"sort must be one of {', '.join(OVERVIEW_SORTS)}"
+        stale = args.get('stale')
+        if stale is not None:
+            stale = str(stale).lower() == 'true'
+        try:
+            offset = max(0, int(args.get('offset', 0)))
+            limit = min(max(1, int(args.get('limit', 50))), overview_max_page)
+        except (TypeError, ValueError):
+            return None, "offset and limit must be integers"
+        return {"health": args.get('health'), "stale": stale, "sort": sort,
+                "offset": offset, "limit": limit}, None
+    
+    def emit_update(event, payload):
+        """Emit to JSON clients as before and to each opted-in encoding room"""
+        socketio.emit(event, payload, to='encoding:json')
+        for encoding in set(socket_encodings.values()):
+            mimetype, compress = SOCKET_ENCODINGS[encoding]
+            socketio.emit(event, encode_payload(payload, mimetype, compress), to=f'encoding:{encoding}')
+    
+    ingest_service.emit = emit_update
+    if forecast_scheduler is not None:
+        forecast_scheduler.on_computed = lambda forecast_data: emit_update('plant_forecast_update', forecast_data)
     
     @app.route('/health', methods=['GET'])
     def health_check():
@@ -10,19 +91,83 @@ def register_routes(app, socketio, model_service, data_service, forecast_service
         return jsonify({
             "status": "healthy", 
             "model_loaded": model_service.model is not None,
-            "lstm_model_loaded": model_service.lstm_model is not None
+            "lstm_model_loaded": model_service.lstm_model is not None,
+            "model_version": model_service.version
         })
     
+    @app.route('/models', methods=['GET'])
+    def get_models():
+        """Model registry state: active, previous, available and loading versions"""
+        return jsonify(model_service.status())
+    
+    @app.route('/models/activate', methods=['POST'])
+    def activate_model():
+        """Load a model version in the background and swap it in once warmed up"""
+        data = request.json or {}
+        if 'version' not in data:
+            return jsonify({"error": "Missing required field: version"}), 400
+        
+        version = str(data['version'])
+        if version not in model_service.list_versions():
+            return jsonify({"error": f"Unknown model version: {version}"}), 404
+        
+        error = model_service.activate(version)
+        if error:
+            return jsonify({"error": error}), 409
+        return jsonify(model_service.status()), 202
+    
+    @app.route('/models/rollback', methods=['POST'])
+    def rollback_model():
+        """Swap back to the previously active model version"""
+        if not model_service.rollback():
+            return jsonify({"error": "No previous model version to roll back to"}), 409
+        return jsonify(model_service.status())
+    
     @socketio.on('connect')
     def handle_connect():
         """Handle new websocket connections"""
         print('Client connected')
+        join_room('encoding:json')
         socketio.emit('connection_status', {'status': 'connected'})
     
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle websocket disconnection"""
         print('Client disconnected')
+        socket_encodings.pop(request.sid, None)
+        if forecast_scheduler is not None:
+            forecast_scheduler.unsubscribe(request.sid)
+    
+    @socketio.on('set_encoding')
+    def handle_set_encoding(data):
+        """Switch this client's update payloads to a compact binary encoding"""
+        encoding = (data or {}).get('encoding', 'json')
+        if encoding != 'json' and (encoding not in SOCKET_ENCODINGS or msgpack is None):
+            socketio.emit('encoding_status', {'error': f"Unsupported encoding: {encoding}"}, to=request.sid)
+            return
+        
+        leave_room(f"encoding:{socket_encodings.pop(request.sid, 'json')}")
+        join_room(f'encoding:{encoding}')
+        if encoding != 'json':
+            socket_encodings[request.sid] = encoding
+        socketio.emit('encoding_status', {'encoding': encoding}, to=request.sid)
+    
+    @socketio.on('subscribe_overview')
+    def handle_overview_subscription(data=None):
+        """Send one overview page, then stream rows of plants as they change"""
+        query, error = parse_overview_args(data or {})
+        if error:
+            socketio.emit('overview_status', {'error': error}, to=request.sid)
+            return
+        join_room('overview')
+        socketio.emit('overview_snapshot', data_service.get_overview(**query), to=request.sid)
+        if not overview_stream['started']:
+            overview_stream['started'] = True
+            socketio.start_background_task(push_overview_changes)
+    
+    @socketio.on('unsubscribe_overview')
+    def handle_overview_unsubscription(data=None):
+        leave_room('overview')
     
     @socketio.on('subscribe_plant')
     def handle_plant_subscription(data):
@@ -32,19 +177,24 @@ def register_routes(app, socketio, model_service, data_service, forecast_service
             try:
                 plant_id = int(plant_id)
                 print(f"Client subscribed to plant {plant_id}")
+                if forecast_scheduler is not None:
+                    forecast_scheduler.subscribe(plant_id, request.sid)
                 
                 # Send initial data to the client
-                plant_data = data_service.get_plant_data(plant_id)
-                if plant_data is not None:
+                if data_service.get_history_length(plant_id) > 0:
                     # Send current health status
                     health_data = forecast_service.get_plant_health_data(plant_id)
                     if health_data:
-                        socketio.emit('plant_health_update', health_data)
+                        emit_update('plant_health_update', health_data)
                     
-                    # Send forecast data
-                    forecast_data = forecast_service.generate_plant_forecast_data(plant_id)
+                    # Send forecast data, precomputed when available
+                    forecast_data = None
+                    if forecast_scheduler is not None:
+                        forecast_data = forecast_scheduler.get(plant_id, forecast_scheduler.default_days)
+                    if forecast_data is None:
+                        forecast_data = forecast_service.generate_plant_forecast_data(plant_id)
                     if forecast_data:
-                        socketio.emit('plant_forecast_update', forecast_data)
+                        emit_update('plant_forecast_update', forecast_data)
             except Exception as e:
                 print(f"Error in subscription: {e}")
     
@@ -55,108 +205,129 @@ def register_routes(app, socketio, model_service, data_service, forecast_service
             data = request.get_json()
     
             # Validate required fields
-            required_fields = [
-                'Plant_ID', 
-                'Soil_Temperature', 
-                'Humidity', 
-                'Soil_Moisture'
-            ]
-            
-            for field in required_fields:
-                if field not in data:
-                    return jsonify({"error": f"Missing required field: {field}"}), 400
-    
-            # Define optional fields with default values
-            optional_fields = {
-                'Ambient_Temperature': 22.0,  # Default room temperature
-                'Light_Intensity': 500.0,     # Default medium light
-                'Soil_pH': 7.0,               # Default neutral pH
-                'Nitrogen_Level': 30.0,       # Default values based on training data
-                'Phosphorus_Level': 30.0,
-                'Potassium_Level': 30.0,
-                'Chlorophyll_Content': 35.0,
-                'Electrochemical_Signal': 1.0
-            }
-            
-            # Add default values for missing optional fields
-            for field, default_value in optional_fields.items():
-                if field not in data:
-                    data[field] = default_value
-    
-            # Add timestamp if not provided
-            if 'Timestamp' not in data:
-                data['Timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+            error = ingest_service.validate(data)
+            if error:
+                return jsonify({"error": error}), 400
     
-            # Store data
-            plant_id = data_service.add_sensor_reading(data)
-            
-            # Make a prediction with the new data
-            prediction_result = None
-            try:
-                # Get the plant data
-                plant_df = data_service.get_plant_data(plant_id)
-                if plant_df is not None:
-                    # Prepare real-time update data
-                    health_data = forecast_service.get_plant_health_data(plant_id)
-                    forecast_data = forecast_service.generate_plant_forecast_data(plant_id)
-                    
-                    # Get prediction result
-                    if health_data:
-                        prediction_result = health_data.get('predicted_health')
-                        socketio.emit('plant_health_update', health_data)
-                        
-                    if forecast_data:
-                        socketio.emit('plant_forecast_update', forecast_data)
-                    
-                    # Also emit a general sensor update event
-                    socketio.emit('sensor_reading', {
-                        'plant_id': plant_id,
-                        'timestamp': data['Timestamp'],
-                        'readings': {
-                            'soil_moisture': data['Soil_Moisture'],
-                            'soil_temperature': data['Soil_Temperature'],
-                            'humidity': data['Humidity'],
-                            'ambient_temperature': data['Ambient_Temperature'],
-                            'light_intensity': data['Light_Intensity'],
-                            'soil_ph': data['Soil_pH'],
-                            'nitrogen': data['Nitrogen_Level'],
-                            'phosphorus': data['Phosphorus_Level'],
-                            'potassium': data['Potassium_Level']
-                        }
-                    })
-                    
-            except Exception as e:
-                print(f"Prediction error for new data: {e}")
-    
-            # Return response with prediction if available
-            response = {
-                "received": True,
-                "plant_id": plant_id,
-                "timestamp": data['Timestamp']
-            }
-            
-            if prediction_result:
-                response["predicted_health"] = prediction_result
-                
+            # Store, predict and publish; response carries the prediction if available
+            response = ingest_service.ingest(data)
             return jsonify(response)
     
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
+    @app.route('/plants/overview', methods=['GET'])
+    def plants_overview():
+        """Newest reading and health of many plants, without touching history or models"""
+        query, error = parse_overview_args(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        return encoded_response(data_service.get_overview(**query))
+    
+    @app.route('/export', methods=['GET'])
+    def export_history():
+        """Stream history for offline analysis as NDJSON, resumable with a cursor"""
+        if export_service is None:
+            return jsonify({"error": "Export is not enabled"}), 404
+        try:
+            query, position = export_service.parse_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return Response(stream_with_context(export_service.stream(query, position)),
+                        mimetype='application/x-ndjson')
+    
+    @app.route('/backfill', methods=['POST'])
+    def backfill_history():
+        """Bulk-import historical readings from a CSV or NDJSON body, then infer once per plant"""
+        if backfill_service is None:
+            return jsonify({"error": "Backfill is not enabled"}), 404
+        
+        data_format = request.args.get('format')
+        if data_format is None:
+            data_format = 'ndjson' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv'
+        if data_format not in BACKFILL_FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(BACKFILL_FORMATS)}"}), 400
+        catch_up = request.args.get('infer', 'true').lower() != 'false'
+        
+        try:
+            chunks = iter_stream_readings(request.stream, data_format, backfill_service.chunk_rows)
+            return jsonify(backfill_service.run(chunks, catch_up))
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 409
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route('/plants/residency', methods=['GET'])
+    def plant_residency():
+        """Resident vs spilled plant histories and their memory use"""
+        return jsonify(data_service.get_residency())
+    
+    @app.route('/features/stats', methods=['GET'])
+    def feature_stats():
+        """Features materialized on arrival and the time spent computing them"""
+        if data_service.feature_store is None:
+            return jsonify({"enabled": False})
+        return jsonify(data_service.feature_store.stats())
+    
+    @app.route('/forecast/stats', methods=['GET'])
+    def forecast_stats():
+        """How budgeted forecasts were answered: in full, or with which degradation"""
+        return jsonify(dict(forecast_service.deadline_stats(), default_budget_ms=forecast_budget_ms))
+    
+    @app.route('/ingest/stats', methods=['GET'])
+    def ingest_stats():
+        """Change-detection gate thresholds and how often inference was skipped"""
+        if ingest_service.change_detector is None:
+            return jsonify({"enabled": False})
+        return jsonify(ingest_service.change_detector.stats())
+    
     @app.route('/predict/<int:plant_id>', methods=['GET'])
     def predict_plant_health(plant_id):
         """Predict current plant health based on latest data"""
-        health_data = forecast_service.get_plant_health_data(plant_id)
+        if request.args.get('mode') == 'ensemble':
+            # RandomForest and LSTM side by side, with a combined estimate
+            health_data = forecast_service.get_ensemble_health_data(plant_id)
+        else:
+            health_data = forecast_service.get_plant_health_data(plant_id)
         if health_data:
-            return jsonify(health_data)
+            return encoded_response(health_data)
         else:
             return jsonify({"error": f"No data available for Plant ID {plant_id}"}), 404
     
+    @app.route('/predict/batch', methods=['GET', 'POST'])
+    def predict_batch():
+        """Predict health for many plants with one model pass, streamed as NDJSON"""
+        if request.method == 'POST':
+            body = request.get_json(silent=True) or {}
+            plant_ids = body.get('plant_ids', 'all')
+            include_lstm = bool(body.get('include_lstm', True))
+        else:
+            plant_ids = request.args.get('plant_ids', 'all')
+            if plant_ids != 'all':
+                plant_ids = [pid for pid in plant_ids.split(',') if pid.strip()]
+            include_lstm = request.args.get('include_lstm', 'true').lower() != 'false'
+        
+        try:
+            if plant_ids == 'all':
+                plant_ids = sorted(data_service.get_all_plant_ids())
+            else:
+                plant_ids = [int(pid) for pid in plant_ids]
+        except (TypeError, ValueError):
+            return jsonify({"error": "plant_ids must be a list of integers or \"all\""}), 400
+        
+        def generate():
+            for result in forecast_service.get_batch_health_data(plant_ids, include_lstm):
+                yield json.dumps(result) + "\n"
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
     @app.route('/forecast/<int:plant_id>', methods=['GET'])
     def forecast_plant_health(plant_id):
         """Predict future plant health"""
-        plant_df = data_service.get_plant_data(plant_id)
-        if plant_df is None or len(plant_df) < 6:
+        if data_service.get_history_length(plant_id) < 6:
             return jsonify({
                 "error": f"Not enough data for Plant ID {plant_id}. Need at least 6 readings."
             }), 400
@@ -166,12 +337,179 @@ def register_routes(app, socketio, model_service, data_service, forecast_service
             days = int(request.args.get('days', 3))
             if days > 14:  # Limit forecast length
                 days = 14
+            
+            # Latency budget; past it the answer is degraded rather than late
+            budget_ms = forecast_budget_ms
+            if 'budget_ms' in request.args:
+                try:
+                    budget_ms = float(request.args['budget_ms'])
+                except ValueError:
+                    budget_ms = None
+                if budget_ms is None or not math.isfinite(budget_ms) or budget_ms < 0:
+                    return jsonify({"error": "budget_ms must be a non-negative number of milliseconds"}), 400
+    
+            # Monte Carlo forecast with uncertainty bands, computed on demand
+            if request.args.get('mode') == 'probabilistic':
+                try:
+                    samples = min(int(request.args.get('samples', 200)), 2000)
+                except ValueError:
+                    samples = None
+                if samples is None or samples < 1:
+                    return jsonify({"error": "samples must be an integer of at least 1"}), 400
+                forecast_data = forecast_service.generate_probabilistic_forecast(plant_id, days, samples)
+                if forecast_data:
+                    return encoded_response(forecast_data)
+                return jsonify({"error": "Failed to generate forecast"}), 500
     
-            forecast_data = forecast_service.generate_plant_forecast_data(plant_id, days)
+            if forecast_scheduler is not None:
+                # Answer from the precomputed store; compute once if never seen
+                forecast_scheduler.record_view(plant_id, days)
+                forecast_data = forecast_scheduler.get(plant_id, days)
+                if forecast_data is None:
+                    forecast_data = forecast_service.generate_forecast_within(
+                        plant_id, days, budget_ms, compute=forecast_scheduler.compute_now)
+                    if forecast_data and forecast_data['degradation']['applied'] is None:
+                        degradation = forecast_data['degradation']
+                        forecast_data = forecast_scheduler.get(plant_id, days) or forecast_data
+                        forecast_data['degradation'] = degradation
+                elif forecast_data['staleness']['stale']:
+                    forecast_scheduler.notify_changed(plant_id)
+            else:
+                forecast_data = forecast_service.generate_forecast_within(plant_id, days, budget_ms)
+            
             if forecast_data:
-                return jsonify(forecast_data)
+                return encoded_response(forecast_data)
             else:
                 return jsonify({"error": "Failed to generate forecast"}), 500
     
         except Exception as e:
-            return jsonify({"error": str(e)}), 500
\ No newline at end of file
+            return jsonify({"error": str(e)}), 500
+    
+    if profiling_service is not None:
+        register_profiling(app, profiling_service, data_service, profile_header)
+    
+    if admission_controller is not None:
+        register_admission(app, admission_controller)
+    
+    if alert_engine is not None:
+        register_alerts(app, socketio, alert_engine)
+
+def register_alerts(app, socketio, alert_engine):
+    """Alert queries and the 'alerts' socket room that receives alert events"""
+    alert_engine.on_event = lambda event: socketio.emit('alert', event, to='alerts')
+    
+    @socketio.on('subscribe_alerts')
+    def handle_alert_subscription(data=None):
+        """Join the alerts room and receive the currently active alerts"""
+        join_room('alerts')
+        socketio.emit('active_alerts', {'alerts': alert_engine.get_active()}, to=request.sid)
+    
+    @socketio.on('unsubscribe_alerts')
+    def handle_alert_unsubscription(data=None):
+        leave_room('alerts')
+    
+    @app.route('/alerts', methods=['GET'])
+    def get_alerts():
+        """Active alerts, optionally filtered by plant_id and severity"""
+        plant_id = request.args.get('plant_id')
+        try:
+            plant_id = int(plant_id) if plant_id is not None else None
+        except ValueError:
+            return jsonify({"error": "plant_id must be an integer"}), 400
+        
+        alerts = alert_engine.get_active(plant_id, request.args.get('severity'))
+        return jsonify({"count": len(alerts), "alerts": alerts})
+    
+    @app.route('/alerts/stats', methods=['GET'])
+    def alert_stats():
+        """Alert rules, evaluation work and recent alert events"""
+        return jsonify(alert_engine.stats())
+
+def register_admission(app, admission_controller):
+    """Admit or reject requests before they reach the handlers"""
+    from app.services.admission_service import INGEST, READ
+    
+    @app.before_request
+    def admit_request():
+        if request.endpoint in ADMISSION_INGEST_ENDPOINTS:
+            request_class = INGEST
+            body = request.get_json(silent=True)
+            device = body.get('Plant_ID') if isinstance(body, dict) else None
+        elif request.endpoint in ADMISSION_READ_ENDPOINTS:
+            request_class = READ
+            device = None
+        else:
+            return None
+        
+        retry_after = admission_controller.admit(request_class, device)
+        if retry_after is not None:
+            response = jsonify({"error": "Server is saturated, retry later", "retry_after": retry_after})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        g.admission = (request_class, time.monotonic())
+    
+    @app.teardown_request
+    def release_request(exc):
+        admission = g.pop('admission', None)
+        if admission is not None:
+            request_class, admitted_at = admission
+            admission_controller.release(request_class, time.monotonic() - admitted_at)
+    
+    @app.route('/admission/stats', methods=['GET'])
+    def admission_stats():
+        """Admission limits, in-flight requests and rejection and queueing counts"""
+        return jsonify(admission_controller.stats())
+
+def register_profiling(app, profiling_service, data_service, profile_header):
+    """Attach the sampling profiler to the request lifecycle"""
+    
+    @app.before_request
+    def start_profile():
+        if request.endpoint not in PROFILED_ENDPOINTS:
+            return
+        if profiling_service.should_profile(profile_header in request.headers):
+            g.profile = profiling_service.start(request.endpoint, request.path)
+    
+    @app.teardown_request
+    def stop_profile(exc):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        
+        # Attach the plant and its history size to the profile
+        plant_id = (request.view_args or {}).get('plant_id')
+        if plant_id is None:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                plant_id = body.get('Plant_ID')
+        history_length = data_service.get_history_length(plant_id) if plant_id is not None else None
+        
+        profiling_service.stop(profile, plant_id, history_length)
+    
+    @app.route('/profiles', methods=['GET'])
+    def list_profiles():
+        """List the slowest recently profiled requests"""
+        try:
+            limit = int(request.args.get('limit', 10))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        # At most the number of profiles kept (PROFILE_HISTORY_SIZE)
+        limit = min(max(1, limit), profiling_service.profiles.maxlen)
+        return jsonify({
+            "sample_rate": profiling_service.sample_rate,
+            "profiles": profiling_service.get_slowest(limit)
+        })
+    
+    @app.route('/profiles/<profile_id>', methods=['GET'])
+    def download_profile(profile_id):
+        """Download a profile as collapsed stacks for flamegraph tools"""
+        profile = profiling_service.get_profile(profile_id)
+        if profile is None:
+            return jsonify({"error": f"Profile {profile_id} not found"}), 404
+        
+        return Response(
+            profile.to_folded(),
+            mimetype='text/plain',
+            headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.folded'}
+        )
@@ -0,0 +1,203 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+
+# Request classes the controller tells apart
+INGEST = 'ingest'
+READ = 'read'
+
+# Weight of the newest request in the average time a request holds a slot
+HOLD_TIME_ALPHA = 0.2
+
+class TokenBucket:
+    """Refills rate tokens per second up to burst; each admitted request takes one"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait(self, now):
+        """Seconds until a token is available, 0 if one is"""
+        # now may predate a bucket created after the caller read the clock
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        wait = self.wait(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+    def full(self, now):
+        """Whether the bucket has refilled, so a new one would behave the same"""
+        return self.tokens + max(0.0, now - self.updated) * self.rate >= self.burst
+
+class AdmissionController:
+    """Rate limits and in-flight limits that keep ingest bursts from starving reads
+
+    Ingest requests pass a per-device and a global token bucket, then need one of
+    the max_in_flight - reserved_reads ingest slots. Reads skip the buckets and may
+    use every slot, so reserved_reads slots are always left for them. A request
+    waits up to queue_timeout for a slot before it is rejected, and takes its
+    tokens only once it has a slot.
+
+    Devices are integer plant IDs sent by clients, so their buckets are kept in
+    least recently used order: refilled buckets are dropped, and at most
+    max_devices are kept.
+    """
+
+    def __init__(self, device_rate=5.0, device_burst=20, global_rate=200.0, global_burst=400,
+                 max_in_flight=16, reserved_reads=4, queue_timeout=0.25, max_devices=10000):
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.max_in_flight = max_in_flight
+        self.reserved_reads = min(reserved_reads, max_in_flight - 1)
+        self.queue_timeout = queue_timeout
+        self.max_devices = max_devices
+
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.device_buckets = OrderedDict()  # device -> TokenBucket, least recently used first
+
+        # Slot accounting
+        self.in_flight = {INGEST: 0, READ: 0}
+        self.peak_in_flight = 0
+        self._slots = threading.Condition()
+
+        # Counters for capacity planning
+        self.admitted = {INGEST: 0, READ: 0}
+        self.rejected = {}
+        self.queued = {INGEST: 0, READ: 0}
+        self.queue_wait = {INGEST: 0.0, READ: 0.0}
+
+        # Average seconds a request holds its slot, for Retry-After on a slot rejection
+        self.hold_time = {INGEST: 0.0, READ: 0.0}
+
+    def admit(self, request_class, device=None):
+        """Reserve capacity for a request
+
+        Returns None when admitted (call release when done), else the number of
+        seconds the client should wait before retrying. device is ignored unless
+        it is an integer.
+        """
+        if not isinstance(device, int) or isinstance(device, bool):
+            device = None
+
+        with self._slots:
+            if request_class == INGEST:
+                rejection = self._check_rates(device, time.monotonic())
+                if rejection is not None:
+                    return rejection
+
+            if not self._has_slot(request_class):
+                # Wait briefly for a slot to free up
+                self.queued[request_class] += 1
+                start = time.monotonic()
+                admitted = self._slots.wait_for(lambda: self._has_slot(request_class), self.queue_timeout)
+                self.queue_wait[request_class] += time.monotonic() - start
+                if not admitted:
+                    return self._reject(f'{request_class}_in_flight', self._slot_wait())
+
+            if request_class == INGEST:
+                # Tokens are only spent on admitted requests; others may have taken them meanwhile
+                now = time.monotonic()
+                rejection = self._check_rates(device, now)
+                if rejection is not None:
+                    return rejection
+                if device is not None:
+                    self.device_buckets[device].take(now)
+                self.global_bucket.take(now)
+
+            self.in_flight[request_class] += 1
+            self.admitted[request_class] += 1
+            self.peak_in_flight = max(self.peak_in_flight, sum(self.in_flight.values()))
+            return None
+
+    def release(self, request_class, held=None):
+        """Free the slot of a finished request that held it for held seconds"""
+        with self._slots:
+            self.in_flight[request_class] -= 1
+            if held is not None:
+                average = self.hold_time[request_class]
+                self.hold_time[request_class] = held if not average else average + HOLD_TIME_ALPHA * (held - average)
+            self._slots.notify_all()
+
+    def stats(self):
+        """Limits, current load and admission counters"""
+        with self._slots:
+            return {
+                "config": {
+                    "device_rate": self.device_rate,
+                    "device_burst": self.device_burst,
+                    "global_rate": self.global_bucket.rate,
+                    "global_burst": self.global_bucket.burst,
+                    "max_in_flight": self.max_in_flight,
+                    "reserved_reads": self.reserved_reads,
+                    "queue_timeout": self.queue_timeout
+                },
+                "in_flight": dict(self.in_flight),
+                "peak_in_flight": self.peak_in_flight,
+                "admitted": dict(self.admitted),
+                "rejected": dict(self.rejected),
+                "queued": dict(self.queued),
+                "queue_wait_seconds": {name: round(seconds, 3) for name, seconds in self.queue_wait.items()},
+                "hold_time_seconds": {name: round(seconds, 3) for name, seconds in self.hold_time.items()},
+                "devices": len(self.device_buckets),
+                "max_devices": self.max_devices
+            }
+
+    def _check_rates(self, device, now):
+        """Seconds to retry after if the device or global bucket is empty, else None
+
+        Callers hold the lock.
+        """
+        if device is not None:
+            wait = self._device_bucket(device, now).wait(now)
+            if wait:
+                return self._reject('device_rate', wait)
+        wait = self.global_bucket.wait(now)
+        if wait:
+            return self._reject('global_rate', wait)
+        return None
+
+    def _device_bucket(self, device, now):
+        # Callers hold the lock
+        bucket = self.device_buckets.get(device)
+        if bucket is None:
+            bucket = self.device_buckets[device] = TokenBucket(self.device_rate, self.device_burst)
+        else:
+            self.device_buckets.move_to_end(device)
+
+        # Refilled buckets carry no state; beyond max_devices the least recently used go too
+        while len(self.device_buckets) > 1:
+            oldest, oldest_bucket = next(iter(self.device_buckets.items()))
+            if len(self.device_buckets) <= self.max_devices and not oldest_bucket.full(now):
+                break
+            del self.device_buckets[oldest]
+        return bucket
+
+    def _slot_wait(self):
+        """Seconds until a slot is likely to free up: the average hold time, split over the slots held"""
+        total = self.in_flight[INGEST] + self.in_flight[READ]
+        if not total:
+            return 1.0
+        held = (self.hold_time[INGEST] * self.in_flight[INGEST] + self.hold_time[READ] * self.in_flight[READ])
+        return held / total / total
+
+    def _has_slot(self, request_class):
+        total = self.in_flight[INGEST] + self.in_flight[READ]
+        if request_class == INGEST:
+            return (total < self.max_in_flight and
+                    self.in_flight[INGEST] < self.max_in_flight - self.reserved_reads)
+        return total < self.max_in_flight
+
+    def _reject(self, reason, retry_after):
+        # Callers hold the lock
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return max(1, math.ceil(retry_after))
@@ -0,0 +1,288 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Rule conditions: thresholds and rates (per hour) compare a sensor against value,
+# 'health' matches the predicted health class
+CONDITIONS = ('below', 'above', 'rate_below', 'rate_above', 'health')
+
+# Signal name for predicted health transitions
+HEALTH_SIGNAL = 'health'
+
+# Alert events kept for /alerts/stats
+ALERT_HISTORY_SIZE = 500
+
+# Rates of change are measured against a reading at least this many seconds
+# older, so sensor noise between closely spaced readings is not scaled up to
+# an hourly rate
+RATE_SPAN = 15 * 60
+
+NS_PER_SECOND = 10 ** 9
+NS_PER_HOUR = 3600 * NS_PER_SECOND
+
+class AlertRule:
+    """One alert condition, held for at least duration seconds before it fires"""
+
+    def __init__(self, rule_id, condition, value, sensor=None, duration=0, severity='warning', message=None):
+        if condition not in CONDITIONS:
+            raise ValueError(f"Unknown alert condition for rule {rule_id}: {condition}")
+        if condition != 'health' and sensor is None:
+            raise ValueError(f"Alert rule {rule_id} needs a sensor")
+
+        self.rule_id = rule_id
+        self.condition = condition
+        self.value = value if condition == 'health' else float(value)
+        self.sensor = sensor
+        self.duration = duration
+        self.severity = severity
+        self.message = message or self._default_message()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['id'], config['condition'], config['value'], config.get('sensor'),
+                   config.get('duration', 0), config.get('severity', 'warning'), config.get('message'))
+
+    @property
+    def signal(self):
+        """Stream the rule reads: a sensor, its rate of change, or predicted health"""
+        if self.condition == 'health':
+            return HEALTH_SIGNAL
+        if self.condition.startswith('rate_'):
+            return f"{self.sensor}:rate"
+        return self.sensor
+
+    def to_dict(self):
+        return {
+            "id": self.rule_id,
+            "sensor": self.sensor,
+            "condition": self.condition,
+            "value": self.value,
+            "duration": self.duration,
+            "severity": self.severity,
+            "message": self.message
+        }
+
+    def _default_message(self):
+        if self.condition == 'health':
+            return f"Predicted health is {self.value}"
+        if self.condition.startswith('rate_'):
+            return f"{self.sensor} changing {self.condition[5:]} {self.value:g} per hour"
+        return f"{self.sensor} {self.condition} {self.value:g}"
+
+class PlantAlertState:
+    """Per-plant rule state: constant size per rule, plus the readings of a rate span"""
+
+    def __init__(self):
+        self.pending = {}  # signal -> {rule_id: first violating timestamp (ns)}
+        self.active = {}  # rule_id -> active alert
+        self.previous = {}  # sensor -> deque of (timestamp, value) covering the rate span, for rate rules
+        self.last_timestamp = None
+
+class AlertEngine:
+    """Evaluates alert rules incrementally as readings are stored
+
+    Threshold and rate rules are compiled into a sorted index per signal, so a
+    reading finds the rules it violates with one binary search instead of
+    checking every rule. Only those rules and the ones the plant was already
+    violating are touched. A violation fires once it has lasted the rule's
+    duration (in reading time) and resolves on the first reading that clears it.
+    """
+
+    def __init__(self, rules, history_size=ALERT_HISTORY_SIZE, rate_span=RATE_SPAN):
+        self.rate_span = rate_span  # Seconds a rate of change is measured over, at least
+        self.rules = {}
+        for rule in rules:
+            rule = rule if isinstance(rule, AlertRule) else AlertRule.from_config(rule)
+            self.rules[rule.rule_id] = rule
+
+        # Threshold and rate rules: signal -> direction -> (sorted thresholds, rules in that order)
+        self._index = {}
+        # Health rules by the predicted class they match
+        self._health_rules = {}
+        for rule in sorted(self.rules.values(), key=lambda rule: rule.rule_id):
+            if rule.condition == 'health':
+                self._health_rules.setdefault(rule.value, []).append(rule)
+            else:
+                direction = rule.condition.split('_')[-1]
+                self._index.setdefault(rule.signal, {}).setdefault(direction, []).append(rule)
+        for directions in self._index.values():
+            for direction, rules in directions.items():
+                rules.sort(key=lambda rule: rule.value)
+                directions[direction] = ([rule.value for rule in rules], rules)
+        self._rate_sensors = {rule.sensor for rule in self.rules.values() if rule.condition.startswith('rate_')}
+        self._sensors = sorted({rule.sensor for rule in self.rules.values() if rule.sensor is not None})
+
+        self.plants = {}
+        self.events = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+        # Called with each alert event: on_event(event)
+        self.on_event = None
+
+        # Work counters
+        self.readings = 0
+        self.late_readings = 0
+        self.rule_checks = 0
+        self.triggered = 0
+        self.resolved = 0
+
+    def observe(self, plant_id, rows):
+        """Evaluate freshly stored readings; rows is a timestamp-ordered DataFrame
+
+        Readings older than the plant's newest evaluated one are skipped: they
+        are stored, but alert state only moves forward in time.
+        """
+        sensors = [sensor for sensor in self._sensors if sensor in rows.columns]
+        if not sensors or len(rows) == 0:
+            return
+        timestamps = rows['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+        columns = {sensor: pd.to_numeric(rows[sensor], errors='coerce').to_numpy(dtype=float)
+                   for sensor in sensors}
+
+        events = []
+        with self._lock:
+            state = self.plants.get(plant_id)
+            if state is None:
+                state = self.plants[plant_id] = PlantAlertState()
+            for i, timestamp in enumerate(timestamps):
+                timestamp = int(timestamp)
+                if state.last_timestamp is not None and timestamp < state.last_timestamp:
+                    self.late_readings += 1
+                    continue
+                state.last_timestamp = timestamp
+                self.readings += 1
+
+                for sensor in sensors:
+                    value = columns[sensor][i]
+                    if np.isnan(value):
+                        continue
+                    self._evaluate(plant_id, state, sensor, value, timestamp, events)
+                    if sensor in self._rate_sensors:
+                        self._evaluate_rate(plant_id, state, sensor, value, timestamp, events)
+        self._publish(events)
+
+    def observe_health(self, plant_id, predicted_health, timestamp):
+        """Evaluate health rules against a plant's newest predicted health"""
+        if not self._health_rules:
+            return
+        timestamp = pd.Timestamp(timestamp).value
+
+        events = []
+        with self._lock:
+            state = self.plants.get(plant_id)
+            if state is None:
+                state = self.plants[plant_id] = PlantAlertState()
+            self._evaluate(plant_id, state, HEALTH_SIGNAL, predicted_health, timestamp, events)
+        self._publish(events)
+
+    def get_active(self, plant_id=None, severity=None):
+        """Active alerts, newest first, optionally for one plant or severity"""
+        with self._lock:
+            if plant_id is not None:
+                state = self.plants.get(plant_id)
+                alerts = [dict(alert) for alert in state.active.values()] if state is not None else []
+            else:
+                alerts = [dict(alert) for state in self.plants.values() for alert in state.active.values()]
+        if severity is not None:
+            alerts = [alert for alert in alerts if alert['severity'] == severity]
+        return sorted(alerts, key=lambda alert: alert['triggered_at'], reverse=True)
+
+    def stats(self):
+        """Rules, evaluation work and recent alert events"""
+        with self._lock:
+            return {
+                "rules": [rule.to_dict() for rule in self.rules.values()],
+                "readings": self.readings,
+                "late_readings": self.late_readings,
+                "rule_checks": self.rule_checks,
+                "checks_per_reading": round(self.rule_checks / self.readings, 3) if self.readings else 0.0,
+                "active": sum(len(state.active) for state in self.plants.values()),
+                "triggered": self.triggered,
+                "resolved": self.resolved,
+                "recent_events": list(self.events)
+            }
+
+    def _evaluate_rate(self, plant_id, state, sensor, value, timestamp, events):
+        """Rate of change per hour against the newest reading at least rate_span older"""
+        readings = state.previous.get(sensor)
+        if readings is None:
+            readings = state.previous[sensor] = deque()
+        readings.append((timestamp, value))
+
+        # Keep the newest reading that is old enough, and the ones after it
+        span = self.rate_span * NS_PER_SECOND
+        while len(readings) > 1 and timestamp - readings[1][0] >= span:
+            readings.popleft()
+        start_timestamp, start_value = readings[0]
+        if timestamp - start_timestamp < max(span, 1):
+            return
+        rate = (value - start_value) * NS_PER_HOUR / (timestamp - start_timestamp)
+        self._evaluate(plant_id, state, f"{sensor}:rate", rate, timestamp, events)
+
+    def _evaluate(self, plant_id, state, signal, value, timestamp, events):
+        """Move the rules of one signal forward by one observation; callers hold the lock"""
+        if signal == HEALTH_SIGNAL:
+            violated = list(self._health_rules.get(value, []))
+        else:
+            index = self._index.get(signal)
+            if index is None:
+                return
+            violated = []
+            if 'below' in index:
+                thresholds, rules = index['below']
+                violated += rules[bisect_right(thresholds, value):]
+            if 'above' in index:
+                thresholds, rules = index['above']
+                violated += rules[:bisect_left(thresholds, value)]
+
+        pending = state.pending.setdefault(signal, {})
+        self.rule_checks += len(violated) + len(pending)
+
+        # Rules this observation clears
+        violated_ids = {rule.rule_id for rule in violated}
+        for rule_id in [rule_id for rule_id in pending if rule_id not in violated_ids]:
+            del pending[rule_id]
+            alert = state.active.pop(rule_id, None)
+            if alert is not None:
+                self.resolved += 1
+                events.append(dict(alert, event='resolved', status='resolved', value=self._json_value(value),
+                                   resolved_at=str(pd.Timestamp(timestamp))))
+
+        # Rules it violates, firing once the violation lasted long enough
+        for rule in violated:
+            since = pending.setdefault(rule.rule_id, timestamp)
+            if rule.rule_id in state.active:
+                state.active[rule.rule_id]['value'] = self._json_value(value)
+                continue
+            if timestamp - since >= rule.duration * NS_PER_SECOND:
+                alert = {
+                    "plant_id": plant_id,
+                    "rule_id": rule.rule_id,
+                    "sensor": rule.sensor,
+                    "condition": rule.condition,
+                    "threshold": rule.value,
+                    "severity": rule.severity,
+                    "message": rule.message,
+                    "value": self._json_value(value),
+                    "since": str(pd.Timestamp(since)),
+                    "triggered_at": str(pd.Timestamp(timestamp)),
+                    "status": "active"
+                }
+                state.active[rule.rule_id] = alert
+                self.triggered += 1
+                events.append(dict(alert, event='triggered'))
+
+    def _publish(self, events):
+        for event in events:
+            self.events.append(event)
+            if self.on_event is not None:
+                try:
+                    self.on_event(event)
+                except Exception as e:
+                    print(f"Error publishing alert: {e}")
+
+    @staticmethod
+    def _json_value(value):
+        return round(float(value), 4) if isinstance(value, (float, np.floating)) else value
@@ -0,0 +1,155 @@
+import time
+import itertools
+import threading
+import pandas as pd
+from app.services.ingest_service import REQUIRED_FIELDS, OPTIONAL_FIELDS
+
+# Input formats: the raw Kaggle CSV schema, or one JSON reading per line
+BACKFILL_FORMATS = ('csv', 'ndjson')
+
+# Readings parsed and stored per chunk
+BACKFILL_CHUNK_ROWS = 50000
+
+# Plants predicted per model pass in the catch-up inference
+CATCH_UP_BATCH = 256
+
+class BackfillService:
+    """Bulk import of historical readings
+
+    Readings are streamed in chunks and stored with one bulk append per plant
+    and chunk: sorted, deduplicated against what is stored, without the
+    per-reading inference, alerts and history saves of /sensor_reading. The
+    history file is saved once at the end, then every imported plant gets a
+    single catch-up inference on its newest reading, which updates the
+    overview, health alerts, forecasts and socket clients as a live reading
+    would.
+    """
+
+    def __init__(self, data_service, ingest_service=None, chunk_rows=BACKFILL_CHUNK_ROWS):
+        self.data_service = data_service
+        self.ingest_service = ingest_service  # None skips the catch-up inference
+        self.chunk_rows = chunk_rows
+
+        # One import at a time; a second one would interleave plants' appends
+        self._lock = threading.Lock()
+        self.last_result = None
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def run(self, chunks, catch_up=True):
+        """Import an iterable of reading DataFrames; returns a summary
+
+        A chunk or plant that fails to parse counts as invalid and the import
+        moves on; input that cannot be read further ends it early. Either way
+        what was stored is saved, caught up and reported, with the causes under
+        'errors'. Raises ValueError if such errors left no reading to process,
+        and RuntimeError if another import is running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A backfill is already running")
+        try:
+            start = time.perf_counter()
+            summary = {"readings": 0, "stored": 0, "duplicates": 0, "expired": 0, "invalid": 0}
+            errors = []
+            plant_ids = set()
+
+            try:
+                chunks = iter(chunks)
+                for index in itertools.count():
+                    try:
+                        chunk = next(chunks, None)
+                    except ValueError as e:
+                        errors.append(f"Unreadable input after chunk {index}: {e}")
+                        break
+                    if chunk is None:
+                        break
+
+                    summary['readings'] += len(chunk)
+                    try:
+                        chunk = self._prepare(chunk, summary)
+                    except ValueError as e:
+                        summary['invalid'] += len(chunk)
+                        errors.append(f"Chunk {index}: {e}")
+                        continue
+
+                    for plant_id, rows in chunk.groupby('Plant_ID', sort=False):
+                        try:
+                            stored, duplicates, expired = self.data_service.backfill_readings(int(plant_id), rows)
+                        except ValueError as e:
+                            summary['invalid'] += len(rows)
+                            errors.append(f"Chunk {index}, plant {plant_id}: {e}")
+                            continue
+                        summary['stored'] += stored
+                        summary['duplicates'] += duplicates
+                        summary['expired'] += expired
+                        if stored:
+                            plant_ids.add(int(plant_id))
+            finally:
+                # Whatever was stored is kept, even if the import stops on an unexpected error
+                if summary['stored']:
+                    self.data_service.save_history()
+            import_seconds = time.perf_counter() - start
+
+            if errors and not summary['stored'] + summary['duplicates'] + summary['expired']:
+                raise ValueError(errors[0])
+
+            inferred = 0
+            if catch_up and self.ingest_service is not None:
+                inferred = self._catch_up(sorted(plant_ids))
+
+            elapsed = time.perf_counter() - start
+            summary.update({
+                "plants": len(plant_ids),
+                "inferred": inferred,
+                "errors": errors,
+                "import_seconds": round(import_seconds, 3),
+                "seconds": round(elapsed, 3),
+                "readings_per_second": round(summary['readings'] / max(import_seconds, 1e-9))
+            })
+            self.last_result = summary
+            return summary
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _prepare(chunk, summary):
+        """Drop readings missing required fields and fill optional ones, as /sensor_reading does"""
+        missing = [field for field in REQUIRED_FIELDS + ['Timestamp'] if field not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required field: {missing[0]}")
+
+        valid = chunk[REQUIRED_FIELDS + ['Timestamp']].notna().all(axis=1)
+        if not valid.all():
+            summary['invalid'] += int((~valid).sum())
+            chunk = chunk[valid]
+        chunk = chunk.copy()
+        for field, default_value in OPTIONAL_FIELDS.items():
+            if field not in chunk.columns:
+                chunk[field] = default_value
+            else:
+                chunk[field] = chunk[field].fillna(default_value)
+        chunk['Plant_ID'] = chunk['Plant_ID'].astype('int64')
+        return chunk
+
+    def _catch_up(self, plant_ids):
+        """One inference per plant on its newest reading; returns how many ran"""
+        forecast_service = self.ingest_service.forecast_service
+        inferred = 0
+        for offset in range(0, len(plant_ids), CATCH_UP_BATCH):
+            batch = plant_ids[offset:offset + CATCH_UP_BATCH]
+
+            # One model pass for the batch; process_update then reuses the cached results
+            for _ in forecast_service.get_batch_health_data(batch, include_lstm=False):
+                pass
+
+            for plant_id in batch:
+                snapshot = self.data_service.get_snapshot(plant_id)
+                if snapshot is None or len(snapshot) == 0:
+                    continue
+                latest = {name: values[-1] for name, values in snapshot.tail(1).items()}
+                latest['Timestamp'] = str(pd.Timestamp(latest['Timestamp']))
+                if self.ingest_service.process_update(plant_id, latest):
+                    inferred += 1
+        return inferred
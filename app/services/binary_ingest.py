@@ -0,0 +1,236 @@
+import time
+import socket
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from app.services.ingest_service import OPTIONAL_FIELDS
+
+FRAME_VERSION = 1
+
+# Float32 sensor slots in frame order; the first three are required
+FRAME_SENSORS = ['Soil_Temperature', 'Humidity', 'Soil_Moisture'] + list(OPTIONAL_FIELDS)
+
+# Fixed little-endian frame: version, plant id, epoch seconds, sensors, and a
+# bitmask with bit i set when optional field i (OPTIONAL_FIELDS order) is present
+FRAME_DTYPE = np.dtype([
+    ('version', 'u1'),
+    ('plant_id', '<u4'),
+    ('timestamp', '<f8'),
+    ('sensors', '<f4', (len(FRAME_SENSORS),)),
+    ('present', '<u2')
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+_OPTIONAL_DEFAULTS = np.array(list(OPTIONAL_FIELDS.values()), dtype=np.float64)
+_OPTIONAL_BITS = np.arange(len(OPTIONAL_FIELDS), dtype=np.uint16)
+
+def encode_frames(readings):
+    """Pack reading dicts into frames (used by probes, simulators and benchmarks)"""
+    frames = np.zeros(len(readings), dtype=FRAME_DTYPE)
+    for i, reading in enumerate(readings):
+        frames['version'][i] = FRAME_VERSION
+        frames['plant_id'][i] = reading['Plant_ID']
+        frames['timestamp'][i] = reading.get('Timestamp', 0)
+        present = 0
+        for j, field in enumerate(FRAME_SENSORS):
+            if field in reading:
+                frames['sensors'][i, j] = reading[field]
+                if j >= 3:
+                    present |= 1 << (j - 3)
+        frames['present'][i] = present
+    return frames.tobytes()
+
+def decode_frames(buffer, drops=None):
+    """Decode a buffer of concatenated frames into a readings DataFrame
+
+    Trailing bytes short of a whole frame and frames of another version are
+    skipped; when drops is a dict, their counts are added to its 'truncated'
+    and 'unsupported' entries.
+    """
+    count = len(buffer) // FRAME_SIZE
+    frames = np.frombuffer(buffer, dtype=FRAME_DTYPE, count=count)
+    supported = frames['version'] == FRAME_VERSION
+    if drops is not None:
+        drops['truncated'] = drops.get('truncated', 0) + int(len(buffer) % FRAME_SIZE != 0)
+        drops['unsupported'] = drops.get('unsupported', 0) + int(count - supported.sum())
+    frames = frames[supported]
+
+    # Round away float32 representation noise (22.799999 -> 22.8)
+    sensors = np.round(frames['sensors'].astype(np.float64), 4)
+
+    # Fill absent optional fields with their defaults
+    present = ((frames['present'][:, None] >> _OPTIONAL_BITS) & 1).astype(bool)
+    sensors[:, 3:] = np.where(present, sensors[:, 3:], _OPTIONAL_DEFAULTS)
+
+    # Probes without a clock send 0; stamp those on arrival
+    epochs = frames['timestamp'].copy()
+    epochs[epochs <= 0] = time.time()
+    local_offset = datetime.now().astimezone().utcoffset().total_seconds()
+    timestamps = pd.to_datetime(epochs + local_offset, unit='s')
+
+    readings = pd.DataFrame(sensors, columns=FRAME_SENSORS)
+    readings.insert(0, 'Plant_ID', frames['plant_id'].astype(np.int64))
+    readings['Timestamp'] = timestamps
+    return readings
+
+class FrameBatcher:
+    """Buffers raw frame payloads and hands them to the ingest pipeline in bulk
+
+    Flushes store readings without saving; the history file is rewritten at
+    most once per persist_interval seconds, and once more on stop().
+    """
+
+    def __init__(self, ingest_service, batch_frames=512, flush_interval=0.05, persist_interval=5.0):
+        self.ingest_service = ingest_service
+        self.batch_bytes = batch_frames * FRAME_SIZE
+        self.flush_interval = flush_interval
+        self.persist_interval = persist_interval
+
+        self.frames_received = 0
+        self.payloads_rejected = 0
+        self.frames_truncated = 0  # Partial frames at the end of a decoded buffer
+        self.frames_unsupported = 0  # Whole frames with a version other than FRAME_VERSION
+        self.saves = 0
+
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._running = False
+        self._flusher = None
+        self._unsaved = False
+        self._last_save = time.monotonic()
+
+    def start(self):
+        self._running = True
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def stop(self):
+        self._running = False
+        self.flush()
+        self.persist()
+
+    def stats(self):
+        return {
+            "frames_received": self.frames_received,
+            "payloads_rejected": self.payloads_rejected,
+            "frames_truncated": self.frames_truncated,
+            "frames_unsupported": self.frames_unsupported,
+            "saves": self.saves
+        }
+
+    def add(self, payload):
+        """Queue one payload holding one or more whole frames"""
+        if len(payload) == 0 or len(payload) % FRAME_SIZE != 0:
+            self.payloads_rejected += 1
+            return
+        with self._lock:
+            self._buffer += payload
+            full = len(self._buffer) >= self.batch_bytes
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Decode everything buffered so far in one pass"""
+        with self._lock:
+            if not self._buffer:
+                return
+            buffer = bytes(self._buffer)
+            self._buffer.clear()
+
+        try:
+            drops = {}
+            readings = decode_frames(buffer, drops)
+            self.frames_truncated += drops['truncated']
+            self.frames_unsupported += drops['unsupported']
+            if drops['truncated'] or drops['unsupported']:
+                print(f"Dropped binary frames: {drops['truncated']} truncated, "
+                      f"{drops['unsupported']} unsupported version")
+
+            self.frames_received += len(readings)
+            if len(readings):
+                self.ingest_service.ingest_frame(readings, persist=False)
+                self._unsaved = True
+        except Exception as e:
+            print(f"Error ingesting binary frames: {e}")
+
+    def persist(self):
+        """Save the history if readings were stored since the last save"""
+        self._last_save = time.monotonic()
+        if not self._unsaved:
+            return
+        self._unsaved = False
+        self.ingest_service.data_service.save_history()
+        self.saves += 1
+
+    def _flush_loop(self):
+        while self._running:
+            time.sleep(self.flush_interval)
+            self.flush()
+            if time.monotonic() - self._last_save >= self.persist_interval:
+                self.persist()
+
+class UdpIngestListener(FrameBatcher):
+    """Receives binary frames over UDP; each datagram carries one or more frames"""
+
+    def __init__(self, ingest_service, host='0.0.0.0', port=5005, **kwargs):
+        super().__init__(ingest_service, **kwargs)
+        self.host = host
+        self.port = port
+        self.sock = None
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(self.flush_interval)
+        super().start()
+        threading.Thread(target=self._receive_loop, daemon=True).start()
+        print(f"UDP ingest listening on {self.host}:{self.sock.getsockname()[1]}")
+
+    def stop(self):
+        super().stop()
+        if self.sock is not None:
+            self.sock.close()
+
+    def _receive_loop(self):
+        datagram = bytearray(65535)
+        view = memoryview(datagram)
+        while self._running:
+            try:
+                size = self.sock.recv_into(datagram)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.add(view[:size].tobytes())
+
+class MqttIngestListener(FrameBatcher):
+    """Receives binary frames from an MQTT topic
+
+    client is a paho-mqtt style client (callback API version 2): it needs
+    subscribe(topic) and is_connected(), and calls client.on_connect and
+    client.on_message(client, userdata, message) with message.payload bytes.
+    """
+
+    def __init__(self, ingest_service, client, topic='plants/+/frames', **kwargs):
+        super().__init__(ingest_service, **kwargs)
+        self.client = client
+        self.topic = topic
+
+    def start(self):
+        # Subscribe on every connect: a reconnect with a clean session drops subscriptions
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        if self.client.is_connected():
+            self.client.subscribe(self.topic)
+        super().start()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if getattr(reason_code, 'is_failure', False):
+            print(f"MQTT ingest connection failed: {reason_code}")
+            return
+        client.subscribe(self.topic)
+
+    def _on_message(self, client, userdata, message):
+        self.add(bytes(message.payload))
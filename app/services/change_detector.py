@@ -0,0 +1,151 @@
+import time
+import threading
+import numpy as np
+
+class PlantChangeState:
+    """Streaming statistics and the last inference for one plant"""
+
+    def __init__(self, values):
+        self.mean = values.copy()
+        self.var = np.zeros_like(values)
+        self.samples = 0
+
+        # Inputs and output of the last full inference
+        self.inferred_values = None
+        self.inferred_at = None
+        self.model_version = None
+        self.result = None
+
+        self.readings = 0
+        self.skipped = 0
+
+class ChangeDetector:
+    """Decides per reading whether a plant's inputs moved enough to re-run inference
+
+    Each plant keeps an exponentially weighted mean and variance of every
+    sensor. A reading runs inference when some sensor is more than threshold
+    standard deviations away from the values last inferred on, when the last
+    inference is older than max_staleness seconds, during the first
+    warmup_readings readings, or after a model swap. Otherwise the previous
+    result is reused.
+    """
+
+    def __init__(self, features, alpha=0.1, threshold=3.0, max_staleness=300.0, warmup_readings=10,
+                 min_relative_std=0.01):
+        self.features = list(features)
+        self.alpha = alpha
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.warmup_readings = warmup_readings
+        self.min_relative_std = min_relative_std  # Std floor as a share of the mean, for flat sensors
+
+        self.plants = {}
+        self.reasons = {}
+        self._lock = threading.Lock()
+
+    def check(self, plant_id, data, model_version, now=None):
+        """Update the plant's statistics with a reading and decide whether to infer
+
+        Returns (infer, reason, drift); drift is the largest sensor deviation from
+        the last inferred values, in standard deviations.
+        """
+        now = time.time() if now is None else now
+        try:
+            values = np.array([float(data[feature]) for feature in self.features])
+        except (KeyError, TypeError, ValueError):
+            values = None
+        if values is None or not np.isfinite(values).all():
+            # Missing or non-numeric sensors: always infer, and keep NaN out of the statistics
+            with self._lock:
+                return self._count(True, 'unparsed', None)
+
+        with self._lock:
+            state = self.plants.get(plant_id)
+            if state is None:
+                state = self.plants[plant_id] = PlantChangeState(values)
+            state.readings += 1
+
+            # Deviation against the statistics before this reading
+            drift = None
+            if state.inferred_values is not None:
+                std = np.maximum(np.sqrt(state.var), self.min_relative_std * np.abs(state.mean) + 1e-9)
+                drift = float(np.max(np.abs(values - state.inferred_values) / std))
+
+            # EWMA mean and variance
+            diff = values - state.mean
+            increment = self.alpha * diff
+            state.mean += increment
+            state.var = (1 - self.alpha) * (state.var + diff * increment)
+            state.samples += 1
+
+            if state.result is None:
+                reason = 'no_result'
+            elif state.samples <= self.warmup_readings:
+                reason = 'warmup'
+            elif state.model_version != model_version:
+                reason = 'model_version'
+            elif now - state.inferred_at >= self.max_staleness:
+                reason = 'staleness'
+            elif drift is None or not np.isfinite(drift) or drift >= self.threshold:
+                reason = 'drift'
+            else:
+                state.skipped += 1
+                return self._count(False, 'unchanged', drift)
+
+            # Inference will run on these inputs
+            state.inferred_values = values
+            return self._count(True, reason, drift)
+
+    def record(self, plant_id, result, model_version, now=None):
+        """Keep an inference result to reuse for the next unchanged readings"""
+        with self._lock:
+            state = self.plants.get(plant_id)
+            if state is None:
+                return
+            state.result = result
+            state.model_version = model_version
+            state.inferred_at = time.time() if now is None else now
+
+    def last_result(self, plant_id):
+        """(result, inferred_at) of the plant's last inference, or (None, None)"""
+        with self._lock:
+            state = self.plants.get(plant_id)
+            if state is None:
+                return None, None
+            return state.result, state.inferred_at
+
+    def stats(self):
+        """Thresholds, overall skip rate and per-plant counts"""
+        with self._lock:
+            readings = sum(state.readings for state in self.plants.values())
+            skipped = sum(state.skipped for state in self.plants.values())
+            return {
+                "enabled": True,
+                "config": {
+                    "features": self.features,
+                    "alpha": self.alpha,
+                    "threshold": self.threshold,
+                    "max_staleness": self.max_staleness,
+                    "warmup_readings": self.warmup_readings,
+                    "min_relative_std": self.min_relative_std
+                },
+                "readings": readings,
+                "inferences": readings - skipped,
+                "skipped": skipped,
+                "skip_rate": round(skipped / readings, 4) if readings else 0.0,
+                "reasons": dict(self.reasons),
+                "plants": {
+                    str(plant_id): {
+                        "readings": state.readings,
+                        "skipped": state.skipped,
+                        "skip_rate": round(state.skipped / state.readings, 4) if state.readings else 0.0,
+                        "last_inference": state.inferred_at
+                    }
+                    for plant_id, state in self.plants.items()
+                }
+            }
+
+    def _count(self, infer, reason, drift):
+        # Callers hold the lock
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        return infer, reason, drift
@@ -1,45 +1,156 @@
+import os
 import pandas as pd
+import numpy as np
 import json
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from app.services.history_store import PlantHistory
+from app.services.latest_index import LatestValueIndex
+from app.utils.history_readers import iter_readings
+from app.utils.timeseries_codec import CODEC_EXTENSION, CHUNK_ROWS, SeriesReader, SeriesWriter
+
+# Readings older than this (relative to now) are dropped on append
+HISTORY_RETENTION = pd.Timedelta(days=30)
 
 class DataService:
     """Manages plant data storage and retrieval"""
     
-    def __init__(self, history_file):
+    def __init__(self, history_file, memory_budget=None, spill_dir=None, stale_after=600.0, feature_store=None,
+                 retention=HISTORY_RETENTION):
         self.history_file = history_file
-        self.plant_data = {}
+        self.retention = retention  # Readings older than this are dropped on append (None keeps all)
+        
+        # Materializes model features next to each stored reading (None stores readings only)
+        self.feature_store = feature_store
+        
+        # Columnar history per plant; readers take lock-free snapshots
+        self.histories = {}
+        self._write_lock = threading.Lock()
+        
+        # Residency: plants in memory in least recently used order, spilled past the budget
+        self.memory_budget = memory_budget  # Bytes; None keeps every plant resident
+        self.spill_dir = spill_dir or os.path.join(os.path.dirname(history_file) or '.', 'spill')
+        self.spills = 0
+        self.faults = 0
+        self._resident = OrderedDict()
+        self._residency_lock = threading.Lock()
+        
+        # One save at a time; concurrent savers would interleave temp files
+        self._save_lock = threading.Lock()
+        
+        # Newest reading and health per plant, for overviews that must not touch history
+        self.latest = LatestValueIndex(stale_after)
+        
+        # Called with (plant_id, rows) after new readings are stored; rows are parsed and ordered
+        self.append_listeners = []
+        if self.memory_budget is not None:
+            # Spilled files are a cache of the history file
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+        
         self._load_history()
     
     def _load_history(self):
-        """Load plant history from file"""
+        """Load plant history from file, streaming it so the memory budget holds
+        
+        A compressed (.tsc) history file that does not exist yet is seeded from
+        the JSON file of the same name, if there is one.
+        """
         try:
-            import os
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r') as f:
-                    history_data = json.load(f)
-                    for plant_id, readings in history_data.items():
-                        self.plant_data[int(plant_id)] = pd.DataFrame(readings)
-                print(f"Loaded history for {len(self.plant_data)} plants")
+            path = self.history_file
+            if path.endswith(CODEC_EXTENSION) and not os.path.exists(path):
+                path = path[:-len(CODEC_EXTENSION)] + '.json'
+            if os.path.exists(path):
+                featurize = set()
+                for chunk in iter_readings(path):
+                    if 'Timestamp' not in chunk.columns:
+                        continue
+                    # Parse and order once; appends keep it ordered
+                    chunk['Timestamp'] = self._parse_timestamps(chunk['Timestamp'])
+                    for plant_id, rows in chunk.groupby('Plant_ID', sort=False):
+                        rows = rows.sort_values('Timestamp', kind='stable').reset_index(drop=True)
+                        with self._write_lock:
+                            history = self._history_for_write(int(plant_id))
+                            history.append(rows)
+                            self._enforce_budget(int(plant_id))
+                        if self.feature_store is not None:
+                            featurize.add(int(plant_id))
+                        # Loaded plants count as updated when their newest reading was taken
+                        self.latest.update_reading(int(plant_id), rows,
+                                                   rows['Timestamp'].iloc[-1].to_pydatetime().timestamp())
+                self.latest.sort_by_update()
+                
+                # Histories saved without features (JSON seeds, older files) are featurized once
+                for plant_id in featurize:
+                    with self._write_lock:
+                        history = self.histories[plant_id]
+                        history.restore()
+                        frame = history.snapshot().frame()
+                        if not self.feature_store.has_features(frame.columns):
+                            history.replace(self.feature_store.featurize_all(frame))
+                        self._enforce_budget(plant_id)
+                print(f"Loaded history for {len(self.histories)} plants")
         except Exception as e:
             print(f"Error loading history: {e}")
     
     def save_history(self):
-        """Save plant history to file"""
+        """Save plant history to file
+        
+        Plants are serialized one at a time, and spilled plants are decoded from
+        their spill files without becoming resident. A .tsc history file is
+        written in the compressed columnar format, anything else as JSON.
+        """
+        with self._save_lock:
+            self._save_history()
+    
+    def _save_history(self):
+        tmp_path = None
         try:
-            history_data = {}
-            for pid, pdata in self.plant_data.items():
-                # Convert timestamps to strings for JSON
-                pdata_copy = pdata.copy()
-                if 'Timestamp' in pdata_copy.columns:
-                    pdata_copy['Timestamp'] = pdata_copy['Timestamp'].dt.strftime("%Y-%m-%d %H:%M:%S.%f")
-                history_data[str(pid)] = pdata_copy.to_dict('records')
-
-            with open(self.history_file, 'w') as f:
-                json.dump(history_data, f)
+            # Unique temp file next to the history file, so the replace stays atomic
+            directory = os.path.dirname(self.history_file) or '.'
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.history_file) + '.',
+                                            suffix='.tmp', dir=directory)
+            os.close(fd)
+            saved = 0
+            if self.history_file.endswith(CODEC_EXTENSION):
+                with SeriesWriter(tmp_path) as writer:
+                    for pid, pdata in self._iter_saved_frames():
+                        writer.write_series(pid, pdata)
+                        saved += 1
+            else:
+                with open(tmp_path, 'w') as f:
+                    f.write('{')
+                    for pid, pdata in self._iter_saved_frames():
+                        # Convert timestamps to strings for JSON
+                        if 'Timestamp' in pdata.columns:
+                            pdata = pdata.assign(Timestamp=pdata['Timestamp'].dt.strftime("%Y-%m-%d %H:%M:%S.%f"))
+                        if saved:
+                            f.write(', ')
+                        f.write(f"{json.dumps(str(pid))}: {json.dumps(pdata.to_dict('records'))}")
+                        saved += 1
+                    f.write('}')
+            os.replace(tmp_path, self.history_file)
                 
-            print(f"History saved: {len(history_data)} plants")
+            print(f"History saved: {saved} plants")
         except Exception as e:
             print(f"Error saving history: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _iter_saved_frames(self):
+        """(plant_id, frame) for every plant, reading spilled ones from disk"""
+        for pid, history in list(self.histories.items()):
+            snapshot = history.snapshot()
+            if snapshot is None:
+                with self._write_lock:
+                    spill_path = history.spill_path
+                    if spill_path is not None:
+                        yield pid, PlantHistory.read_spilled(spill_path)
+                        continue
+                    snapshot = history.snapshot()
+            yield pid, snapshot.frame()
 
     def add_sensor_reading(self, data):
         """Add sensor reading to plant history"""
@@ -47,30 +158,264 @@ class DataService:
         df_row = pd.DataFrame([data])
 
         # Store in history
-        if plant_id not in self.plant_data:
-            self.plant_data[plant_id] = df_row
-        else:
-            self.plant_data[plant_id] = pd.concat([self.plant_data[plant_id], df_row])
-
-        # Keep only recent history (last 30 days)
-        if 'Timestamp' in self.plant_data[plant_id].columns:
-            self.plant_data[plant_id]['Timestamp'] = pd.to_datetime(self.plant_data[plant_id]['Timestamp'])
-            cutoff = pd.Timestamp.now() - pd.Timedelta(days=30)
-            self.plant_data[plant_id] = self.plant_data[plant_id][
-                self.plant_data[plant_id]['Timestamp'] > cutoff
-            ]
+        self._append(plant_id, df_row)
 
         # Save history
         self.save_history()
         
         return plant_id
     
+    def add_sensor_readings(self, readings, persist=True):
+        """Add a DataFrame of readings with a single append per plant"""
+        plant_ids = []
+        for plant_id, rows in readings.groupby('Plant_ID', sort=False):
+            plant_id = int(plant_id)
+            self._append(plant_id, rows)
+            plant_ids.append(plant_id)
+        
+        if persist:
+            self.save_history()
+        
+        return plant_ids
+    
+    def _append(self, plant_id, rows):
+        """Insert rows into a plant's history, keeping it ordered by timestamp"""
+        rows = rows.copy()
+        rows['Timestamp'] = self._parse_timestamps(rows['Timestamp'])
+        if not rows['Timestamp'].is_monotonic_increasing:
+            rows = rows.sort_values('Timestamp', kind='stable')
+        
+        # Keep only recent history
+        cutoff = self._retention_cutoff()
+        
+        with self._write_lock:
+            history = self._history_for_write(plant_id)
+            if history.spilled:
+                self.faults += 1
+            self._store(history, rows, cutoff)
+            self._enforce_budget(plant_id)
+        self.latest.update_reading(plant_id, rows)
+        
+        for listener in self.append_listeners:
+            try:
+                listener(plant_id, rows)
+            except Exception as e:
+                print(f"Error notifying append for plant {plant_id}: {e}")
+    
+    def backfill_readings(self, plant_id, rows):
+        """Bulk-append historical readings of one plant; returns (stored, duplicates, expired)
+        
+        Readings repeating a stored timestamp, or one earlier in rows, are
+        dropped (the last one in rows wins), as are readings outside the
+        retention window. Append listeners are not called: old readings do not
+        raise alerts.
+        """
+        rows = rows.copy()
+        rows['Timestamp'] = self._parse_timestamps(rows['Timestamp'])
+        rows = rows.sort_values('Timestamp', kind='stable')
+        
+        received = len(rows)
+        rows = rows.drop_duplicates('Timestamp', keep='last')
+        duplicates = received - len(rows)
+        
+        cutoff = self._retention_cutoff()
+        expired = 0
+        if cutoff is not None:
+            recent = (rows['Timestamp'] > cutoff).to_numpy()
+            expired = int(len(rows) - recent.sum())
+            rows = rows[recent]
+        if len(rows) == 0:
+            return 0, duplicates, expired
+        
+        with self._write_lock:
+            history = self._history_for_write(plant_id)
+            if history.spilled:
+                self.faults += 1
+                history.restore()
+            
+            # Drop readings whose timestamp is already stored
+            stored = history.snapshot().column('Timestamp')
+            if stored is not None and len(stored):
+                timestamps = rows['Timestamp'].to_numpy()
+                positions = np.minimum(np.searchsorted(stored, timestamps), len(stored) - 1)
+                repeated = stored[positions] == timestamps
+                duplicates += int(repeated.sum())
+                rows = rows[~repeated]
+            
+            if len(rows):
+                self._store(history, rows, cutoff)
+            self._enforce_budget(plant_id)
+        if len(rows):
+            self.latest.update_reading(plant_id, rows)
+        return len(rows), duplicates, expired
+    
+    def _store(self, history, rows, cutoff):
+        """Append parsed, ordered rows (and their features) to a history; callers hold the write lock"""
+        if self.feature_store is None:
+            history.append(rows, cutoff)
+            return
+        history.restore()
+        frame, features, replace = self.feature_store.featurize(history.snapshot(), rows)
+        if replace:
+            history.replace(frame, cutoff)
+        else:
+            history.append(frame, cutoff, features)
+    
+    def _retention_cutoff(self):
+        """Timestamp readings must be newer than to be kept, or None"""
+        if self.retention is None:
+            return None
+        return pd.Timestamp.now() - self.retention
+    
+    def _history_for_write(self, plant_id):
+        """The plant's history, created if new; callers hold the write lock"""
+        history = self.histories.get(plant_id)
+        if history is None:
+            history = self.histories[plant_id] = PlantHistory()
+        return history
+    
+    def _touch(self, plant_id):
+        """Mark a plant as most recently used"""
+        with self._residency_lock:
+            self._resident[plant_id] = True
+            self._resident.move_to_end(plant_id)
+    
+    def _enforce_budget(self, keep):
+        """Spill least recently used plants until resident memory fits the budget
+        
+        keep is the plant being used right now; it is never spilled. Callers hold
+        the write lock.
+        """
+        self._touch(keep)
+        if self.memory_budget is None:
+            return
+        
+        with self._residency_lock:
+            resident = list(self._resident)
+        total = sum(self.histories[pid].nbytes for pid in resident)
+        for plant_id in resident:
+            if total <= self.memory_budget:
+                break
+            if plant_id == keep:
+                continue
+            history = self.histories[plant_id]
+            total -= history.nbytes
+            try:
+                history.spill(os.path.join(self.spill_dir, f"{plant_id}{CODEC_EXTENSION}"))
+            except OSError as e:
+                print(f"Error spilling history for plant {plant_id}: {e}")
+                continue
+            self.spills += 1
+            with self._residency_lock:
+                self._resident.pop(plant_id, None)
+    
+    @staticmethod
+    def _parse_timestamps(timestamps):
+        """Parse timestamps, skipping format inference for ISO 8601 input"""
+        if pd.api.types.is_datetime64_any_dtype(timestamps):
+            return timestamps
+        try:
+            return pd.to_datetime(timestamps, format='ISO8601')
+        except (ValueError, TypeError):
+            return pd.to_datetime(timestamps)
+    
+    def get_snapshot(self, plant_id):
+        """Get an immutable, versioned view of a plant's history without copying"""
+        history = self.histories.get(plant_id)
+        if history is None:
+            return None
+        
+        snapshot = history.snapshot()
+        if snapshot is None:
+            # Spilled: fault the plant back in
+            with self._write_lock:
+                if history.spilled:
+                    history.restore()
+                    self.faults += 1
+                    self._enforce_budget(plant_id)
+                snapshot = history.snapshot()
+        elif self.memory_budget is not None:
+            self._touch(plant_id)
+        return snapshot
+    
     def get_plant_data(self, plant_id):
-        """Get data for a specific plant"""
-        if plant_id in self.plant_data:
-            return self.plant_data[plant_id].copy()
-        return None
+        """Get a private copy of a plant's data, ordered by timestamp
+        
+        Readers that only look at the data should use get_snapshot instead.
+        """
+        snapshot = self.get_snapshot(plant_id)
+        if snapshot is None:
+            return None
+        return snapshot.frame().copy()
+    
+    def iter_history_chunks(self, plant_id, columns=None, chunk_rows=CHUNK_ROWS):
+        """Yield a plant's history as {column: array} chunks without faulting it in
+        
+        Resident plants are sliced from one snapshot; spilled plants are decoded
+        from their spill file a chunk at a time, so memory stays bounded by the
+        chunk size.
+        """
+        history = self.histories.get(plant_id)
+        if history is None:
+            return
+        
+        snapshot = history.snapshot()
+        spill_path = history.spill_path
+        if snapshot is None and spill_path is not None:
+            for frame in SeriesReader(spill_path).iter_chunks('0', columns):
+                yield {name: frame[name].to_numpy() for name in frame.columns}
+            return
+        
+        if snapshot is None:
+            # Restored between the two reads
+            snapshot = history.snapshot()
+        names = [name for name in snapshot.columns if columns is None or name in columns]
+        for start in range(0, len(snapshot), chunk_rows):
+            yield {name: snapshot.columns[name][start:start + chunk_rows] for name in names}
+    
+    def get_history_length(self, plant_id):
+        """Get the number of stored readings for a plant, without faulting it in"""
+        history = self.histories.get(plant_id)
+        return len(history) if history is not None else 0
+    
+    def get_history_version(self, plant_id):
+        """Get the change counter for a plant's history, without faulting it in"""
+        history = self.histories.get(plant_id)
+        return history.version if history is not None else 0
+    
+    def get_residency(self):
+        """Memory budget use and where each plant's history currently lives"""
+        plants = {}
+        resident_bytes = 0
+        for plant_id, history in list(self.histories.items()):
+            nbytes = history.nbytes
+            resident_bytes += nbytes
+            plants[str(plant_id)] = {
+                "resident": not history.spilled,
+                "bytes": nbytes,
+                "readings": len(history)
+            }
+        spilled = sum(1 for plant in plants.values() if not plant['resident'])
+        return {
+            "memory_budget": self.memory_budget,
+            "resident_bytes": resident_bytes,
+            "resident_plants": len(plants) - spilled,
+            "spilled_plants": spilled,
+            "spills": self.spills,
+            "faults": self.faults,
+            "plants": plants
+        }
+    
+    def record_health(self, plant_id, health_data):
+        """Keep a plant's latest health prediction in the overview index"""
+        self.latest.update_health(plant_id, health_data)
+    
+    def get_overview(self, health=None, stale=None, sort='stalest', offset=0, limit=50):
+        """A page of newest readings and health per plant, from the latest-value index"""
+        overview = self.latest.page(health, stale, sort, offset, limit)
+        overview['counts'] = self.latest.counts()
+        return overview
     
     def get_all_plant_ids(self):
         """Get list of all plant IDs"""
-        return list(self.plant_data.keys())
\ No newline at end of file
+        return list(self.histories.keys())
\ No newline at end of file
@@ -0,0 +1,164 @@
+import json
+import base64
+import numpy as np
+import pandas as pd
+
+# Output formats: one reading per line, or one columnar batch per line
+EXPORT_FORMATS = ('ndjson', 'columnar')
+
+# Rows per exported batch; a cursor follows every batch
+EXPORT_BATCH_ROWS = 1000
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+def encode_cursor(query, plant_id, after, skip):
+    """Opaque resume token: the query plus the last exported position
+
+    after is the last exported Timestamp (ns) of plant_id and skip how many
+    readings with exactly that timestamp were already sent.
+    """
+    state = {"query": query, "plant_id": plant_id, "after": after, "skip": skip}
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+def decode_cursor(token):
+    """(query, position) from a cursor token; raises ValueError if it is malformed"""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return state['query'], (state['plant_id'], state['after'], state['skip'])
+    except (TypeError, KeyError, UnicodeError, json.JSONDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+class ExportService:
+    """Streams plant history for offline analysis in bounded memory
+
+    History is read chunk by chunk, straight from snapshots or spill files, and
+    written out batch by batch, so the export size never shows up in RSS. A
+    cursor after each batch lets a dropped client resume where it stopped.
+    """
+
+    def __init__(self, data_service, batch_rows=EXPORT_BATCH_ROWS):
+        self.data_service = data_service
+        self.batch_rows = batch_rows
+
+    def parse_query(self, args):
+        """(query, position) from request arguments or a cursor; raises ValueError"""
+        if args.get('cursor'):
+            return decode_cursor(args['cursor'])
+
+        export_format = args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+        plant_ids = args.get('plant_ids', 'all')
+        if plant_ids != 'all':
+            try:
+                plant_ids = sorted(int(pid) for pid in str(plant_ids).split(',') if pid.strip())
+            except ValueError:
+                raise ValueError("plant_ids must be a comma-separated list of integers or \"all\"")
+
+        bounds = {}
+        for name in ('start', 'end'):
+            if args.get(name):
+                try:
+                    bounds[name] = pd.Timestamp(args[name]).value
+                except (TypeError, ValueError):
+                    raise ValueError(f"{name} must be a timestamp")
+
+        fields = args.get('fields')
+        fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+
+        query = {
+            "plant_ids": plant_ids,
+            "start": bounds.get('start'),
+            "end": bounds.get('end'),
+            "fields": fields,
+            "format": export_format
+        }
+        return query, None
+
+    def stream(self, query, position=None):
+        """Yield the export as NDJSON lines: data, a cursor after each batch, then a summary"""
+        plant_ids = query['plant_ids']
+        if plant_ids == 'all':
+            plant_ids = sorted(self.data_service.get_all_plant_ids())
+
+        resume_plant, after, skip = position if position is not None else (None, None, 0)
+        columns = None if query['fields'] is None else ['Timestamp'] + query['fields']
+        rows = 0
+
+        for plant_id in plant_ids:
+            if resume_plant is not None:
+                if plant_id < resume_plant:
+                    continue
+                if plant_id > resume_plant:
+                    after, skip = None, 0
+                resume_plant = None
+
+            try:
+                for batch in self._plant_batches(plant_id, columns, query, after, skip):
+                    # Advance the resume position past this batch
+                    timestamps = batch['Timestamp'].astype('datetime64[ns]', copy=False).view(np.int64)
+                    last = int(timestamps[-1])
+                    ties = int(np.count_nonzero(timestamps == last))
+                    skip = skip + ties if last == after else ties
+                    after = last
+                    rows += len(timestamps)
+
+                    yield from self._format_batch(plant_id, batch, query['format'])
+                    yield json.dumps({"cursor": encode_cursor(query, plant_id, after, skip), "rows": rows}) + "\n"
+            except Exception as e:
+                print(f"Error exporting history for plant {plant_id}: {e}")
+                yield json.dumps({"error": f"Export failed for plant {plant_id}",
+                                  "cursor": encode_cursor(query, plant_id, after, skip), "rows": rows}) + "\n"
+                return
+            after, skip = None, 0
+
+        yield json.dumps({"done": True, "rows": rows}) + "\n"
+
+    def _plant_batches(self, plant_id, columns, query, after, skip):
+        """Filtered {column: array} batches of one plant, at most batch_rows each"""
+        for chunk in self.data_service.iter_history_chunks(plant_id, columns, self.batch_rows):
+            timestamps = chunk['Timestamp'].astype('datetime64[ns]', copy=False).view(np.int64)
+            if query['end'] is not None and len(timestamps) and timestamps[0] >= query['end']:
+                return
+
+            keep = np.ones(len(timestamps), dtype=bool)
+            if query['start'] is not None:
+                keep &= timestamps >= query['start']
+            if query['end'] is not None:
+                keep &= timestamps < query['end']
+            if after is not None:
+                keep &= timestamps >= after
+                if skip:
+                    # Drop the readings at the resume timestamp that were already sent
+                    tied = np.flatnonzero(timestamps == after)[:skip]
+                    keep[tied] = False
+                    skip -= len(tied)
+
+            if keep.all():
+                yield chunk
+            elif keep.any():
+                yield {name: values[keep] for name, values in chunk.items()}
+
+    @staticmethod
+    def _format_batch(plant_id, batch, export_format):
+        columns = {}
+        for name, values in batch.items():
+            if values.dtype.kind == 'M':
+                columns[name] = pd.DatetimeIndex(values).strftime(TIMESTAMP_FORMAT).tolist()
+            elif values.dtype.kind in 'fO':
+                # NaN is not valid JSON
+                columns[name] = [None if isinstance(value, float) and value != value else value
+                                 for value in values.tolist()]
+            else:
+                columns[name] = values.tolist()
+
+        if export_format == 'columnar':
+            yield json.dumps({"plant_id": plant_id, "length": len(batch['Timestamp']), "columns": columns}) + "\n"
+            return
+
+        names = list(columns)
+        if 'Plant_ID' not in columns:
+            names.append('Plant_ID')
+            columns['Plant_ID'] = [plant_id] * len(columns['Timestamp'])
+        yield "".join(json.dumps(dict(zip(names, values))) + "\n" for values in zip(*columns.values()))
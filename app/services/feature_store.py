@@ -0,0 +1,134 @@
+import time
+import threading
+import numpy as np
+import pandas as pd
+from app.services.data_service import HISTORY_RETENTION
+from app.services.history_store import PlantHistory
+from app.utils.data_processor import AVERAGED_FEATURES, materialize_features, stored_feature_columns, raw_columns
+
+class FeatureStore:
+    """Materializes model features as readings are stored
+
+    The process_for_prediction and process_for_lstm columns of each reading are
+    computed once, when it arrives, from the readings before it, and stored
+    next to it in the plant's history. They are persisted, spilled and trimmed
+    with the raw columns, so inference reads the newest row instead of
+    featurizing the history, and training and offline scoring read the same
+    point-in-time values the service predicted from.
+
+    An in-order append only featurizes the new rows against the trailing window;
+    a late reading recomputes the rows from its insertion point on.
+    """
+
+    def __init__(self, window=HISTORY_RETENTION):
+        # Trailing window the features are computed over: the history retention (None keeps all)
+        self.window = pd.Timedelta(window) if window is not None else None
+        self._lock = threading.Lock()
+
+        # Work counters
+        self.materialized = 0  # Rows featurized on arrival
+        self.recomputed = 0  # Stored rows featurized again after a late reading or schema change
+        self.seconds = 0.0
+
+    @staticmethod
+    def has_features(columns):
+        """Whether a history with these columns carries every stored feature"""
+        return set(stored_feature_columns(raw_columns(columns))) <= set(columns)
+
+    def featurize(self, snapshot, rows):
+        """(frame, features, replace) to store for rows arriving on top of snapshot
+
+        rows are raw readings ordered by a parsed Timestamp and snapshot the
+        plant's current, resident history (or None). When replace is False,
+        frame and the {name: array} features (None if frame has them) are the
+        rows to append; otherwise frame is the whole featurized history, to
+        replace the stored one with.
+        """
+        started = time.perf_counter()
+        rows = rows[raw_columns(rows.columns)].reset_index(drop=True)
+        stored = snapshot.columns if snapshot is not None and len(snapshot) else None
+
+        if stored is not None and set(rows.columns) <= stored.keys() and self.has_features(stored):
+            if rows['Timestamp'].to_numpy()[0] >= stored['Timestamp'][-1]:
+                frame, features = rows, self._featurize_appended(stored, rows)
+                replace = False
+            else:
+                frame, features = self._featurize_merged(snapshot.frame(), rows), None
+                replace = True
+        elif stored is not None:
+            # A new column or an unfeaturized history: featurize everything
+            history = snapshot.frame()
+            frame = self.featurize_all(PlantHistory._merge_sorted(history[raw_columns(history.columns)], rows))
+            features, replace = None, True
+        else:
+            frame, features = self.featurize_all(rows), None
+            replace = False
+
+        with self._lock:
+            self.seconds += time.perf_counter() - started
+        return frame, features, replace
+
+    def featurize_all(self, history):
+        """A raw, sorted history with every row featurized"""
+        history = history[raw_columns(history.columns)].reset_index(drop=True)
+        features = materialize_features(history, 0, self.window)
+        with self._lock:
+            self.materialized += len(history)
+        return pd.DataFrame({**{name: history[name].to_numpy() for name in history.columns}, **features})
+
+    def _featurize_appended(self, stored, rows):
+        """Features of rows, computed against the tail of the stored history they follow"""
+        start = self._context_start(stored['Timestamp'], rows['Timestamp'].iloc[0])
+
+        # Only the window of the feature inputs, straight from the snapshot arrays
+        context = {}
+        for name in raw_columns(stored.keys()):
+            if name != 'Timestamp' and name not in AVERAGED_FEATURES:
+                continue
+            new = rows[name].to_numpy() if name in rows.columns else np.full(len(rows), np.nan)
+            context[name] = np.concatenate([stored[name][start:], new])
+        features = materialize_features(context, len(stored['Timestamp']) - start, self.window)
+        with self._lock:
+            self.materialized += len(rows)
+        return features
+
+    def _featurize_merged(self, history, rows):
+        """The merged history, with features recomputed from the first late reading on"""
+        raw = history[raw_columns(history.columns)]
+        merged = PlantHistory._merge_sorted(raw, rows)
+        insert_at = int(np.searchsorted(history['Timestamp'].values, rows['Timestamp'].values[0], side='right'))
+
+        start = self._context_start(history['Timestamp'].values, rows['Timestamp'].iloc[0], insert_at)
+        features = materialize_features(merged.iloc[start:], insert_at - start, self.window)
+        with self._lock:
+            self.materialized += len(rows)
+            self.recomputed += len(merged) - insert_at - len(rows)
+
+        frame = {name: merged[name].to_numpy() for name in merged.columns}
+        for name, values in features.items():
+            frame[name] = np.concatenate([history[name].to_numpy()[:insert_at], values])
+        return pd.DataFrame(frame)
+
+    def _context_start(self, timestamps, timestamp, end=None):
+        """First stored row that featurizing a reading at timestamp needs
+
+        That is the readings inside its window, and at least the five before it
+        for averages, trends and rolling means. Without a window it is the
+        first row.
+        """
+        end = len(timestamps) if end is None else end
+        if self.window is None:
+            return 0
+        window_start = int(np.searchsorted(timestamps, np.datetime64(timestamp - self.window), side='right'))
+        return max(0, min(window_start, end - 5))
+
+    def stats(self):
+        """Featurization work done so far"""
+        with self._lock:
+            rows = self.materialized + self.recomputed
+            return {
+                "materialized": self.materialized,
+                "recomputed": self.recomputed,
+                "seconds": round(self.seconds, 3),
+                "us_per_row": round(self.seconds * 1e6 / rows, 1) if rows else 0.0
+            }
@@ -0,0 +1,177 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ForecastScheduler:
+    """Precomputes forecasts in the background for plants whose history changed"""
+
+    def __init__(self, forecast_service, data_service, workers=2, cpu_budget=1.0,
+                 poll_interval=1.0, default_days=3, view_ttl=3600, on_computed=None):
+        self.forecast_service = forecast_service
+        self.data_service = data_service
+        self.workers = max(1, workers)
+        self.cpu_budget = cpu_budget  # In cores, shared by all workers
+        self.poll_interval = poll_interval
+        self.default_days = default_days
+        self.view_ttl = view_ttl
+        self.on_computed = on_computed
+
+        # Precomputed forecasts keyed by (plant_id, days)
+        self.store = {}
+
+        # Scheduling state
+        self.dirty = set()
+        self.in_flight = set()
+        self.requested_days = {}
+        self.subscribers = {}
+        self.recent_views = {}
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='forecast-worker')
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start the scheduling loop, queueing every known plant"""
+        for plant_id in self.data_service.get_all_plant_ids():
+            self.notify_changed(plant_id)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop scheduling and wait for running jobs"""
+        self._running = False
+        self._wakeup.set()
+        self._executor.shutdown(wait=True)
+
+    def notify_changed(self, plant_id):
+        """Mark a plant's forecasts as needing recomputation"""
+        with self._lock:
+            self.dirty.add(plant_id)
+        self._wakeup.set()
+
+    def notify_model_changed(self, bundle=None):
+        """Queue every stored plant after a model swap; entries read as stale until redone"""
+        with self._lock:
+            self.dirty.update(plant_id for plant_id, _ in self.store)
+        self._wakeup.set()
+
+    def mark_current(self, plant_id):
+        """Accept the plant's stored forecasts for its latest history version
+
+        Called when a reading was judged too small a change to recompute for;
+        age_seconds keeps counting from the last real computation.
+        """
+        version = self.data_service.get_history_version(plant_id)
+        model_version = self.forecast_service.model_service.version
+        with self._lock:
+            if plant_id in self.dirty or plant_id in self.in_flight:
+                return
+            for (stored_id, _), entry in self.store.items():
+                if stored_id == plant_id and entry['model_version'] == model_version:
+                    entry['version'] = version
+
+    def subscribe(self, plant_id, sid):
+        """Track a socket client watching a plant"""
+        with self._lock:
+            self.subscribers.setdefault(plant_id, set()).add(sid)
+
+    def unsubscribe(self, sid):
+        """Drop a disconnected socket client from all plants"""
+        with self._lock:
+            for plant_id in list(self.subscribers):
+                self.subscribers[plant_id].discard(sid)
+                if not self.subscribers[plant_id]:
+                    del self.subscribers[plant_id]
+
+    def record_view(self, plant_id, days):
+        """Note a forecast read so the plant is prioritized and its horizon kept warm"""
+        with self._lock:
+            self.recent_views[plant_id] = time.time()
+            self.requested_days.setdefault(plant_id, {self.default_days}).add(days)
+
+    def get(self, plant_id, days):
+        """Return the precomputed forecast with a staleness indicator, or None"""
+        with self._lock:
+            entry = self.store.get((plant_id, days))
+        if entry is None:
+            return None
+
+        current_version = self.data_service.get_history_version(plant_id)
+        current_model = self.forecast_service.model_service.version
+        forecast_data = dict(entry['data'])
+        forecast_data['staleness'] = {
+            "stale": entry['version'] != current_version or entry['model_version'] != current_model,
+            "age_seconds": round(time.time() - entry['computed_at'], 3),
+            "computed_version": entry['version'],
+            "current_version": current_version,
+            "model_version": entry['model_version']
+        }
+        return forecast_data
+
+    def compute_now(self, plant_id, days):
+        """Compute a forecast on the caller's thread and store it"""
+        version = self.data_service.get_history_version(plant_id)
+        model_version = self.forecast_service.model_service.version
+        forecast_data = self.forecast_service.generate_plant_forecast_data(plant_id, days)
+        if forecast_data:
+            with self._lock:
+                self.store[(plant_id, days)] = {
+                    'version': version,
+                    'model_version': model_version,
+                    'computed_at': time.time(),
+                    'data': forecast_data
+                }
+        return forecast_data
+
+    def _priority(self, plant_id):
+        """Sort key: subscribed plants first, then most recently viewed"""
+        has_subscribers = bool(self.subscribers.get(plant_id))
+        last_view = self.recent_views.get(plant_id, 0)
+        if time.time() - last_view > self.view_ttl:
+            last_view = 0
+        return (not has_subscribers, -last_view, plant_id)
+
+    def _run(self):
+        """Dispatch dirty plants to the worker pool in priority order"""
+        while self._running:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+            with self._lock:
+                free_slots = self.workers - len(self.in_flight)
+                ready = sorted(self.dirty - self.in_flight, key=self._priority)[:max(0, free_slots)]
+                for plant_id in ready:
+                    self.dirty.discard(plant_id)
+                    self.in_flight.add(plant_id)
+
+            for plant_id in ready:
+                self._executor.submit(self._recompute, plant_id)
+
+    def _recompute(self, plant_id):
+        """Recompute every tracked horizon for a plant, throttled to the CPU budget"""
+        cpu_start = time.thread_time()
+        try:
+            with self._lock:
+                horizons = sorted(self.requested_days.get(plant_id, {self.default_days}))
+
+            for days in horizons:
+                forecast_data = self.compute_now(plant_id, days)
+                if forecast_data and days == self.default_days and self.on_computed:
+                    self.on_computed(forecast_data)
+        except Exception as e:
+            print(f"Error precomputing forecast for plant {plant_id}: {e}")
+        finally:
+            # Each worker may use cpu_budget / workers of a core on average
+            duty_cycle = min(1.0, self.cpu_budget / self.workers)
+            cpu_used = time.thread_time() - cpu_start
+            if duty_cycle < 1.0:
+                time.sleep(cpu_used * (1 / duty_cycle - 1))
+
+            with self._lock:
+                self.in_flight.discard(plant_id)
+            self._wakeup.set()
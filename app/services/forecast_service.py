@@ -1,15 +1,171 @@
 import pandas as pd
 import numpy as np
 import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
-from app.utils.data_processor import process_for_prediction, prepare_lstm_sequence, process_for_lstm
+from app.utils.data_processor import (process_for_prediction, build_lstm_sequences, process_for_lstm,
+                                      project_prediction_features)
+
+# Sensors simulated by the forecast rollouts, in update order
+FORECAST_FEATURES = ['Soil_Temperature', 'Humidity', 'Soil_Moisture', 'Light_Intensity',
+                     'Ambient_Temperature', 'Soil_pH', 'Nitrogen_Level', 'Phosphorus_Level',
+                     'Potassium_Level']
+
+# Threads running full forecasts for budgeted requests, and as many for their
+# fallbacks; a forecast that misses its budget keeps running and fills the cache
+# for the next request
+FORECAST_DEADLINE_WORKERS = 4
+
+# Degradations a budgeted forecast may apply, in order of preference
+FORECAST_DEGRADATIONS = ('cached', 'shorter_horizon', 'traditional')
+
+# Default weight of each model in the ensemble estimate
+ENSEMBLE_WEIGHTS = {'traditional': 0.5, 'lstm': 0.5}
+
+# Response keys for the simulated sensors
+FORECAST_KEYS = {
+    'Soil_Temperature': 'soil_temperature',
+    'Humidity': 'humidity',
+    'Soil_Moisture': 'soil_moisture',
+    'Light_Intensity': 'light_intensity',
+    'Ambient_Temperature': 'ambient_temperature',
+    'Soil_pH': 'soil_ph',
+    'Nitrogen_Level': 'nitrogen',
+    'Phosphorus_Level': 'phosphorus',
+    'Potassium_Level': 'potassium'
+}
+
+class InferenceContext:
+    """Inference inputs derived from one version of a plant's history
+    
+    Built once per history and model version and shared by the health,
+    forecast and emit paths, so an ingested reading is featurized a single
+    time. Every prediction made from a context uses the context's model
+    bundle, so a request started before a model swap finishes on one version.
+    """
+    
+    def __init__(self, plant_id, version, bundle, snapshot, featurized, trends):
+        history = snapshot.frame()
+        self.plant_id = plant_id
+        self.version = version
+        self.bundle = bundle
+        self.snapshot = snapshot
+        self.history = history  # Sorted DataFrame shared with DataService; read-only
+        self.length = len(history)
+        self.latest_data = history.iloc[-1:]
+        self.featurized = featurized  # process_for_prediction output for the latest row
+        
+        # Scaled (1, sequence_length, n_features) or None; see ForecastService.prepare_sequences
+        self.lstm_sequence = None
+        self.sequence_ready = False
+        self.trends = trends  # Hourly trends for the projected rollouts
+        
+        # Model outputs for the latest reading, filled on first use
+        self.predictions = {}
 
 class ForecastService:
     """Service for generating plant health forecasts"""
     
-    def __init__(self, model_service, data_service):
+    def __init__(self, model_service, data_service, ensemble_weights=None):
         self.model_service = model_service
         self.data_service = data_service
+        self.ensemble_weights = dict(ensemble_weights or ENSEMBLE_WEIGHTS)
+        
+        # Latest InferenceContext per plant
+        self._contexts = {}
+        self._contexts_lock = threading.Lock()
+        
+        # Runs the two models of an ensemble side by side; both release the GIL in native code
+        self._ensemble_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ensemble')
+        
+        # Latest forecast data per plant and horizon, served when a budgeted forecast runs late
+        self._recent_forecasts = {}
+        
+        # Full forecasts for budgeted requests; one in flight per plant and horizon
+        self._deadline_executor = ThreadPoolExecutor(max_workers=FORECAST_DEADLINE_WORKERS,
+                                                     thread_name_prefix='forecast-deadline')
+        
+        # Traditional-model fallbacks, started alongside full forecasts when nothing is cached
+        self._fallback_executor = ThreadPoolExecutor(max_workers=FORECAST_DEADLINE_WORKERS,
+                                                     thread_name_prefix='forecast-fallback')
+        self._pending_forecasts = {}
+        
+        # How often budgeted forecasts were answered in full or degraded
+        self._deadline_lock = threading.Lock()
+        self.deadline_counts = dict.fromkeys(('full',) + FORECAST_DEGRADATIONS + ('failed',), 0)
+    
+    def get_context(self, plant_id, bundle=None):
+        """Inference context for the plant's current history, built once per version
+        
+        bundle pins the model version; it defaults to the active one.
+        """
+        bundle = bundle or self.model_service.get_bundle()
+        snapshot = self.data_service.get_snapshot(plant_id)
+        if snapshot is None or len(snapshot) == 0:
+            return None
+        
+        with self._contexts_lock:
+            context = self._contexts.get(plant_id)
+        if context is not None and context.version == snapshot.version and context.bundle is bundle:
+            return context
+        
+        # Pin every featurizer to this exact history snapshot
+        history = snapshot.frame()
+        feature_store = self.data_service.feature_store
+        if feature_store is not None and feature_store.has_features(history.columns):
+            # Materialized when the reading was stored
+            featurized = history.iloc[-1:]
+        else:
+            featurized = process_for_prediction(plant_id, history.iloc[-1:], {plant_id: history})
+        
+        context = InferenceContext(plant_id, snapshot.version, bundle, snapshot, featurized,
+                                   self._calculate_trends(history))
+        with self._contexts_lock:
+            self._contexts[plant_id] = context
+        return context
+    
+    def prepare_sequences(self, contexts):
+        """Build the LSTM sequences the contexts still lack, many plants per pass"""
+        pending = {}
+        for context in contexts:
+            if not context.sequence_ready:
+                pending.setdefault(id(context.bundle), []).append(context)
+        
+        for group in pending.values():
+            bundle = group[0].bundle
+            sequence_length = bundle.get_sequence_length()
+            eligible = [context for context in group if context.length >= sequence_length]
+            if bundle.lstm_model is not None and eligible:
+                result = build_lstm_sequences({context.plant_id: context.snapshot for context in eligible}, bundle)
+                if result is not None:
+                    plant_ids, X = result
+                    rows = {plant_id: row for row, plant_id in enumerate(plant_ids)}
+                    for context in eligible:
+                        row = rows.get(context.plant_id)
+                        if row is not None:
+                            context.lstm_sequence = X[row:row + 1]
+            for context in group:
+                context.sequence_ready = True
+    
+    def on_model_swap(self, bundle):
+        """Drop contexts built for the old model version so it can be released"""
+        with self._contexts_lock:
+            self._contexts.clear()
+    
+    def _context_prediction(self, context, model='traditional'):
+        """Prediction for the context's latest reading, computed once per version"""
+        if model not in context.predictions:
+            if model == 'lstm':
+                result = None
+                self.prepare_sequences([context])
+                if context.lstm_sequence is not None:
+                    result = self.model_service.predict_lstm(context.lstm_sequence, bundle=context.bundle)
+            else:
+                result = self.model_service.predict_traditional(context.featurized, bundle=context.bundle)
+            context.predictions[model] = result
+        return context.predictions[model]
     
     def generate_forecast(self, plant_id, days=3):
         """Generate forecast using best available model"""
@@ -25,22 +181,16 @@ class ForecastService:
     def generate_lstm_forecast(self, plant_id, days=3):
         """Generate forecast using LSTM model"""
         try:
-            # Prepare sequence for LSTM
-            X_sequence = prepare_lstm_sequence(
-                plant_id, 
-                self.data_service.plant_data, 
-                self.model_service
-            )
-            
-            if X_sequence is None:
+            # Sequence for LSTM, prepared once per history version
+            context = self.get_context(plant_id)
+            if context is not None:
+                self.prepare_sequences([context])
+            if context is None or context.lstm_sequence is None:
                 print("Could not prepare LSTM sequence.")
                 return None
                 
             # Get current values for building forecast
-            plant_history = self.data_service.get_plant_data(plant_id)
-            plant_history['Timestamp'] = pd.to_datetime(plant_history['Timestamp'])
-            plant_history = plant_history.sort_values('Timestamp')
-            latest_data = plant_history.iloc[-1:].copy()
+            latest_data = context.latest_data
             timestamp = latest_data['Timestamp'].iloc[0]
                 
             # Create forecast datapoints
@@ -57,7 +207,7 @@ class ForecastService:
             }
             
             # Make prediction for current point
-            prediction = self.model_service.predict_lstm(X_sequence)
+            prediction = self._context_prediction(context, 'lstm')
             if prediction:
                 current_entry['predicted_health'] = prediction['predicted_health']
                 current_entry['confidence'] = prediction['confidence']
@@ -74,9 +224,6 @@ class ForecastService:
             
             forecast.append(current_entry)
             
-            # Generate future forecasts
-            current_sequence = X_sequence.copy()
-            
             # Initial values for forecast
             current_values = {
                 'Soil_Temperature': float(latest_data['Soil_Temperature'].iloc[0]),
@@ -105,8 +252,9 @@ class ForecastService:
                 # Simulate realistic patterns
                 self._update_forecast_values(current_values, hour_of_day, day_factor)
                 
-                # Make new prediction
-                pred = self.model_service.predict_lstm(current_sequence)
+                # The rollout does not advance the input sequence, so every
+                # step shares the prediction for the current sequence
+                pred = prediction
                 if not pred:
                     continue
                     
@@ -143,19 +291,16 @@ class ForecastService:
     def generate_traditional_forecast(self, plant_id, days=3):
         """Generate forecast using traditional model"""
         # Get historical data
-        plant_history = self.data_service.get_plant_data(plant_id)
-        if plant_history is None:
+        context = self.get_context(plant_id)
+        if context is None:
             return None
-            
-        plant_history['Timestamp'] = pd.to_datetime(plant_history['Timestamp'])
-        plant_history = plant_history.sort_values('Timestamp')
 
         # Get the most recent data point as our starting point
-        latest_data = plant_history.iloc[-1:].copy()
+        latest_data = context.latest_data
         timestamp = latest_data['Timestamp'].iloc[0]
 
-        # Calculate trends from historical data
-        trends = self._calculate_trends(plant_history)
+        # Trends from historical data
+        trends = context.trends
 
         # Create forecast datapoints
         forecast = []
@@ -170,13 +315,8 @@ class ForecastService:
             'soil_moisture': float(latest_data['Soil_Moisture'].iloc[0])
         }
         
-        # Process for prediction
-        processed_data = process_for_prediction(
-            plant_id, latest_data, self.data_service.plant_data
-        )
-        
         # Make prediction
-        prediction = self.model_service.predict_traditional(processed_data)
+        prediction = self._context_prediction(context)
         if prediction:
             current_entry['predicted_health'] = prediction['predicted_health']
             current_entry['confidence'] = prediction['confidence']
@@ -208,20 +348,12 @@ class ForecastService:
 
         # Apply day/night cycle patterns
         start_hour = timestamp.hour
+        steps = []
         
         for i in range(1, days * 6):  # Start from 1 because we already added current data
             # Update timestamp by 4 hours
             timestamp = timestamp + pd.Timedelta(hours=4)
             
-            # Create new data with projected values
-            new_data = latest_data.copy()
-            new_data['Timestamp'] = timestamp
-            
-            # Update time features
-            new_data['Hour'] = timestamp.hour
-            new_data['Day'] = timestamp.day
-            new_data['Month'] = timestamp.month
-            
             # Calculate hour of day for day/night cycle patterns
             hour_of_day = (start_hour + i * 4) % 24
             day_factor = min(1, max(0, math.sin((hour_of_day - 6) * math.pi / 12))) \
@@ -231,30 +363,29 @@ class ForecastService:
             self._update_forecast_values(
                 current_values, hour_of_day, day_factor, trends
             )
-            
-            # Update the data point with new values
-            for feature, value in current_values.items():
-                if feature in new_data.columns:
-                    new_data[feature] = value
-
-            # Process for prediction
-            processed_data = process_for_prediction(
-                plant_id, new_data, self.data_service.plant_data
-            )
-
-            # Make prediction
-            prediction = self.model_service.predict_traditional(processed_data)
-            if not prediction:
-                continue
+            steps.append((timestamp, dict(current_values)))
+        
+        if not steps:
+            return forecast
+        
+        # Featurize every projected step from the shared context and score them in one pass
+        projected = project_prediction_features(
+            context.featurized,
+            {feature: [values[feature] for _, values in steps] for feature in current_values},
+            [step_time for step_time, _ in steps],
+            context.history
+        )
+        predictions = self.model_service.predict_traditional_batch(projected, bundle=context.bundle) or []
 
+        for (timestamp, values), prediction in zip(steps, predictions):
             # Add to forecast
             forecast_entry = {
                 'date': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
                 'timestamp': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
                 'forecast_type': 'forecast',
-                'soil_temperature': float(current_values['Soil_Temperature']),
-                'humidity': float(current_values['Humidity']),
-                'soil_moisture': float(current_values['Soil_Moisture']),
+                'soil_temperature': float(values['Soil_Temperature']),
+                'humidity': float(values['Humidity']),
+                'soil_moisture': float(values['Soil_Moisture']),
                 'predicted_health': prediction['predicted_health'],
                 'confidence': prediction['confidence']
             }
@@ -266,8 +397,8 @@ class ForecastService:
                             ('Nitrogen_Level', 'nitrogen'),
                             ('Phosphorus_Level', 'phosphorus'),
                             ('Potassium_Level', 'potassium')]:
-                if src in current_values:
-                    forecast_entry[dst] = float(current_values[src])
+                if src in values:
+                    forecast_entry[dst] = float(values[src])
                     
             forecast.append(forecast_entry)
 
@@ -364,10 +495,189 @@ class ForecastService:
             elif feature in ['Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level']:
                 current_values[feature] = max(5, min(50, current_values[feature]))
     
+    def generate_probabilistic_forecast(self, plant_id, days=3, samples=200,
+                                       quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """Monte Carlo forecast with per-step quantile bands
+        
+        Simulates all trajectories at once as a (samples, steps, features) array
+        and scores every projected reading in one RandomForest pass.
+        """
+        context = self.get_context(plant_id)
+        if context is None:
+            return None
+            
+        try:
+            plant_history = context.history
+            latest_data = context.latest_data
+            start = latest_data['Timestamp'].iloc[0]
+            
+            defaults = {'Light_Intensity': 500, 'Ambient_Temperature': 22, 'Soil_pH': 6.5,
+                        'Nitrogen_Level': 30, 'Phosphorus_Level': 30, 'Potassium_Level': 30}
+            initial = np.array([
+                float(latest_data[f].iloc[0]) if f in latest_data.columns else defaults[f]
+                for f in FORECAST_FEATURES
+            ])
+            trends = context.trends
+            trend_vector = np.array([trends.get(f, 0) for f in FORECAST_FEATURES])
+            volatility = self._estimate_step_volatility(plant_history)
+            
+            # Step 0 is the current reading, then one step every 4 hours
+            steps = days * 6
+            rng = np.random.default_rng()
+            trajectories = np.empty((samples, steps, len(FORECAST_FEATURES)))
+            state = np.tile(initial, (samples, 1))
+            trajectories[:, 0, :] = state
+            
+            timestamps = [start + pd.Timedelta(hours=4 * i) for i in range(steps)]
+            for i in range(1, steps):
+                hour_of_day = (start.hour + i * 4) % 24
+                day_factor = min(1, max(0, math.sin((hour_of_day - 6) * math.pi / 12))) \
+                             if hour_of_day >= 6 and hour_of_day <= 18 else 0
+                self._update_forecast_values_batch(state, hour_of_day, day_factor,
+                                                   trend_vector, volatility, rng)
+                trajectories[:, i, :] = state
+            
+            # Score every (sample, step) reading in a single model call
+            processed_row = context.featurized
+            flat = trajectories.reshape(samples * steps, -1)
+            projected = project_prediction_features(
+                processed_row,
+                {f: flat[:, j] for j, f in enumerate(FORECAST_FEATURES)},
+                np.tile(np.array(timestamps, dtype='datetime64[ns]'), samples),
+                plant_history
+            )
+            proba = self.model_service.predict_traditional_proba(projected, bundle=context.bundle)
+            if proba is None:
+                return None
+            classes, probabilities = proba
+            probabilities = probabilities.reshape(samples, steps, len(classes))
+            
+            # Reduce across samples
+            labels = [f"p{int(round(q * 100))}" for q in quantiles]
+            sensor_bands = np.quantile(trajectories, quantiles, axis=0)
+            proba_bands = np.quantile(probabilities, quantiles, axis=0)
+            proba_mean = probabilities.mean(axis=0)
+            class_votes = probabilities.argmax(axis=2)
+            
+            forecast = []
+            for i, timestamp in enumerate(timestamps):
+                entry = {
+                    'date': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                    'timestamp': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                    'forecast_type': 'current' if i == 0 else 'forecast',
+                    'predicted_health': str(classes[proba_mean[i].argmax()]),
+                    'sensors': {
+                        FORECAST_KEYS[f]: {label: float(sensor_bands[k, i, j]) for k, label in enumerate(labels)}
+                        for j, f in enumerate(FORECAST_FEATURES)
+                    },
+                    'health_probability': {
+                        str(name): dict(
+                            mean=float(proba_mean[i, c]),
+                            **{label: float(proba_bands[k, i, c]) for k, label in enumerate(labels)}
+                        )
+                        for c, name in enumerate(classes)
+                    },
+                    'health_distribution': {
+                        str(name): float((class_votes[:, i] == c).mean()) for c, name in enumerate(classes)
+                    }
+                }
+                forecast.append(entry)
+            
+            return {
+                "plant_id": plant_id,
+                "forecast_generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "days_forecasted": days,
+                "mode": "probabilistic",
+                "samples": samples,
+                "quantiles": list(quantiles),
+                "forecast": forecast
+            }
+            
+        except Exception as e:
+            print(f"Error in probabilistic forecasting: {e}")
+            return None
+    
+    def _estimate_step_volatility(self, plant_history, step_hours=4):
+        """Standard deviation of each sensor's observed change over one forecast step"""
+        timestamps = plant_history['Timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        step = int(step_hours * 3600 * 1e9)
+        
+        # Pair each reading with the latest one at least a step earlier
+        earlier = np.searchsorted(timestamps, timestamps - step, side='right') - 1
+        valid = (earlier >= 0) & (timestamps - timestamps[np.maximum(earlier, 0)] <= 2 * step)
+        
+        volatility = np.zeros(len(FORECAST_FEATURES))
+        for j, feature in enumerate(FORECAST_FEATURES):
+            if feature not in plant_history.columns:
+                continue
+            values = plant_history[feature].to_numpy(dtype=float)
+            if valid.sum() >= 2:
+                changes = values[valid] - values[earlier[valid]]
+            else:
+                # Too little history to span a step; use reading-to-reading changes
+                changes = np.diff(values)
+            if len(changes) >= 2:
+                volatility[j] = np.nanstd(changes)
+        
+        return np.nan_to_num(volatility)
+    
+    def _update_forecast_values_batch(self, state, hour_of_day, day_factor, trends, volatility, rng):
+        """Vectorized _update_forecast_values over a (samples, features) state, plus process noise"""
+        idx = {feature: j for j, feature in enumerate(FORECAST_FEATURES)}
+        ambient = state[:, idx['Ambient_Temperature']].copy()
+        
+        # Soil temp follows ambient with delay
+        soil_temp = state[:, idx['Soil_Temperature']]
+        soil_temp += (ambient - soil_temp) * 0.05
+        
+        # Humidity inversely related to ambient temp
+        humidity = state[:, idx['Humidity']]
+        humidity *= 0.8
+        humidity += (70 - (ambient - 20) * 2) * 0.2
+        np.clip(humidity, 30, 90, out=humidity)
+        
+        # Moisture decreases gradually until watering
+        moisture = state[:, idx['Soil_Moisture']]
+        moisture += np.where(moisture < 20, 15, trends[idx['Soil_Moisture']] - 0.3)
+        np.clip(moisture, 10, 90, out=moisture)
+        
+        # Light follows day/night cycle
+        if hour_of_day >= 6 and hour_of_day <= 18:
+            target_light = 200 + day_factor * 600
+        else:
+            target_light = 100 * min(1, (6 - hour_of_day % 6) / 6 if hour_of_day < 6 else (hour_of_day - 18) / 6)
+        light = state[:, idx['Light_Intensity']]
+        light *= 0.7
+        light += target_light * 0.3
+        
+        # Temperature follows day/night cycle with delay
+        if 8 <= hour_of_day <= 16:
+            temp_target = 22 + day_factor * 6
+        else:
+            temp_target = 22 - (1 - day_factor) * 4
+        ambient_temp = state[:, idx['Ambient_Temperature']]
+        ambient_temp *= 0.9
+        ambient_temp += temp_target * 0.1
+        
+        # Other features follow their trends with some randomness
+        other = [idx[f] for f in ['Soil_pH', 'Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level']]
+        random_factor = (rng.random((state.shape[0], len(other))) - 0.5) * 0.2
+        state[:, other] += trends[other] * (1 + random_factor)
+        
+        # Process noise sized from the plant's own history
+        state += rng.standard_normal(state.shape) * volatility
+        
+        # Apply realistic constraints
+        np.clip(humidity, 0, 100, out=humidity)
+        np.clip(moisture, 0, 100, out=moisture)
+        np.clip(state[:, idx['Soil_pH']], 4.5, 8.5, out=state[:, idx['Soil_pH']])
+        for feature in ['Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level']:
+            np.clip(state[:, idx[feature]], 5, 50, out=state[:, idx[feature]])
+    
     def generate_plant_forecast_data(self, plant_id, days=3):
         """Generate forecast data for real-time updates"""
-        plant_data = self.data_service.get_plant_data(plant_id)
-        if plant_data is None or len(plant_data) < 6:
+        context = self.get_context(plant_id)
+        if context is None or context.length < 6:
             return None
 
         try:
@@ -376,70 +686,361 @@ class ForecastService:
             if not forecast:
                 return None
 
-            return {
+            forecast_data = {
                 "plant_id": plant_id,
                 "forecast_generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "days_forecasted": days,
                 "forecast": forecast
             }
+            with self._deadline_lock:
+                self._recent_forecasts.setdefault(plant_id, {})[days] = {
+                    'version': context.version,
+                    'model_version': context.bundle.version,
+                    'computed_at': time.time(),
+                    'data': forecast_data
+                }
+            return forecast_data
 
         except Exception as e:
             print(f"Error generating forecast data: {e}")
             return None
     
+    def generate_forecast_within(self, plant_id, days, budget_ms, compute=None):
+        """Forecast data within a latency budget, degraded if the full forecast runs late
+        
+        The full forecast (compute(plant_id, days), by default
+        generate_plant_forecast_data) runs on a worker thread. If it does not
+        finish within budget_ms, the answer falls back to the freshest cached
+        forecast covering the horizon, then to a cached shorter horizon, then to
+        the traditional-model forecast, or a one-day one if the full forecast
+        already is traditional. When nothing is cached, that model fallback is
+        started alongside the full forecast, so it is usually ready by the
+        deadline; if not, whichever of the two finishes first answers. The late
+        forecast keeps running and is cached for the next request. The
+        'degradation' key of the result states what was applied; None budget_ms
+        waits for the full forecast.
+        """
+        start = time.perf_counter()
+        compute = compute or self.generate_plant_forecast_data
+        full = self._submit_pending(self._deadline_executor, (plant_id, days), compute, plant_id, days)
+        
+        # Nothing cached to fall back on: run the model fallback now rather than after the deadline
+        fallback = None
+        if budget_ms is not None and not full.done() and not self._has_cached_forecast(plant_id):
+            fallback = self._submit_pending(self._fallback_executor, ('fallback', plant_id, days),
+                                            self._model_fallback, plant_id, days)
+        
+        applied = None
+        try:
+            timeout = None if budget_ms is None else min(max(budget_ms, 0) / 1000, threading.TIMEOUT_MAX)
+            forecast_data = full.result(timeout=timeout)
+        except FutureTimeoutError:
+            forecast_data, applied = self._cached_fallback(plant_id, days)
+            if forecast_data is None and fallback is not None:
+                done, _ = wait([full, fallback], return_when=FIRST_COMPLETED)
+                if full in done and full.exception() is None and full.result():
+                    forecast_data, applied = full.result(), None
+                else:
+                    forecast_data, applied = fallback.result()
+        except Exception as e:
+            print(f"Error generating forecast data: {e}")
+            forecast_data = None
+        
+        outcome = (applied or 'full') if forecast_data else 'failed'
+        with self._deadline_lock:
+            self.deadline_counts[outcome] += 1
+        if not forecast_data:
+            return None
+        
+        forecast_data = dict(forecast_data)
+        forecast_data['degradation'] = {
+            "applied": applied,
+            "budget_ms": budget_ms,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+            "days_requested": days
+        }
+        return forecast_data
+    
+    def _submit_pending(self, executor, key, fn, *args):
+        """The running future for key, or fn(*args) submitted to executor"""
+        with self._deadline_lock:
+            future = self._pending_forecasts.get(key)
+            if future is None:
+                future = executor.submit(fn, *args)
+                self._pending_forecasts[key] = future
+                future.add_done_callback(lambda done: self._forget_pending(key, done))
+        return future
+    
+    def _forget_pending(self, key, future):
+        with self._deadline_lock:
+            if self._pending_forecasts.get(key) is future:
+                del self._pending_forecasts[key]
+    
+    def _has_cached_forecast(self, plant_id):
+        with self._deadline_lock:
+            return bool(self._recent_forecasts.get(plant_id))
+    
+    def _cached_fallback(self, plant_id, days):
+        """(cached forecast data, degradation), or (None, None) if the plant has none"""
+        with self._deadline_lock:
+            recent = dict(self._recent_forecasts.get(plant_id, {}))
+        
+        # Freshest cached forecast at least as long as requested, cut to the horizon
+        covering = [entry for cached_days, entry in recent.items() if cached_days >= days]
+        if covering:
+            entry = max(covering, key=lambda entry: entry['computed_at'])
+            forecast_data = dict(entry['data'], days_forecasted=days,
+                                 forecast=entry['data']['forecast'][:days * 6])
+            return self._with_cache_staleness(plant_id, forecast_data, entry), 'cached'
+        
+        # Longest cached shorter horizon
+        if recent:
+            entry = recent[max(recent)]
+            return self._with_cache_staleness(plant_id, dict(entry['data']), entry), 'shorter_horizon'
+        return None, None
+    
+    def _model_fallback(self, plant_id, days):
+        """(forecast data, degradation) from the traditional model; one day if the full forecast is traditional"""
+        try:
+            context = self.get_context(plant_id)
+            if context is None:
+                return None, None
+            if context.bundle.lstm_model is not None:
+                fallback_days, applied = days, 'traditional'
+            else:
+                fallback_days, applied = min(days, 1), 'shorter_horizon'
+            forecast = self.generate_traditional_forecast(plant_id, fallback_days)
+            if not forecast:
+                return None, None
+            return {
+                "plant_id": plant_id,
+                "forecast_generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "days_forecasted": fallback_days,
+                "forecast": forecast
+            }, applied
+        
+        except Exception as e:
+            print(f"Error generating fallback forecast: {e}")
+            return None, None
+    
+    def _with_cache_staleness(self, plant_id, forecast_data, entry):
+        """Cached forecast data with the same staleness indicator as the precomputed store"""
+        current_version = self.data_service.get_history_version(plant_id)
+        current_model = self.model_service.version
+        forecast_data['staleness'] = {
+            "stale": entry['version'] != current_version or entry['model_version'] != current_model,
+            "age_seconds": round(time.time() - entry['computed_at'], 3),
+            "computed_version": entry['version'],
+            "current_version": current_version,
+            "model_version": entry['model_version']
+        }
+        return forecast_data
+    
+    def deadline_stats(self):
+        """How budgeted forecasts were answered, in full or by each degradation"""
+        with self._deadline_lock:
+            counts = dict(self.deadline_counts)
+            pending = len(self._pending_forecasts)
+        total = sum(counts.values())
+        degraded = sum(counts[name] for name in FORECAST_DEGRADATIONS)
+        return {
+            "requests": total,
+            "counts": counts,
+            "degraded_rate": round(degraded / total, 4) if total else 0.0,
+            "pending": pending
+        }
+    
     def get_plant_health_data(self, plant_id):
         """Generate plant health data for real-time updates"""
-        plant_df = self.data_service.get_plant_data(plant_id)
-        if plant_df is None or len(plant_df) == 0:
+        context = self.get_context(plant_id)
+        if context is None:
             return None
             
         try:
-            # Get the most recent data
-            plant_df = plant_df.sort_values('Timestamp')
-            latest_data = plant_df.iloc[-1:].copy()
-
-            # Add derived features for prediction
-            latest_data = process_for_prediction(
-                plant_id, latest_data, self.data_service.plant_data
-            )
-
-            # Make prediction
-            prediction = self.model_service.predict_traditional(latest_data)
+            # Latest reading with derived features, shared with the forecast path
+            prediction = self._context_prediction(context)
             if not prediction:
                 print('No prediction available.')
                 return None
                 
-            # Prepare reading data for response
-            readings = {
-                "soil_temperature": float(latest_data['Soil_Temperature'].iloc[0]),
-                "humidity": float(latest_data['Humidity'].iloc[0]),
-                "soil_moisture": float(latest_data['Soil_Moisture'].iloc[0])
+            health_data = self._build_health_data(plant_id, context.featurized, prediction)
+            self.data_service.record_health(plant_id, health_data)
+            return health_data
+
+        except Exception as e:
+            print(f"Error generating health data: {e}")
+            return None
+    
+    def get_ensemble_health_data(self, plant_id):
+        """Health from the RandomForest and the LSTM run concurrently, plus a combined estimate
+        
+        Latency is that of the slower model. Each model's probabilities are
+        temperature-scaled with the bundle's optional 'calibration' config, then
+        pooled with the ensemble weights. If one model is unavailable, the
+        other's result is returned and the missing model is listed as degraded.
+        """
+        context = self.get_context(plant_id)
+        if context is None:
+            return None
+        
+        try:
+            start = time.perf_counter()
+            futures = {model: self._ensemble_executor.submit(self._timed_prediction, context, model)
+                       for model in ('traditional', 'lstm')}
+            outputs = {model: future.result() for model, future in futures.items()}
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            
+            models = {}
+            for model, (prediction, latency_ms) in outputs.items():
+                if prediction:
+                    models[model] = dict(prediction, latency_ms=round(latency_ms, 3))
+            if not models:
+                print('No prediction available.')
+                return None
+            
+            combined = self._combine_predictions(models, context.bundle)
+            health_data = self._build_health_data(plant_id, context.featurized, combined)
+            health_data['ensemble'] = {
+                "models": models,
+                "weights": {model: self.ensemble_weights.get(model, 0.0) for model in models},
+                "agreement": len({prediction['predicted_health'] for prediction in models.values()}) == 1,
+                "degraded": sorted(set(futures) - set(models)),
+                "latency_ms": round(elapsed_ms, 3)
             }
+            return health_data
+        
+        except Exception as e:
+            print(f"Error generating ensemble health data: {e}")
+            return None
+    
+    def _timed_prediction(self, context, model):
+        start = time.perf_counter()
+        prediction = self._context_prediction(context, model)
+        return prediction, (time.perf_counter() - start) * 1000
+    
+    def _combine_predictions(self, models, bundle):
+        """Weighted average of temperature-calibrated class probabilities, aligned by class name"""
+        calibration = (bundle.model_config or {}).get('calibration', {})
+        combined = {}
+        total_weight = 0.0
+        for model, prediction in models.items():
+            weight = self.ensemble_weights.get(model, 0.0)
+            if weight <= 0:
+                continue
+            names = list(prediction['confidence'])
+            probabilities = np.array([prediction['confidence'][name] for name in names], dtype=float)
             
-            # Add additional readings if available
-            additional_fields = [
-                ('Ambient_Temperature', 'ambient_temperature'),
-                ('Light_Intensity', 'light_intensity'),
-                ('Soil_pH', 'soil_ph'),
-                ('Nitrogen_Level', 'nitrogen'),
-                ('Phosphorus_Level', 'phosphorus'),
-                ('Potassium_Level', 'potassium'),
-                ('Chlorophyll_Content', 'chlorophyll'),
-                ('Electrochemical_Signal', 'ec_signal')
-            ]
-            
-            for orig_field, resp_field in additional_fields:
-                if orig_field in latest_data.columns:
-                    readings[resp_field] = float(latest_data[orig_field].iloc[0])
+            # Temperature scaling: T > 1 softens an overconfident model
+            temperature = calibration.get(model, 1.0)
+            if temperature != 1.0:
+                probabilities = np.power(np.clip(probabilities, 1e-12, 1.0), 1.0 / temperature)
+                probabilities /= probabilities.sum()
+            
+            for name, probability in zip(names, probabilities):
+                combined[name] = combined.get(name, 0.0) + weight * float(probability)
+            total_weight += weight
+        
+        if total_weight == 0:
+            # Only zero-weighted models answered; use the first as is
+            prediction = next(iter(models.values()))
+            return {"predicted_health": prediction['predicted_health'], "confidence": prediction['confidence']}
 
-            return {
-                "plant_id": plant_id,
-                "timestamp": latest_data['Timestamp'].iloc[0].strftime("%Y-%m-%d %H:%M:%S"),
-                "predicted_health": prediction['predicted_health'],
-                "confidence": prediction['confidence'],
-                "current_readings": readings
-            }
+        confidence = {name: probability / total_weight for name, probability in combined.items()}
+        return {
+            "predicted_health": max(confidence, key=confidence.get),
+            "confidence": confidence
+        }
+    
+    def _build_health_data(self, plant_id, latest_data, prediction):
+        """Assemble the health payload for a plant's latest reading"""
+        # Prepare reading data for response
+        readings = {
+            "soil_temperature": float(latest_data['Soil_Temperature'].iloc[0]),
+            "humidity": float(latest_data['Humidity'].iloc[0]),
+            "soil_moisture": float(latest_data['Soil_Moisture'].iloc[0])
+        }
+        
+        # Add additional readings if available
+        additional_fields = [
+            ('Ambient_Temperature', 'ambient_temperature'),
+            ('Light_Intensity', 'light_intensity'),
+            ('Soil_pH', 'soil_ph'),
+            ('Nitrogen_Level', 'nitrogen'),
+            ('Phosphorus_Level', 'phosphorus'),
+            ('Potassium_Level', 'potassium'),
+            ('Chlorophyll_Content', 'chlorophyll'),
+            ('Electrochemical_Signal', 'ec_signal')
+        ]
+        
+        for orig_field, resp_field in additional_fields:
+            if orig_field in latest_data.columns:
+                readings[resp_field] = float(latest_data[orig_field].iloc[0])
 
-        except Exception as e:
-            print(f"Error generating health data: {e}")
-            return None
\ No newline at end of file
+        return {
+            "plant_id": plant_id,
+            "timestamp": latest_data['Timestamp'].iloc[0].strftime("%Y-%m-%d %H:%M:%S"),
+            "predicted_health": prediction['predicted_health'],
+            "confidence": prediction['confidence'],
+            "current_readings": readings
+        }
+    
+    def get_batch_health_data(self, plant_ids, include_lstm=True):
+        """Predict health for many plants with one model pass per model
+        
+        Yields one result per requested plant, in the order given.
+        """
+        # One model version for the whole batch
+        bundle = self.model_service.get_bundle()
+        
+        # Gather each plant's featurized latest reading from its context
+        contexts = {}
+        featurized = {}
+        for plant_id in plant_ids:
+            try:
+                context = self.get_context(plant_id, bundle)
+            except Exception as e:
+                print(f"Error featurizing plant {plant_id}: {e}")
+                continue
+            if context is None:
+                continue
+            
+            contexts[plant_id] = context
+            featurized[plant_id] = context.featurized
+        
+        # LSTM inputs for the whole fleet in one vectorized pass
+        sequences = {}
+        if include_lstm:
+            self.prepare_sequences(contexts.values())
+            sequences = {plant_id: context.lstm_sequence for plant_id, context in contexts.items()
+                         if context.lstm_sequence is not None}
+        
+        # Single RandomForest pass over every plant
+        predictions = {}
+        if featurized:
+            feature_matrix = pd.concat(featurized.values(), ignore_index=True)
+            results = self.model_service.predict_traditional_batch(feature_matrix, bundle=bundle)
+            if results:
+                predictions = dict(zip(featurized.keys(), results))
+                for plant_id, result in predictions.items():
+                    contexts[plant_id].predictions['traditional'] = result
+        
+        # Single LSTM pass over the plants with enough history
+        lstm_predictions = {}
+        if sequences:
+            results = self.model_service.predict_lstm_batch(
+                np.concatenate(list(sequences.values()), axis=0), bundle=bundle
+            )
+            if results:
+                lstm_predictions = dict(zip(sequences.keys(), results))
+                for plant_id, result in lstm_predictions.items():
+                    contexts[plant_id].predictions['lstm'] = result
+        
+        for plant_id in plant_ids:
+            if plant_id not in predictions:
+                yield {"plant_id": plant_id, "error": f"No data available for Plant ID {plant_id}"}
+                continue
+            
+            health_data = self._build_health_data(plant_id, featurized[plant_id], predictions[plant_id])
+            if plant_id in lstm_predictions:
+                health_data['lstm'] = lstm_predictions[plant_id]
+            yield health_data
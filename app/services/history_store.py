@@ -0,0 +1,255 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from app.utils.data_processor import SORTED_FLAG
+from app.utils.timeseries_codec import write_frame, read_frame
+
+MIN_CAPACITY = 64
+
+# Object values sampled to estimate a column's heap size
+OBJECT_SIZE_SAMPLE = 64
+
+def _buffer_dtype(values):
+    """Storage dtype for a column: numbers and datetimes stay native, the rest is object"""
+    if values.dtype.kind in 'iubfM':
+        return values.dtype
+    return np.dtype(object)
+
+class HistorySnapshot:
+    """Immutable view of one version of a plant's history
+
+    Columns are read-only NumPy arrays sharing the store's buffers. Writers only
+    fill slots past the end of a published snapshot or publish fresh buffers, so
+    a snapshot never changes under its readers and needs no lock.
+    """
+
+    def __init__(self, version, columns, length):
+        self.version = version
+        self.columns = columns
+        self.length = length
+        self._frame = None
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        """Read-only array for one column, or None"""
+        return self.columns.get(name)
+
+    def tail(self, n):
+        """Read-only views of the last n rows of every column"""
+        start = max(0, self.length - n)
+        return {name: values[start:] for name, values in self.columns.items()}
+
+    def frame(self):
+        """DataFrame over the snapshot's arrays, built once per version
+
+        The frame is shared by every reader of this version and must not be
+        modified; its arrays are read-only, so in-place writes raise.
+        """
+        frame = self._frame
+        if frame is None:
+            frame = pd.DataFrame(self.columns, copy=False)
+            frame.attrs[SORTED_FLAG] = True
+            self._frame = frame
+        return frame
+
+class PlantHistory:
+    """Columnar, timestamp-ordered history for one plant
+
+    In-order appends write into spare buffer capacity (doubled when full), and
+    trimming only advances the start offset, so the common write path never
+    copies the live rows. Late readings and new columns rebuild the buffers.
+    A cold history can be spilled to a compressed file; its length and version
+    stay known while the rows are on disk.
+    """
+
+    def __init__(self, frame=None):
+        self.version = 0
+        self._buffers = {}
+        self._start = 0
+        self._end = 0
+        self._snapshot = HistorySnapshot(0, {}, 0)
+        self._nbytes = None
+
+        # Set while the rows live on disk instead of in the buffers
+        self.spill_path = None
+        self._spilled_length = 0
+        self._spilled_version = None  # Version the file at spill_path holds
+        
+        if frame is not None and len(frame):
+            self._rebuild(frame)
+            self._publish()
+
+    def __len__(self):
+        if self.spill_path is not None:
+            return self._spilled_length
+        return self._end - self._start
+
+    @property
+    def spilled(self):
+        return self.spill_path is not None
+
+    def snapshot(self):
+        """Latest published snapshot, or None while spilled; safe to call from any thread"""
+        return self._snapshot
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the buffers, including object column payloads"""
+        if self.spill_path is not None:
+            return 0
+        if self._nbytes is None:
+            total = 0
+            for buffer in self._buffers.values():
+                total += buffer.nbytes
+                if buffer.dtype.kind == 'O' and len(self):
+                    live = buffer[self._start:self._end]
+                    sample = live[::max(1, len(live) // OBJECT_SIZE_SAMPLE)]
+                    total += int(np.mean([sys.getsizeof(value) for value in sample]) * len(live))
+            self._nbytes = total
+        return self._nbytes
+
+    def spill(self, path):
+        """Write the rows to a compressed file and release the buffers
+
+        A file still holding this version is reused. Readers keep their
+        snapshots; callers serialize spill, restore and append.
+        """
+        if self.spill_path is not None:
+            return
+        if self._spilled_version != self.version or not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            write_frame(path, self._snapshot.frame())
+            self._spilled_version = self.version
+
+        self._spilled_length = len(self)
+        self.spill_path = path
+        self._buffers = {}
+        self._start = self._end = 0
+        self._snapshot = None
+        self._nbytes = None
+
+    def restore(self):
+        """Load spilled rows back into buffers under the same version"""
+        if self.spill_path is None:
+            return
+        self._rebuild(self.read_spilled(self.spill_path))
+        self.spill_path = None
+        self._publish(bump=False)
+
+    @staticmethod
+    def read_spilled(path):
+        """DataFrame of a spilled history, decoded without making it resident"""
+        frame = read_frame(path)
+        frame.attrs[SORTED_FLAG] = True
+        return frame
+
+    def append(self, rows, cutoff=None, columns=None):
+        """Add rows ordered by a parsed Timestamp and drop readings before cutoff
+
+        columns holds more {name: array} values for the same rows, e.g. their
+        materialized features. Callers serialize writes; readers keep using
+        their snapshots meanwhile.
+        """
+        self.restore()
+        values = {name: rows[name].to_numpy() for name in rows.columns}
+        if columns:
+            values.update(columns)
+        if len(self) == 0:
+            self._rebuild(pd.DataFrame(values, copy=False))
+        elif (self._fits(values) and
+                rows['Timestamp'].iloc[0] >= self._buffers['Timestamp'][self._end - 1]):
+            # In-order arrival: write into spare capacity
+            self._reserve(len(rows))
+            end = self._end + len(rows)
+            for name, buffer in self._buffers.items():
+                buffer[self._end:end] = values[name]
+            self._end = end
+        else:
+            # Late readings or a changed schema: merge and rebuild
+            self._rebuild(self._merge_sorted(self._snapshot.frame(), pd.DataFrame(values, copy=False)))
+
+        if cutoff is not None:
+            timestamps = self._buffers['Timestamp'][self._start:self._end]
+            self._start += int(timestamps.searchsorted(np.datetime64(cutoff), side='right'))
+
+        self._publish()
+
+    def replace(self, frame, cutoff=None):
+        """Replace the rows with frame, ordered by a parsed Timestamp, and drop readings before cutoff"""
+        self.spill_path = None
+        self._rebuild(frame)
+        if cutoff is not None:
+            timestamps = self._buffers['Timestamp'][self._start:self._end]
+            self._start += int(timestamps.searchsorted(np.datetime64(cutoff), side='right'))
+        self._publish()
+
+    def _fits(self, values):
+        """Whether {name: array} values have our columns and store without losing precision"""
+        if values.keys() != self._buffers.keys():
+            return False
+        for name, buffer in self._buffers.items():
+            if buffer.dtype.kind != 'O' and not np.can_cast(values[name].dtype, buffer.dtype, 'same_kind'):
+                return False
+        return True
+
+    def _reserve(self, count):
+        """Make room for count more rows, compacting and doubling when full"""
+        capacity = len(self._buffers['Timestamp'])
+        if self._end + count <= capacity:
+            return
+
+        # Fresh buffers: published snapshots keep the old ones
+        length = len(self)
+        capacity = max(MIN_CAPACITY, 2 * (length + count))
+        buffers = {}
+        for name, buffer in self._buffers.items():
+            grown = np.empty(capacity, dtype=buffer.dtype)
+            grown[:length] = buffer[self._start:self._end]
+            buffers[name] = grown
+        self._buffers = buffers
+        self._start = 0
+        self._end = length
+
+    def _rebuild(self, frame):
+        """Replace the buffers with a copy of frame"""
+        length = len(frame)
+        capacity = max(MIN_CAPACITY, 2 * length)
+        buffers = {}
+        for name in frame.columns:
+            values = frame[name].to_numpy()
+            buffer = np.empty(capacity, dtype=_buffer_dtype(values))
+            buffer[:length] = values
+            buffers[name] = buffer
+        self._buffers = buffers
+        self._start = 0
+        self._end = length
+
+    def _publish(self, bump=True):
+        if bump:
+            self.version += 1
+        self._nbytes = None
+        columns = {}
+        for name, buffer in self._buffers.items():
+            view = buffer[self._start:self._end]
+            view.flags.writeable = False
+            columns[name] = view
+        self._snapshot = HistorySnapshot(self.version, columns, len(self))
+
+    @staticmethod
+    def _merge_sorted(history, rows):
+        """Merge sorted rows into sorted history in O(n) without re-sorting"""
+        positions = np.searchsorted(history['Timestamp'].values, rows['Timestamp'].values, side='right')
+
+        # New row k lands after the k earlier new rows; history fills the other slots
+        new_slots = positions + np.arange(len(rows))
+        order = np.empty(len(history) + len(rows), dtype=np.int64)
+        is_new = np.zeros(len(order), dtype=bool)
+        is_new[new_slots] = True
+        order[~is_new] = np.arange(len(history))
+        order[new_slots] = len(history) + np.arange(len(rows))
+
+        combined = pd.concat([history, rows], ignore_index=True)
+        return combined.take(order).reset_index(drop=True)
@@ -0,0 +1,202 @@
+import pandas as pd
+from datetime import datetime
+
+# Fields every reading must carry
+REQUIRED_FIELDS = [
+    'Plant_ID',
+    'Soil_Temperature',
+    'Humidity',
+    'Soil_Moisture'
+]
+
+# Optional fields with default values
+OPTIONAL_FIELDS = {
+    'Ambient_Temperature': 22.0,  # Default room temperature
+    'Light_Intensity': 500.0,     # Default medium light
+    'Soil_pH': 7.0,               # Default neutral pH
+    'Nitrogen_Level': 30.0,       # Default values based on training data
+    'Phosphorus_Level': 30.0,
+    'Potassium_Level': 30.0,
+    'Chlorophyll_Content': 35.0,
+    'Electrochemical_Signal': 1.0
+}
+
+# Sensor fields the change detector watches
+CHANGE_FIELDS = REQUIRED_FIELDS[1:] + list(OPTIONAL_FIELDS)
+
+class IngestService:
+    """Stores incoming sensor readings and runs the inference pipeline on them"""
+
+    def __init__(self, data_service, forecast_service, forecast_scheduler=None, change_detector=None,
+                 alert_engine=None):
+        self.data_service = data_service
+        self.forecast_service = forecast_service
+        self.forecast_scheduler = forecast_scheduler
+
+        # Optional gate that reuses the last result for readings that barely moved
+        self.change_detector = change_detector
+
+        # Optional alert engine; sensor rules run as readings are stored, health rules here
+        self.alert_engine = alert_engine
+
+        # Socket emitter, set by the routes: emit(event, payload)
+        self.emit = None
+
+    def validate(self, data):
+        """Return an error message for an invalid reading, or None"""
+        if not isinstance(data, dict):
+            return "Reading must be a JSON object"
+        for field in REQUIRED_FIELDS:
+            if field not in data:
+                return f"Missing required field: {field}"
+        if not isinstance(data['Plant_ID'], int) or isinstance(data['Plant_ID'], bool):
+            return "Plant_ID must be an integer"
+        return None
+
+    def ingest(self, data):
+        """Store one reading, then predict and publish updates for its plant"""
+        # Add default values for missing optional fields
+        for field, default_value in OPTIONAL_FIELDS.items():
+            if field not in data:
+                data[field] = default_value
+
+        # Add timestamp if not provided
+        if 'Timestamp' not in data:
+            data['Timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+        # Store data
+        plant_id = self.data_service.add_sensor_reading(data)
+
+        # Make a prediction with the new data
+        prediction_result = self.process_update(plant_id, data)
+
+        response = {
+            "received": True,
+            "plant_id": plant_id,
+            "timestamp": data['Timestamp']
+        }
+
+        if prediction_result:
+            response["predicted_health"] = prediction_result
+
+        return response
+
+    def ingest_frame(self, readings, persist=True):
+        """Store a DataFrame of complete readings, then update each plant once
+
+        Callers ingesting at a high rate pass persist=False and save the history
+        themselves on a timer, since each save rewrites the whole file.
+        """
+        plant_ids = self.data_service.add_sensor_readings(readings, persist=persist)
+
+        # Only the newest reading per plant is published
+        latest = readings.loc[readings.groupby('Plant_ID', sort=False)['Timestamp'].idxmax()]
+        for record in latest.to_dict('records'):
+            record['Timestamp'] = str(record['Timestamp'])
+            self.process_update(int(record['Plant_ID']), record)
+
+        return plant_ids
+
+    def process_update(self, plant_id, data):
+        """Predict health for a freshly stored reading and publish the updates"""
+        prediction_result = None
+        try:
+            if self.data_service.get_history_length(plant_id) > 0:
+                health_data = None
+                forecast_data = None
+                gate = None
+                if self.change_detector is not None:
+                    model_version = self.forecast_service.model_service.version
+                    gate = self.change_detector.check(plant_id, data, model_version)
+                    health_data = self._reuse_inference(plant_id, data, gate)
+
+                if health_data is None:
+                    # Prepare real-time update data
+                    health_data = self._infer(plant_id, gate)
+
+                    # The scheduler recomputes and emits the forecast in the background
+                    if self.forecast_scheduler is not None:
+                        self.forecast_scheduler.notify_changed(plant_id)
+                    else:
+                        forecast_data = self.forecast_service.generate_plant_forecast_data(plant_id)
+
+                # Get prediction result
+                if health_data:
+                    prediction_result = health_data.get('predicted_health')
+                    self._emit('plant_health_update', health_data)
+                    if self.alert_engine is not None and prediction_result:
+                        self.alert_engine.observe_health(plant_id, prediction_result, data['Timestamp'])
+
+                if forecast_data:
+                    self._emit('plant_forecast_update', forecast_data)
+
+                # Also emit a general sensor update event
+                self._emit('sensor_reading', {
+                    'plant_id': plant_id,
+                    'timestamp': data['Timestamp'],
+                    'readings': {
+                        'soil_moisture': data['Soil_Moisture'],
+                        'soil_temperature': data['Soil_Temperature'],
+                        'humidity': data['Humidity'],
+                        'ambient_temperature': data['Ambient_Temperature'],
+                        'light_intensity': data['Light_Intensity'],
+                        'soil_ph': data['Soil_pH'],
+                        'nitrogen': data['Nitrogen_Level'],
+                        'phosphorus': data['Phosphorus_Level'],
+                        'potassium': data['Potassium_Level']
+                    }
+                })
+
+        except Exception as e:
+            print(f"Prediction error for new data: {e}")
+
+        return prediction_result
+
+    def _reuse_inference(self, plant_id, data, gate):
+        """Health for this reading from the last result if the gate lets it skip inference, else None"""
+        infer, reason, drift = gate
+        if infer:
+            return None
+
+        result, inferred_at = self.change_detector.last_result(plant_id)
+        if result is None:
+            return None
+
+        # Only the prediction is reused; readings and timestamp are this reading's
+        reading = pd.DataFrame([data])
+        reading['Timestamp'] = pd.to_datetime(reading['Timestamp'])
+        health_data = self.forecast_service._build_health_data(plant_id, reading, result)
+
+        # Stored forecasts stay valid for this reading too
+        if self.forecast_scheduler is not None:
+            self.forecast_scheduler.mark_current(plant_id)
+        return self._with_freshness(health_data, True, inferred_at, reason, drift)
+
+    def _infer(self, plant_id, gate=None):
+        """Run full inference and hand the result to the gate for reuse"""
+        health_data = self.forecast_service.get_plant_health_data(plant_id)
+        if gate is None or not health_data:
+            return health_data
+
+        model_version = self.forecast_service.model_service.version
+        self.change_detector.record(plant_id, health_data, model_version)
+        _, inferred_at = self.change_detector.last_result(plant_id)
+        _, reason, drift = gate
+        return self._with_freshness(health_data, False, inferred_at, reason, drift)
+
+    @staticmethod
+    def _with_freshness(health_data, reused, inferred_at, reason, drift):
+        health_data = dict(health_data)
+        health_data['inference'] = {
+            "reused": reused,
+            # None when the gate could not track the reading, e.g. a sensor value was missing
+            "inferred_at": (datetime.fromtimestamp(inferred_at).strftime("%Y-%m-%d %H:%M:%S")
+                            if inferred_at is not None else None),
+            "reason": reason,
+            "drift": round(drift, 3) if drift is not None else None
+        }
+        return health_data
+
+    def _emit(self, event, payload):
+        if self.emit is not None:
+            self.emit(event, payload)
@@ -0,0 +1,211 @@
+import time
+import threading
+from bisect import insort
+from collections import OrderedDict
+
+# Reading fields kept per plant, with their response keys (as in the health payload)
+READING_KEYS = {
+    'Soil_Temperature': 'soil_temperature',
+    'Humidity': 'humidity',
+    'Soil_Moisture': 'soil_moisture',
+    'Ambient_Temperature': 'ambient_temperature',
+    'Light_Intensity': 'light_intensity',
+    'Soil_pH': 'soil_ph',
+    'Nitrogen_Level': 'nitrogen',
+    'Phosphorus_Level': 'phosphorus',
+    'Potassium_Level': 'potassium',
+    'Chlorophyll_Content': 'chlorophyll',
+    'Electrochemical_Signal': 'ec_signal'
+}
+
+# Sort orders for overview pages
+OVERVIEW_SORTS = ('stalest', 'freshest', 'plant_id')
+
+class LatestEntry:
+    """Newest reading and last health prediction of one plant"""
+
+    def __init__(self, plant_id):
+        self.plant_id = plant_id
+        self.timestamp = None  # Newest reading's Timestamp
+        self.readings = {}
+        self.updated_at = None  # Wall-clock seconds when that reading arrived
+        self.health = None
+        self.confidence = None
+        self.health_at = None
+
+    def to_dict(self, now, stale_after):
+        age = now - self.updated_at
+        return {
+            "plant_id": self.plant_id,
+            "timestamp": self.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "readings": self.readings,
+            "predicted_health": self.health,
+            "confidence": self.confidence,
+            "health_timestamp": self.health_at,
+            "updated_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.updated_at)),
+            "age_seconds": round(age, 1),
+            "stale": age > stale_after
+        }
+
+class LatestValueIndex:
+    """Each plant's newest reading and health, kept in update order
+
+    Plants live in an OrderedDict ordered by last update, plus one per health
+    status, so a page ordered by staleness (optionally for one status) costs
+    O(offset + page size) and never touches history or models. Changed plants
+    are remembered until drain_changes hands them to the summary stream.
+    """
+
+    def __init__(self, stale_after=600.0):
+        self.stale_after = stale_after  # Seconds without a reading before a plant counts as stale
+        self.entries = {}
+        self._by_update = OrderedDict()  # plant_id -> None, stalest first
+        self._by_health = {}  # health -> OrderedDict, stalest first
+        self._plant_ids = []  # Sorted, for plant_id order
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def update_reading(self, plant_id, rows, updated_at=None):
+        """Record the newest of rows (timestamp-ordered) if it is newer than the plant's current reading"""
+        if len(rows) == 0:
+            return
+        last = rows.iloc[-1]
+        timestamp = last['Timestamp']
+        readings = {}
+        for field, key in READING_KEYS.items():
+            if field in rows.columns:
+                try:
+                    readings[key] = float(last[field])
+                except (TypeError, ValueError):
+                    continue
+
+        with self._lock:
+            entry = self.entries.get(plant_id)
+            if entry is None:
+                entry = self.entries[plant_id] = LatestEntry(plant_id)
+                insort(self._plant_ids, plant_id)
+            elif timestamp < entry.timestamp:
+                return
+            entry.timestamp = timestamp
+            entry.readings = readings
+            entry.updated_at = time.time() if updated_at is None else updated_at
+            self._move_to_end(entry)
+            self._changed.add(plant_id)
+
+    def update_health(self, plant_id, health_data):
+        """Record the latest health prediction of a plant"""
+        with self._lock:
+            entry = self.entries.get(plant_id)
+            if entry is None:
+                return
+            previous = entry.health
+            entry.health = health_data.get('predicted_health')
+            confidence = health_data.get('confidence') or {}
+            entry.confidence = round(float(confidence.get(entry.health, 0.0)), 4) if confidence else None
+            entry.health_at = health_data.get('timestamp')
+            if entry.health != previous:
+                if previous is not None:
+                    self._by_health[previous].pop(plant_id, None)
+                if entry.health is not None:
+                    self._insert_by_update(entry)
+            self._changed.add(plant_id)
+
+    def sort_by_update(self):
+        """Reorder every plant by updated_at, after a bulk load"""
+        with self._lock:
+            order = sorted(self.entries.values(), key=lambda entry: entry.updated_at)
+            self._by_update = OrderedDict((entry.plant_id, None) for entry in order)
+            self._by_health = {}
+            for entry in order:
+                if entry.health is not None:
+                    self._by_health.setdefault(entry.health, OrderedDict())[entry.plant_id] = None
+
+    def page(self, health=None, stale=None, sort='stalest', offset=0, limit=50):
+        """One page of overview rows and whether more follow; total counts the health filter only
+
+        sort is 'stalest', 'freshest' or 'plant_id'. Staleness orders stop as
+        soon as they pass the stale boundary; plant_id order with a filter scans
+        IDs until the page is full.
+        """
+        now = time.time()
+        with self._lock:
+            if health is not None:
+                ordered = self._by_health.get(health, OrderedDict())
+                total = len(ordered)
+            else:
+                ordered = self._by_update
+                total = len(self.entries)
+
+            if sort == 'plant_id':
+                plant_ids = self._plant_ids
+            elif sort == 'freshest':
+                plant_ids = reversed(ordered)
+            else:
+                plant_ids = iter(ordered)
+
+            rows = []
+            skipped = 0
+            has_more = False
+            for plant_id in plant_ids:
+                entry = self.entries[plant_id]
+                if health is not None and entry.health != health:
+                    continue
+                is_stale = now - entry.updated_at > self.stale_after
+                if stale is not None and is_stale != stale:
+                    # Stale plants come first in staleness order; past the boundary nothing else matches
+                    if (sort == 'stalest' and stale) or (sort == 'freshest' and not stale):
+                        break
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if len(rows) == limit:
+                    has_more = True
+                    break
+                rows.append(entry.to_dict(now, self.stale_after))
+
+        return {"total": total, "offset": offset, "limit": limit, "has_more": has_more, "plants": rows}
+
+    def drain_changes(self):
+        """Rows of the plants changed since the last call"""
+        now = time.time()
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            return [self.entries[plant_id].to_dict(now, self.stale_after)
+                    for plant_id in sorted(changed) if plant_id in self.entries]
+
+    def counts(self):
+        """Plants per health status; plants not yet predicted count as 'unknown'"""
+        with self._lock:
+            counts = {health: len(ordered) for health, ordered in self._by_health.items() if ordered}
+            unknown = len(self.entries) - sum(counts.values())
+        if unknown:
+            counts['unknown'] = unknown
+        return counts
+
+    def _move_to_end(self, entry):
+        # Callers hold the lock
+        self._by_update[entry.plant_id] = None
+        self._by_update.move_to_end(entry.plant_id)
+        if entry.health is not None:
+            # Its newest reading is the freshest one, in its health bucket too
+            ordered = self._by_health.setdefault(entry.health, OrderedDict())
+            ordered[entry.plant_id] = None
+            ordered.move_to_end(entry.plant_id)
+
+    def _insert_by_update(self, entry):
+        """Add a plant to its health bucket at its updated_at position
+
+        A prediction can land on a stale plant, so joining a bucket must not
+        put it last: page() relies on the buckets staying in update order.
+        Callers hold the lock.
+        """
+        ordered = self._by_health.setdefault(entry.health, OrderedDict())
+        fresher = []
+        for plant_id in reversed(ordered):
+            if self.entries[plant_id].updated_at <= entry.updated_at:
+                break
+            fresher.append(plant_id)
+        ordered[entry.plant_id] = None
+        for plant_id in reversed(fresher):
+            ordered.move_to_end(plant_id)
@@ -1,19 +1,53 @@
+import os
+import time
 import joblib
 import pickle
+import threading
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras.models import load_model as load_keras_model
 
-class ModelService:
-    """Manages loading and using ML models for prediction"""
+# Artifact file names inside a versioned model directory
+MODEL_FILE = "plant_health_prediction_model.joblib"
+LSTM_MODEL_FILE = "plant_health_lstm_model.h5"
+FEATURE_SCALER_FILE = "feature_scaler.pkl"
+LABEL_ENCODER_FILE = "label_encoder.pkl"
+FEATURE_COLUMNS_FILE = "feature_columns.pkl"
+MODEL_CONFIG_FILE = "model_config.pkl"
+
+# Registry file naming the active version, so restarts keep it
+ACTIVE_VERSION_FILE = "ACTIVE"
+
+# Version name for the unversioned artifacts in config/ and data/processed/
+LEGACY_VERSION = "legacy"
+
+def read_active_version(registry_dir):
+    """Version recorded as active in a registry directory, or None"""
+    if not registry_dir:
+        return None
+    try:
+        with open(os.path.join(registry_dir, ACTIVE_VERSION_FILE)) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    if not version or not os.path.isdir(os.path.join(registry_dir, version)):
+        return None
+    return version
+
+class ModelBundle:
+    """One version of the traditional and LSTM models with their preprocessing objects"""
     
-    def __init__(self, model_path, lstm_path, scaler_path, encoder_path, 
-                 features_path, config_path):
+    def __init__(self, version, model_path, lstm_path, scaler_path, encoder_path, 
+                 features_path, config_path, lstm_warmup_batch_sizes=(1,)):
+        self.version = version
+        self.loaded_at = None
         self.model_path = model_path
         self.lstm_path = lstm_path
         self.scaler_path = scaler_path
         self.encoder_path = encoder_path
         self.features_path = features_path
         self.config_path = config_path
+        self.lstm_warmup_batch_sizes = lstm_warmup_batch_sizes
         
         # Initialize model variables
         self.model = None
@@ -23,16 +57,38 @@ class ModelService:
         self.feature_columns = None
         self.model_config = None
         
-        # Load models on initialization
-        self.load_models()
+        # Compiled LSTM forward pass; None falls back to model.predict
+        self.lstm_predict_fn = None
+        
+    @classmethod
+    def from_directory(cls, version, directory, **kwargs):
+        """Bundle for the artifacts in a versioned model directory"""
+        return cls(version,
+                   os.path.join(directory, MODEL_FILE),
+                   os.path.join(directory, LSTM_MODEL_FILE),
+                   os.path.join(directory, FEATURE_SCALER_FILE),
+                   os.path.join(directory, LABEL_ENCODER_FILE),
+                   os.path.join(directory, FEATURE_COLUMNS_FILE),
+                   os.path.join(directory, MODEL_CONFIG_FILE),
+                   **kwargs)
     
     def load_models(self):
         """Load traditional and LSTM models"""
         self._load_traditional_model()
         self._load_lstm_model()
+        self.loaded_at = time.time()
         
         return self.model is not None and self.lstm_model is not None
     
+    def warm_up(self, sample=None):
+        """Run the traditional model once so its first real request is not the slowest"""
+        if self.model is None or sample is None:
+            return
+        try:
+            self.predict_traditional_proba(sample)
+        except Exception as e:
+            print(f"Error warming up traditional model: {e}")
+    
     def _load_traditional_model(self):
         """Load traditional ML model"""
         try:
@@ -66,11 +122,54 @@ class ModelService:
                 self.model_config = pickle.load(f)
                 
             print("LSTM model loaded successfully")
+            
+            self._compile_lstm_predict()
             return True
         except Exception as e:
             print(f"Error loading LSTM model: {e}")
             return False
     
+    def _lstm_input_shape(self):
+        """(sequence_length, n_features) the LSTM expects"""
+        input_shape = getattr(self.lstm_model, 'input_shape', None)
+        if input_shape is not None and len(input_shape) == 3 and input_shape[2]:
+            return input_shape[1] or self.get_sequence_length(), input_shape[2]
+        return self.get_sequence_length(), len(self.feature_columns)
+    
+    def _compile_lstm_predict(self):
+        """Trace the LSTM once with a fixed signature and warm it up
+        
+        Calling the traced function skips model.predict's data adapter and
+        batching loop, which dominate the cost of small batches.
+        """
+        self.lstm_predict_fn = None
+        try:
+            sequence_length, n_features = self._lstm_input_shape()
+            model = self.lstm_model
+            
+            @tf.function(input_signature=[
+                tf.TensorSpec(shape=(None, sequence_length, n_features), dtype=tf.float32)
+            ])
+            def lstm_forward(X):
+                return model(X, training=False)
+            
+            # Trace and warm up for the batch sizes we serve, checking parity with predict
+            rng = np.random.default_rng(0)
+            for batch_size in self.lstm_warmup_batch_sizes:
+                X = rng.random((batch_size, sequence_length, n_features), dtype=np.float32)
+                compiled = np.asarray(lstm_forward(tf.constant(X)))
+                expected = model.predict(X, verbose=0)
+                if not np.allclose(compiled, expected, rtol=1e-5, atol=1e-6):
+                    print("Compiled LSTM output differs from predict; using predict")
+                    return False
+            
+            self.lstm_predict_fn = lstm_forward
+            print(f"LSTM predict compiled for (None, {sequence_length}, {n_features})")
+            return True
+        except Exception as e:
+            print(f"Error compiling LSTM predict: {e}")
+            return False
+    
     def get_sequence_length(self):
         """Get sequence length from model config"""
         if self.model_config:
@@ -79,6 +178,30 @@ class ModelService:
     
     def predict_traditional(self, processed_data):
         """Make prediction with traditional model"""
+        results = self.predict_traditional_batch(processed_data.iloc[:1])
+        if not results:
+            return None
+        return results[0]
+    
+    def predict_traditional_batch(self, processed_data):
+        """Make predictions for every row with a single model pass"""
+        proba = self.predict_traditional_proba(processed_data)
+        if proba is None:
+            return None
+            
+        classes, probabilities = proba
+        predictions = classes[probabilities.argmax(axis=1)]
+        
+        return [
+            {
+                "predicted_health": prediction,
+                "confidence": {class_name: float(prob) for class_name, prob in zip(classes, row)}
+            }
+            for prediction, row in zip(predictions, probabilities)
+        ]
+    
+    def predict_traditional_proba(self, processed_data):
+        """Return (classes, probability matrix) from a single model pass"""
         if self.model is None:
             return None
             
@@ -87,42 +210,258 @@ class ModelService:
             prediction_columns = [col for col in processed_data.columns
                                 if col not in ['Timestamp', 'Plant_Health_Status']]
             
-            # Make prediction
             X_pred = processed_data[prediction_columns]
-            prediction = self.model.predict(X_pred)[0]
-            probabilities = self.model.predict_proba(X_pred)[0]
-            classes = self.model.classes_
-            
-            result = {
-                "predicted_health": prediction,
-                "confidence": {class_name: float(prob) for class_name, prob in zip(classes, probabilities)}
-            }
-            
-            return result
+            return self.model.classes_, self.model.predict_proba(X_pred)
         except Exception as e:
             print(f"Error predicting with traditional model: {e}")
             return None
     
     def predict_lstm(self, X_sequence):
         """Make prediction with LSTM model"""
+        results = self.predict_lstm_batch(X_sequence[:1])
+        if not results:
+            return None
+        return results[0]
+    
+    def predict_lstm_batch(self, X_sequences):
+        """Make predictions for a (n, sequence_length, n_features) batch in one call"""
         if self.lstm_model is None or self.label_encoder is None:
             return None
             
         try:
             # Make prediction
-            prediction = self.lstm_model.predict(X_sequence, verbose=0)[0]
-            pred_class = int(prediction.argmax())
-            class_name = self.label_encoder.classes_[pred_class]
+            if self.lstm_predict_fn is not None:
+                predictions = np.asarray(self.lstm_predict_fn(tf.constant(np.asarray(X_sequences, dtype=np.float32))))
+            else:
+                predictions = self.lstm_model.predict(X_sequences, verbose=0)
+            classes = self.label_encoder.classes_
             
-            result = {
-                "predicted_health": class_name,
-                "confidence": {
-                    name: float(prob) for name, prob in 
-                    zip(self.label_encoder.classes_, prediction)
+            return [
+                {
+                    "predicted_health": classes[int(prediction.argmax())],
+                    "confidence": {
+                        name: float(prob) for name, prob in zip(classes, prediction)
+                    }
                 }
-            }
-            
-            return result
+                for prediction in predictions
+            ]
         except Exception as e:
             print(f"Error predicting with LSTM model: {e}")
-            return None
\ No newline at end of file
+            return None
+
+class ModelService:
+    """Manages versioned ML models and hot-swaps them without downtime
+    
+    Versions live in registry_dir/<version>/ using the artifact file names
+    above. A new version is loaded and warmed up on a background thread, then
+    published with a single reference swap; requests that already hold the
+    old bundle finish on it. The previous bundle stays loaded for rollback.
+    """
+    
+    def __init__(self, model_path, lstm_path, scaler_path, encoder_path, 
+                 features_path, config_path, lstm_warmup_batch_sizes=(1,), registry_dir=None):
+        self.legacy_paths = (model_path, lstm_path, scaler_path, encoder_path,
+                             features_path, config_path)
+        self.lstm_warmup_batch_sizes = lstm_warmup_batch_sizes
+        self.registry_dir = registry_dir
+        
+        self.active = None
+        self.previous = None
+        
+        # Background load state
+        self.loading = None
+        self.last_error = None
+        self._swap_lock = threading.Lock()
+        
+        # Called with the new bundle after every swap
+        self.swap_listeners = []
+        
+        # Latest traditional input, replayed to warm up new versions
+        self._warmup_sample = None
+        
+        # Load models on initialization
+        self.load_models()
+    
+    def load_models(self):
+        """Load the registry's active version, or the legacy artifacts"""
+        version = read_active_version(self.registry_dir)
+        if version is not None:
+            bundle = self._load_bundle(version)
+            if bundle.model is not None:
+                self.active = bundle
+                return bundle.lstm_model is not None
+            print(f"Falling back to legacy models; version {version} failed to load")
+        
+        bundle = ModelBundle(LEGACY_VERSION, *self.legacy_paths,
+                             lstm_warmup_batch_sizes=self.lstm_warmup_batch_sizes)
+        bundle.load_models()
+        self.active = bundle
+        return bundle.model is not None and bundle.lstm_model is not None
+    
+    # Active bundle attributes, for callers that do not pin a bundle
+    @property
+    def version(self):
+        return self.active.version
+    
+    @property
+    def model(self):
+        return self.active.model
+    
+    @property
+    def lstm_model(self):
+        return self.active.lstm_model
+    
+    @property
+    def feature_scaler(self):
+        return self.active.feature_scaler
+    
+    @property
+    def label_encoder(self):
+        return self.active.label_encoder
+    
+    @property
+    def feature_columns(self):
+        return self.active.feature_columns
+    
+    @property
+    def model_config(self):
+        return self.active.model_config
+    
+    @property
+    def lstm_predict_fn(self):
+        return self.active.lstm_predict_fn
+    
+    def get_bundle(self):
+        """Current bundle; hold on to it to keep a request on one version"""
+        return self.active
+    
+    def get_sequence_length(self, bundle=None):
+        """Get sequence length from model config"""
+        return (bundle or self.active).get_sequence_length()
+    
+    def predict_traditional(self, processed_data, bundle=None):
+        """Make prediction with traditional model"""
+        self._warmup_sample = processed_data.iloc[:1]
+        return (bundle or self.active).predict_traditional(processed_data)
+    
+    def predict_traditional_batch(self, processed_data, bundle=None):
+        """Make predictions for every row with a single model pass"""
+        return (bundle or self.active).predict_traditional_batch(processed_data)
+    
+    def predict_traditional_proba(self, processed_data, bundle=None):
+        """Return (classes, probability matrix) from a single model pass"""
+        return (bundle or self.active).predict_traditional_proba(processed_data)
+    
+    def predict_lstm(self, X_sequence, bundle=None):
+        """Make prediction with LSTM model"""
+        return (bundle or self.active).predict_lstm(X_sequence)
+    
+    def predict_lstm_batch(self, X_sequences, bundle=None):
+        """Make predictions for a (n, sequence_length, n_features) batch in one call"""
+        return (bundle or self.active).predict_lstm_batch(X_sequences)
+    
+    def list_versions(self):
+        """Model versions available in the registry"""
+        if not self.registry_dir or not os.path.isdir(self.registry_dir):
+            return []
+        return sorted(name for name in os.listdir(self.registry_dir)
+                      if os.path.isdir(os.path.join(self.registry_dir, name)))
+    
+    def activate(self, version):
+        """Start loading a version in the background; it goes live once warmed up
+        
+        Returns an error message, or None when loading started.
+        """
+        if version not in self.list_versions():
+            return f"Unknown model version: {version}"
+        with self._swap_lock:
+            if self.loading is not None:
+                return f"Model version {self.loading['version']} is already loading"
+            self.loading = {"version": version, "started_at": time.time()}
+        
+        threading.Thread(target=self._load_and_swap, args=(version,), daemon=True).start()
+        return None
+    
+    def rollback(self):
+        """Swap back to the previously active version; returns False if there is none"""
+        with self._swap_lock:
+            if self.previous is None:
+                return False
+            bundle = self.previous
+        self._swap(bundle)
+        return True
+    
+    def status(self):
+        """Registry state for the models endpoint"""
+        active = self.active
+        previous = self.previous
+        return {
+            "active_version": active.version,
+            "loaded_at": active.loaded_at,
+            "model_loaded": active.model is not None,
+            "lstm_model_loaded": active.lstm_model is not None,
+            "lstm_compiled": active.lstm_predict_fn is not None,
+            "previous_version": previous.version if previous is not None else None,
+            "available_versions": self.list_versions(),
+            "loading": self.loading,
+            "last_error": self.last_error
+        }
+    
+    def _load_bundle(self, version):
+        bundle = ModelBundle.from_directory(version, os.path.join(self.registry_dir, version),
+                                            lstm_warmup_batch_sizes=self.lstm_warmup_batch_sizes)
+        bundle.load_models()
+        return bundle
+    
+    def _load_and_swap(self, version):
+        """Load, validate and warm up a version off the request path, then publish it"""
+        try:
+            bundle = self._load_bundle(version)
+            if bundle.model is None:
+                self.last_error = f"Model version {version} has no usable traditional model"
+                return
+            if self.active.lstm_model is not None and bundle.lstm_model is None:
+                self.last_error = f"Model version {version} has no usable LSTM model"
+                return
+            
+            bundle.warm_up(self._warmup_sample)
+            self._swap(bundle)
+            self.last_error = None
+            print(f"Model version {version} is now active")
+        except Exception as e:
+            self.last_error = f"Error loading model version {version}: {e}"
+            print(self.last_error)
+        finally:
+            self.loading = None
+    
+    def _swap(self, bundle):
+        """Publish a bundle with one reference assignment and notify listeners"""
+        with self._swap_lock:
+            if bundle is self.active:
+                return
+            self.previous = self.active
+            self.active = bundle
+            self._write_active_version(bundle.version)
+        
+        for listener in self.swap_listeners:
+            try:
+                listener(bundle)
+            except Exception as e:
+                print(f"Error notifying model swap: {e}")
+    
+    def _write_active_version(self, version):
+        if not self.registry_dir:
+            return
+        path = os.path.join(self.registry_dir, ACTIVE_VERSION_FILE)
+        try:
+            if version == LEGACY_VERSION:
+                # The legacy artifacts are used whenever no version is recorded
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            os.makedirs(self.registry_dir, exist_ok=True)
+            with open(path + ".tmp", 'w') as f:
+                f.write(version)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Error saving active model version: {e}")
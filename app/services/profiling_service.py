@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import random
+import threading
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+class RequestProfile:
+    """Statistical profile captured for a single request"""
+
+    def __init__(self, endpoint, path):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.path = path
+        self.plant_id = None
+        self.history_length = None
+        self.started_at = datetime.now()
+        self.duration = 0.0
+        self.samples = Counter()
+        self.thread_id = threading.get_ident()
+        self._start = time.perf_counter()
+
+    def to_folded(self):
+        """Render samples as collapsed stacks (flamegraph.pl / speedscope input)"""
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Profile metadata without the stack samples"""
+        return {
+            "profile_id": self.profile_id,
+            "endpoint": self.endpoint,
+            "path": self.path,
+            "plant_id": self.plant_id,
+            "history_length": self.history_length,
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_ms": round(self.duration * 1000, 3),
+            "sample_count": sum(self.samples.values())
+        }
+
+class ProfilingService:
+    """Samples a fraction of live requests with a stack-sampling profiler"""
+
+    def __init__(self, sample_rate=0.0, interval=0.005, history_size=50):
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+        # Finished profiles, most recent last
+        self.profiles = deque(maxlen=history_size)
+
+        # Profiles currently being sampled, keyed by thread id
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def should_profile(self, tagged=False):
+        """Decide whether the current request gets profiled"""
+        if tagged:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, endpoint, path):
+        """Begin sampling the calling thread"""
+        profile = RequestProfile(endpoint, path)
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+                self._sampler.start()
+        return profile
+
+    def stop(self, profile, plant_id=None, history_length=None):
+        """Stop sampling and keep the finished profile"""
+        profile.duration = time.perf_counter() - profile._start
+        profile.plant_id = plant_id
+        profile.history_length = history_length
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+            self.profiles.append(profile)
+        return profile
+
+    def get_slowest(self, limit=10):
+        """Return summaries of the slowest recent profiles"""
+        with self._lock:
+            profiles = list(self.profiles)
+        profiles.sort(key=lambda p: p.duration, reverse=True)
+        return [p.summary() for p in profiles[:limit]]
+
+    def get_profile(self, profile_id):
+        """Look up a finished profile by id"""
+        with self._lock:
+            for profile in self.profiles:
+                if profile.profile_id == profile_id:
+                    return profile
+        return None
+
+    def _sample_loop(self):
+        """Background sampler; exits once no request is being profiled"""
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                active = dict(self._active)
+
+            frames = sys._current_frames()
+            for thread_id, profile in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.samples[self._fold_stack(frame)] += 1
+
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _fold_stack(frame):
+        """Collapse a frame chain into a root-first 'a;b;c' stack string"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
@@ -0,0 +1,359 @@
+# benchmark.py
+# Micro-benchmarks for the backend's hot paths.
+#
+#   python -m app.tests.benchmark encoding --plants 50 --days 14
+#   python -m app.tests.benchmark ingest --readings 20000
+#   python -m app.tests.benchmark history --rows 10000
+#   python -m app.tests.benchmark lstm --batch-sizes 1 32
+#   python -m app.tests.benchmark sequences --plants 1000
+#   python -m app.tests.benchmark codec --rows 100000
+import os
+import json
+import time
+import tempfile
+import argparse
+import datetime
+import numpy as np
+
+def _timeit(func, repeat):
+    """Best wall time of repeated calls, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def _synthetic_forecast(plant_id, days, rng):
+    """Forecast payload shaped like ForecastService.generate_plant_forecast_data"""
+    timestamp = datetime.datetime(2025, 4, 14, 6, 0, 0)
+    forecast = []
+    for i in range(days * 6):
+        probs = rng.dirichlet([4, 1, 2])
+        ts = (timestamp + datetime.timedelta(hours=4 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        forecast.append({
+            'date': ts,
+            'timestamp': ts,
+            'forecast_type': 'current' if i == 0 else 'forecast',
+            'soil_temperature': float(rng.normal(22, 1)),
+            'humidity': float(rng.normal(55, 5)),
+            'soil_moisture': float(rng.normal(40, 8)),
+            'predicted_health': ['Healthy', 'High Stress', 'Moderate Stress'][int(probs.argmax())],
+            'confidence': {
+                'Healthy': float(probs[0]),
+                'High Stress': float(probs[1]),
+                'Moderate Stress': float(probs[2])
+            },
+            'ambient_temperature': float(rng.normal(24, 2)),
+            'light_intensity': float(rng.uniform(0, 800)),
+            'soil_ph': float(rng.normal(6.5, 0.2)),
+            'nitrogen': float(rng.normal(30, 2)),
+            'phosphorus': float(rng.normal(30, 2)),
+            'potassium': float(rng.normal(30, 2))
+        })
+    return {
+        "plant_id": plant_id,
+        "forecast_generated": "2025-04-14 06:00:00",
+        "days_forecasted": days,
+        "forecast": forecast
+    }
+
+def bench_encoding(args):
+    """Payload size and serialization time per response encoding"""
+    from app.utils.encoding import encode_payload, available_mimetypes
+
+    rng = np.random.default_rng(0)
+    payloads = [_synthetic_forecast(pid, args.days, rng) for pid in range(1, args.plants + 1)]
+
+    print(f"{args.plants} plants x {args.days}-day forecast")
+    print(f"{'encoding':<48} {'bytes':>12} {'ratio':>7} {'ms':>9}")
+    baseline = None
+    for mimetype in available_mimetypes():
+        for compress in (False, True):
+            encode = lambda: [encode_payload(p, mimetype, compress) for p in payloads]
+            size = sum(len(body) for body in encode())
+            elapsed = _timeit(encode, args.repeat)
+            if baseline is None:
+                baseline = size
+            label = mimetype + (' + gzip' if compress else '')
+            print(f"{label:<48} {size:>12} {baseline / size:>6.1f}x {elapsed:>9.2f}")
+
+def bench_ingest(args):
+    """Storage-path throughput: JSON per reading vs batched binary frames"""
+    import pandas as pd
+    from app.services.data_service import DataService
+    from app.services.ingest_service import OPTIONAL_FIELDS
+    from app.services.binary_ingest import encode_frames, decode_frames, FrameBatcher, FRAME_SIZE
+
+    rng = np.random.default_rng(0)
+    now = time.time()
+    readings = [{
+        'Plant_ID': int(i % args.plants) + 1,
+        'Timestamp': now - (args.readings - i),
+        'Soil_Temperature': float(rng.normal(22, 1)),
+        'Humidity': float(rng.normal(55, 5)),
+        'Soil_Moisture': float(rng.normal(40, 8)),
+        'Light_Intensity': float(rng.uniform(0, 800))
+    } for i in range(args.readings)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # HTTP path: parse one JSON body and append one row per reading
+        bodies = [json.dumps(dict(r, Timestamp=datetime.datetime.fromtimestamp(r['Timestamp'])
+                                  .strftime("%Y-%m-%d %H:%M:%S.%f"))) for r in readings[:args.http_readings]]
+        data_service = DataService(os.path.join(tmp, 'http.json'))
+        start = time.perf_counter()
+        for body in bodies:
+            data = json.loads(body)
+            for field, default_value in OPTIONAL_FIELDS.items():
+                data.setdefault(field, default_value)
+            data_service._append(data['Plant_ID'], pd.DataFrame([data]))
+        http_rate = len(bodies) / (time.perf_counter() - start)
+
+        # Binary path: decode whole batches with frombuffer and append per plant,
+        # rewriting the history file after every batch
+        buffer = encode_frames(readings)
+        batch = args.batch * FRAME_SIZE
+        data_service = DataService(os.path.join(tmp, 'per_flush.tsc'))
+        start = time.perf_counter()
+        for offset in range(0, len(buffer), batch):
+            data_service.add_sensor_readings(decode_frames(buffer[offset:offset + batch]))
+        per_flush_rate = len(readings) / (time.perf_counter() - start)
+
+        # Listener path: the batcher saves on its timer and once more on stop
+        class StoreOnly:
+            def __init__(self, data_service):
+                self.data_service = data_service
+
+            def ingest_frame(self, readings, persist=True):
+                return self.data_service.add_sensor_readings(readings, persist=persist)
+
+        batcher = FrameBatcher(StoreOnly(DataService(os.path.join(tmp, 'timed.tsc'))),
+                               batch_frames=args.batch, persist_interval=args.persist_interval)
+        start = time.perf_counter()
+        batcher.start()
+        for offset in range(0, len(buffer), batch):
+            batcher.add(buffer[offset:offset + batch])
+        batcher.stop()
+        timed_rate = len(readings) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        decode_frames(buffer)
+        decode_rate = len(readings) / (time.perf_counter() - start)
+
+    print(f"{'JSON per reading (no persistence)':<40} {http_rate:>12,.0f} readings/s")
+    print(f"{f'Binary frames, batch={args.batch}, save per batch':<40} {per_flush_rate:>12,.0f} readings/s")
+    print(f"{f'Binary frames, save every {args.persist_interval:g}s':<40} {timed_rate:>12,.0f} readings/s "
+          f"({batcher.saves} saves)")
+    print(f"{'Frame decode only':<40} {decode_rate:>12,.0f} readings/s")
+
+def bench_history(args):
+    """Reader cost of a private copy vs a shared snapshot, and in-order append cost"""
+    import pandas as pd
+    from app.services.data_service import DataService
+
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp.now() - pd.Timedelta(days=29)
+    history = pd.DataFrame({
+        'Plant_ID': 1,
+        'Timestamp': pd.date_range(start, periods=args.rows, freq='min'),
+        **{field: rng.normal(30, 5, args.rows) for field in
+           ['Soil_Temperature', 'Humidity', 'Soil_Moisture', 'Light_Intensity', 'Soil_pH']}
+    })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_service = DataService(os.path.join(tmp, 'history.json'))
+        data_service.add_sensor_readings(history, persist=False)
+
+        reads = 1000
+        copy_ms = _timeit(lambda: [data_service.get_plant_data(1) for _ in range(reads)], args.repeat)
+        snapshot_ms = _timeit(lambda: [data_service.get_snapshot(1).frame() for _ in range(reads)], args.repeat)
+
+        row = history.iloc[-1:].copy()
+        appends = 1000
+        def append():
+            for _ in range(appends):
+                row['Timestamp'] += pd.Timedelta(seconds=1)
+                data_service._append(1, row)
+        append_ms = _timeit(append, 1)
+
+    print(f"{args.rows} rows of history")
+    print(f"get_plant_data copy:     {copy_ms * 1000 / reads:>9.1f} us/read")
+    print(f"get_snapshot view:       {snapshot_ms * 1000 / reads:>9.1f} us/read")
+    print(f"in-order single append:  {append_ms * 1000 / appends:>9.1f} us/append")
+
+def bench_lstm(args):
+    """Per-call cost of Keras predict vs the compiled forward pass, with parity"""
+    import tensorflow as tf
+    from app import (MODEL_PATH, LSTM_MODEL_PATH, FEATURE_SCALER_PATH, LABEL_ENCODER_PATH,
+                     FEATURE_COLUMNS_PATH, MODEL_CONFIG_PATH)
+    from app.services.model_service import ModelService
+
+    model_service = ModelService(MODEL_PATH, LSTM_MODEL_PATH, FEATURE_SCALER_PATH, LABEL_ENCODER_PATH,
+                                 FEATURE_COLUMNS_PATH, MODEL_CONFIG_PATH,
+                                 lstm_warmup_batch_sizes=tuple(args.batch_sizes))
+    if model_service.lstm_predict_fn is None:
+        print("Compiled LSTM predict unavailable")
+        return
+
+    sequence_length, n_features = model_service._lstm_input_shape()
+    rng = np.random.default_rng(0)
+    calls = 100
+
+    print(f"{'batch':>6} {'predict ms':>11} {'compiled ms':>12} {'saved ms':>9} {'max diff':>10}")
+    for batch_size in args.batch_sizes:
+        X = rng.random((batch_size, sequence_length, n_features), dtype=np.float32)
+        predict = lambda: [model_service.lstm_model.predict(X, verbose=0) for _ in range(calls)]
+        compiled = lambda: [model_service.lstm_predict_fn(tf.constant(X)) for _ in range(calls)]
+        predict_ms = _timeit(predict, args.repeat) / calls
+        compiled_ms = _timeit(compiled, args.repeat) / calls
+
+        diff = np.abs(np.asarray(model_service.lstm_predict_fn(tf.constant(X))) -
+                      model_service.lstm_model.predict(X, verbose=0)).max()
+        print(f"{batch_size:>6} {predict_ms:>11.3f} {compiled_ms:>12.3f} "
+              f"{predict_ms - compiled_ms:>9.3f} {diff:>10.2e}")
+
+def bench_sequences(args):
+    """LSTM input built plant by plant vs one vectorized pass over the fleet"""
+    import pandas as pd
+    from app import (MODEL_PATH, LSTM_MODEL_PATH, FEATURE_SCALER_PATH, LABEL_ENCODER_PATH,
+                     FEATURE_COLUMNS_PATH, MODEL_CONFIG_PATH)
+    from app.services.model_service import ModelService
+    from app.services.history_store import PlantHistory
+    from app.utils.data_processor import build_lstm_sequences, prepare_lstm_sequence
+
+    model_service = ModelService(MODEL_PATH, LSTM_MODEL_PATH, FEATURE_SCALER_PATH, LABEL_ENCODER_PATH,
+                                 FEATURE_COLUMNS_PATH, MODEL_CONFIG_PATH)
+    bundle = model_service.get_bundle()
+    if bundle.feature_scaler is None:
+        print("LSTM preprocessing artifacts unavailable")
+        return
+
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp.now() - pd.Timedelta(days=1)
+    snapshots = {}
+    for plant_id in range(1, args.plants + 1):
+        history = pd.DataFrame({
+            'Plant_ID': plant_id,
+            'Timestamp': pd.date_range(start, periods=args.rows, freq='4h'),
+            **{field: rng.normal(30, 5, args.rows) for field in
+               ['Soil_Temperature', 'Humidity', 'Soil_Moisture', 'Light_Intensity', 'Soil_pH',
+                'Ambient_Temperature', 'Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level',
+                'Chlorophyll_Content', 'Electrochemical_Signal']}
+        })
+        snapshots[plant_id] = PlantHistory(history).snapshot()
+    frames = {plant_id: snapshot.frame() for plant_id, snapshot in snapshots.items()}
+
+    per_plant = lambda: [prepare_lstm_sequence(plant_id, frames, bundle) for plant_id in frames]
+    fleet = lambda: build_lstm_sequences(snapshots, bundle)
+    per_plant_ms = _timeit(per_plant, args.repeat)
+    fleet_ms = _timeit(fleet, args.repeat)
+
+    plant_ids, X = fleet()
+    single = np.concatenate(per_plant())
+    diff = np.abs(single - X).max()
+    print(f"{len(plant_ids)} plants, X {X.shape}")
+    print(f"per plant:  {per_plant_ms:>9.1f} ms ({per_plant_ms * 1000 / args.plants:.1f} us/plant)")
+    print(f"vectorized: {fleet_ms:>9.1f} ms ({fleet_ms * 1000 / args.plants:.1f} us/plant)")
+    print(f"max diff:   {diff:>9.2e}")
+
+def bench_codec(args):
+    """Compressed history size vs JSON, encode/decode throughput and chunk access"""
+    import pandas as pd
+    from app.utils.timeseries_codec import SeriesWriter, SeriesReader
+
+    rng = np.random.default_rng(0)
+    sensors = ['Soil_Temperature', 'Humidity', 'Soil_Moisture', 'Light_Intensity', 'Soil_pH',
+               'Ambient_Temperature', 'Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level',
+               'Chlorophyll_Content', 'Electrochemical_Signal']
+    rows_per_plant = args.rows // args.plants
+    frames = {}
+    for plant_id in range(1, args.plants + 1):
+        # Slow random walks at two decimals, readings every ~4h with microsecond jitter
+        jitter = pd.to_timedelta(rng.integers(0, 60_000_000, rows_per_plant), unit='us')
+        frames[plant_id] = pd.DataFrame({
+            'Plant_ID': plant_id,
+            'Timestamp': pd.date_range('2025-01-01', periods=rows_per_plant, freq='4h') + jitter,
+            **{sensor: np.round(30 + np.cumsum(rng.normal(0, 0.2, rows_per_plant)), 2) for sensor in sensors}
+        })
+    readings = rows_per_plant * args.plants
+
+    json_bytes = 0
+    for frame in frames.values():
+        records = frame.assign(Timestamp=frame['Timestamp'].dt.strftime("%Y-%m-%d %H:%M:%S.%f"))
+        json_bytes += len(json.dumps(records.to_dict('records')))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.tsc')
+
+        def encode():
+            with SeriesWriter(path) as writer:
+                for plant_id, frame in frames.items():
+                    writer.write_series(plant_id, frame)
+        encode_ms = _timeit(encode, args.repeat)
+        tsc_bytes = os.path.getsize(path)
+
+        reader = SeriesReader(path)
+        decode_ms = _timeit(lambda: [reader.read_series(key) for key in reader.keys()], args.repeat)
+
+        # Random access to one chunk of one column
+        keys = reader.keys()
+        picks = [(keys[i % len(keys)], int(rng.integers(reader.num_chunks(keys[i % len(keys)]))))
+                 for i in range(200)]
+        chunk_ms = _timeit(lambda: [reader.read_chunk(key, chunk, ['Soil_Moisture']) for key, chunk in picks],
+                           args.repeat) / len(picks)
+
+        for key in keys[:3]:
+            pd.testing.assert_frame_equal(reader.read_series(key), frames[int(key)], check_dtype=False)
+
+    print(f"{readings} readings, {args.plants} plants")
+    print(f"JSON:          {json_bytes / readings:>8.1f} bytes/reading")
+    print(f"compressed:    {tsc_bytes / readings:>8.1f} bytes/reading ({json_bytes / tsc_bytes:.1f}x smaller)")
+    print(f"encode:        {readings / encode_ms * 1000:>12,.0f} readings/s")
+    print(f"decode:        {readings / decode_ms * 1000:>12,.0f} readings/s")
+    print(f"chunk access:  {chunk_ms * 1000:>8.1f} us (one column, one chunk)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Plant health backend benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    encoding = subparsers.add_parser('encoding', help='Response encoding size and speed')
+    encoding.add_argument('--plants', type=int, default=50)
+    encoding.add_argument('--days', type=int, default=14)
+    encoding.add_argument('--repeat', type=int, default=5)
+    encoding.set_defaults(func=bench_encoding)
+
+    ingest = subparsers.add_parser('ingest', help='Sensor ingestion throughput')
+    ingest.add_argument('--readings', type=int, default=20000)
+    ingest.add_argument('--http-readings', type=int, default=2000)
+    ingest.add_argument('--plants', type=int, default=50)
+    ingest.add_argument('--batch', type=int, default=512)
+    ingest.add_argument('--persist-interval', type=float, default=5.0)
+    ingest.set_defaults(func=bench_ingest)
+
+    history = subparsers.add_parser('history', help='History snapshot reads and appends')
+    history.add_argument('--rows', type=int, default=10000)
+    history.add_argument('--repeat', type=int, default=3)
+    history.set_defaults(func=bench_history)
+
+    lstm = subparsers.add_parser('lstm', help='LSTM predict vs compiled forward pass')
+    lstm.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32])
+    lstm.add_argument('--repeat', type=int, default=3)
+    lstm.set_defaults(func=bench_lstm)
+
+    sequences = subparsers.add_parser('sequences', help='Fleet-wide LSTM sequence building')
+    sequences.add_argument('--plants', type=int, default=1000)
+    sequences.add_argument('--rows', type=int, default=180)
+    sequences.add_argument('--repeat', type=int, default=3)
+    sequences.set_defaults(func=bench_sequences)
+
+    codec = subparsers.add_parser('codec', help='Compressed history encoding size and speed')
+    codec.add_argument('--rows', type=int, default=100000)
+    codec.add_argument('--plants', type=int, default=50)
+    codec.add_argument('--repeat', type=int, default=3)
+    codec.set_defaults(func=bench_codec)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import unittest
+from app.services.admission_service import AdmissionController, TokenBucket, INGEST, READ
+
+class TokenBucketTest(unittest.TestCase):
+    """A bucket drained by a burst refills at its rate"""
+
+    def test_exhausted_then_refilled(self):
+        bucket = TokenBucket(rate=2.0, burst=3)
+        bucket.updated = now = 100.0
+        for _ in range(3):
+            self.assertEqual(bucket.take(now), 0)
+
+        # Empty: the next token is half a second away at 2 per second
+        self.assertAlmostEqual(bucket.take(now), 0.5)
+        self.assertAlmostEqual(bucket.take(now + 0.25), 0.25)
+        self.assertFalse(bucket.full(now + 0.25))
+
+        self.assertEqual(bucket.take(now + 0.5), 0)
+        self.assertAlmostEqual(bucket.wait(now + 0.5), 0.5)
+
+        # Refilling stops at the burst
+        self.assertTrue(bucket.full(now + 10))
+        for _ in range(3):
+            self.assertEqual(bucket.take(now + 10), 0)
+        self.assertGreater(bucket.take(now + 10), 0)
+
+class AdmissionControllerTest(unittest.TestCase):
+    """Ingest bursts never take the slots reserved for reads"""
+
+    def setUp(self):
+        self.controller = AdmissionController(device_rate=1000.0, device_burst=1000, global_rate=1000.0,
+                                              global_burst=1000, max_in_flight=6, reserved_reads=2,
+                                              queue_timeout=0.01)
+
+    def test_ingest_leaves_reserved_read_slots(self):
+        for device in range(4):
+            self.assertIsNone(self.controller.admit(INGEST, device))
+        self.assertIsNotNone(self.controller.admit(INGEST, 99))
+        self.assertEqual(self.controller.rejected, {'ingest_in_flight': 1})
+
+        # Both reserved slots go to reads, and then every slot is taken
+        self.assertIsNone(self.controller.admit(READ))
+        self.assertIsNone(self.controller.admit(READ))
+        self.assertIsNotNone(self.controller.admit(READ))
+        self.assertEqual(self.controller.in_flight, {INGEST: 4, READ: 2})
+
+        # A finished ingest frees a slot for the next one
+        self.controller.release(INGEST)
+        self.assertIsNone(self.controller.admit(INGEST, 99))
+
+    def test_reads_may_use_every_slot(self):
+        for _ in range(6):
+            self.assertIsNone(self.controller.admit(READ))
+        self.assertIsNotNone(self.controller.admit(INGEST, 1))
+        self.assertEqual(self.controller.peak_in_flight, 6)
+
+    def test_rejected_ingest_keeps_its_tokens(self):
+        controller = AdmissionController(device_rate=0.001, device_burst=1, max_in_flight=2, reserved_reads=1,
+                                         queue_timeout=0.01)
+        self.assertIsNone(controller.admit(INGEST, 1))
+        self.assertIsNotNone(controller.admit(INGEST, 2))  # No ingest slot left
+        controller.release(INGEST)
+
+        # Device 2 was turned away for a slot, not charged for it
+        self.assertIsNone(controller.admit(INGEST, 2))
+        self.assertEqual(controller.admit(INGEST, 2), 1000)
+        self.assertEqual(controller.rejected, {'ingest_in_flight': 1, 'device_rate': 1})
+
+if __name__ == '__main__':
+    unittest.main()
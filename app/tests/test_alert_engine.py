@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+import pandas as pd
+from app import ALERT_RULES, ALERT_RATE_SPAN
+from app.services.alert_engine import AlertEngine
+
+def readings(moisture, interval=5, start='2024-01-01'):
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(np.arange(len(moisture)) * interval, unit='s')
+    return pd.DataFrame({'Timestamp': timestamps, 'Soil_Moisture': moisture,
+                         'Soil_Temperature': 22.0, 'Soil_pH': 6.5})
+
+class RateRuleTest(unittest.TestCase):
+    """Rate rules against noisy, closely spaced readings"""
+
+    def setUp(self):
+        self.engine = AlertEngine(ALERT_RULES, rate_span=ALERT_RATE_SPAN)
+        self.rng = np.random.default_rng(0)
+
+    def observe(self, rows, plant_id=1):
+        # One reading per call, as the service stores them
+        for i in range(len(rows)):
+            self.engine.observe(plant_id, rows.iloc[i:i + 1])
+
+    def test_steady_noisy_plant_does_not_alert(self):
+        self.observe(readings(40 + self.rng.uniform(-0.5, 0.5, 2000)))
+        stats = self.engine.stats()
+        self.assertEqual(stats['triggered'], 0)
+        self.assertEqual(stats['active'], 0)
+
+    def test_sustained_drop_alerts(self):
+        # 20% per hour for 90 minutes, from 60% down to 30%
+        hours = np.arange(90 * 12) * 5 / 3600
+        self.observe(readings(60 - 20 * hours + self.rng.uniform(-0.5, 0.5, len(hours))))
+        active = self.engine.get_active(plant_id=1)
+        self.assertEqual([alert['rule_id'] for alert in active], ['soil_moisture_drop'])
+
+    def test_sparse_readings_use_consecutive_pairs(self):
+        # Four-hourly readings are further apart than the span: each pair is one rate
+        self.engine = AlertEngine([{"id": "drop", "sensor": "Soil_Moisture", "condition": "rate_below",
+                                    "value": -1}], rate_span=ALERT_RATE_SPAN)
+        self.observe(readings(np.array([60.0, 50.0, 40.0]), interval=4 * 3600))
+        self.assertEqual(self.engine.stats()['triggered'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
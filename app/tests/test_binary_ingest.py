@@ -0,0 +1,193 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+from app.services.data_service import DataService
+from app.services.binary_ingest import MqttIngestListener, FrameBatcher, encode_frames, FRAME_SIZE
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter matching with + and # wildcards"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts) or (part != '+' and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+class LocalBroker:
+    """In-process MQTT broker; a reconnect starts a clean session without subscriptions"""
+
+    class Client:
+        def __init__(self, broker):
+            self.broker = broker
+            self.on_connect = None
+            self.on_message = None
+            self.topics = []
+            self.connected = False
+
+        def is_connected(self):
+            return self.connected
+
+        def connect(self):
+            self.connected = True
+            self.topics = []
+            if self.on_connect:
+                self.on_connect(self, None, {}, 0, None)
+
+        def disconnect(self):
+            self.connected = False
+
+        def subscribe(self, topic):
+            self.topics.append(topic)
+
+    class Message:
+        def __init__(self, topic, payload):
+            self.topic = topic
+            self.payload = payload
+
+    def __init__(self):
+        self.clients = []
+
+    def client(self):
+        client = LocalBroker.Client(self)
+        self.clients.append(client)
+        return client
+
+    def publish(self, topic, payload):
+        message = LocalBroker.Message(topic, payload)
+        for client in self.clients:
+            if client.connected and any(topic_matches(t, topic) for t in client.topics):
+                client.on_message(client, None, message)
+
+class StubDataService:
+    def __init__(self):
+        self.saves = 0
+
+    def save_history(self):
+        self.saves += 1
+
+class StubIngestService:
+    def __init__(self):
+        self.data_service = StubDataService()
+        self.frames = []
+
+    def ingest_frame(self, readings, persist=True):
+        self.frames.append((readings, persist))
+
+def frames(count, plant_id=1):
+    return encode_frames([{'Plant_ID': plant_id, 'Timestamp': 1700000000.0 + i, 'Soil_Temperature': 22.0,
+                           'Humidity': 55.0, 'Soil_Moisture': 30.0} for i in range(count)])
+
+class MqttIngestTest(unittest.TestCase):
+    """Frames published to the broker reach the ingest pipeline"""
+
+    def setUp(self):
+        self.broker = LocalBroker()
+        self.client = self.broker.client()
+        self.ingest = StubIngestService()
+        self.listener = MqttIngestListener(self.ingest, self.client, persist_interval=3600)
+
+    def published(self):
+        self.broker.publish('plants/1/frames', frames(3))
+        self.listener.flush()
+        return sum(len(readings) for readings, persist in self.ingest.frames)
+
+    def test_subscribes_on_connect(self):
+        self.listener.start()
+        self.client.connect()
+        self.assertEqual(self.published(), 3)
+        self.listener.stop()
+
+    def test_subscribes_when_already_connected(self):
+        self.client.connect()
+        self.listener.start()
+        self.assertEqual(self.published(), 3)
+        self.listener.stop()
+
+    def test_reconnect_keeps_subscription(self):
+        self.listener.start()
+        self.client.connect()
+        self.client.disconnect()
+        self.client.connect()
+        self.assertEqual(self.client.topics, ['plants/+/frames'])
+        self.assertEqual(self.published(), 3)
+        self.listener.stop()
+
+class FrameBatcherTest(unittest.TestCase):
+    """Flushes store without saving and count the frames they drop"""
+
+    def setUp(self):
+        self.ingest = StubIngestService()
+        self.batcher = FrameBatcher(self.ingest, batch_frames=4, persist_interval=3600)
+
+    def test_flushes_do_not_save(self):
+        for _ in range(5):
+            self.batcher.add(frames(4))
+        self.assertEqual(len(self.ingest.frames), 5)
+        self.assertTrue(all(persist is False for readings, persist in self.ingest.frames))
+        self.assertEqual(self.ingest.data_service.saves, 0)
+
+        # Stopping saves once, and only when something is unsaved
+        self.batcher.stop()
+        self.batcher.stop()
+        self.assertEqual(self.ingest.data_service.saves, 1)
+
+    def test_saves_on_timer(self):
+        self.batcher.persist_interval = 0
+        self.batcher.start()
+        self.batcher.add(frames(4))
+        for _ in range(100):
+            if self.batcher.saves:
+                break
+            threading.Event().wait(self.batcher.flush_interval)
+        self.batcher._running = False
+        self.assertEqual(self.batcher.saves, 1)
+
+    def test_counts_dropped_frames(self):
+        buffer = bytearray(frames(3))
+        buffer[FRAME_SIZE] = 2  # Second frame from a newer probe
+        self.batcher._buffer += buffer + frames(1)[:10]
+        self.batcher.flush()
+        stats = self.batcher.stats()
+        self.assertEqual(stats['frames_received'], 2)
+        self.assertEqual(stats['frames_unsupported'], 1)
+        self.assertEqual(stats['frames_truncated'], 1)
+
+class ConcurrentSaveTest(unittest.TestCase):
+    """Saves from several threads leave one complete history file"""
+
+    def test_concurrent_saves(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('history.json', 'history.tsc'):
+                history_file = os.path.join(tmp, name)
+                data_service = DataService(history_file)
+                now = pd.Timestamp.now().floor('s')
+                for plant_id in range(1, 6):
+                    data_service._append(plant_id, pd.DataFrame({
+                        'Plant_ID': plant_id, 'Soil_Moisture': np.arange(50.0),
+                        'Timestamp': now - pd.to_timedelta(np.arange(50)[::-1], unit='s')}))
+
+                output = io.StringIO()
+                with redirect_stdout(output):
+                    threads = [threading.Thread(target=data_service.save_history) for _ in range(8)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+
+                self.assertNotIn('Error', output.getvalue())
+
+                self.assertEqual(os.listdir(tmp), [name])
+                loaded = DataService(history_file)
+                self.assertEqual(sorted(loaded.histories), [1, 2, 3, 4, 5])
+                self.assertEqual(loaded.get_history_length(3), 50)
+                os.remove(history_file)
+
+if __name__ == '__main__':
+    unittest.main()
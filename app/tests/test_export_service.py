@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from app.services.data_service import DataService
+from app.services.export_service import ExportService
+
+class ExportResumeTest(unittest.TestCase):
+    """Resuming from any cursor sends each remaining reading exactly once"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_service = DataService(os.path.join(self.tmp.name, 'history.json'))
+
+        # Runs of identical timestamps longer than a batch, so cursors land inside them
+        start = pd.Timestamp.now().floor('s') - pd.Timedelta(hours=1)
+        offsets = np.repeat([0, 1, 2, 3], [2, 7, 1, 5])
+        for plant_id in (1, 2):
+            self.data_service._append(plant_id, pd.DataFrame({
+                'Plant_ID': plant_id,
+                'Timestamp': start + pd.to_timedelta(offsets, unit='s'),
+                'Soil_Moisture': np.arange(len(offsets), dtype=np.float64) + 100 * plant_id
+            }))
+        self.export = ExportService(self.data_service, batch_rows=3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_export(self, args):
+        query, position = self.export.parse_query(args)
+        readings, cursors = [], []
+        for chunk in self.export.stream(query, position):
+            for line in chunk.splitlines():
+                record = json.loads(line)
+                if 'cursor' in record:
+                    cursors.append((record['cursor'], len(readings)))
+                elif 'done' not in record:
+                    readings.append((record['Plant_ID'], record['Soil_Moisture']))
+        return readings, cursors
+
+    def test_resume_from_every_cursor(self):
+        readings, cursors = self.run_export({'fields': 'Soil_Moisture'})
+        self.assertEqual(len(readings), 30)
+        self.assertEqual(len(set(readings)), 30)
+
+        for cursor, sent in cursors:
+            resumed, _ = self.run_export({'cursor': cursor})
+            self.assertEqual(resumed, readings[sent:])
+
+    def test_cursor_inside_a_tie(self):
+        # The second batch ends four readings into the run of seven
+        readings, cursors = self.run_export({'plant_ids': '1'})
+        cursor, sent = cursors[1]
+        self.assertEqual(sent, 6)
+        _, (plant_id, after, skip) = self.export.parse_query({'cursor': cursor})
+        self.assertEqual((plant_id, skip), (1, 4))
+
+        resumed, _ = self.run_export({'cursor': cursor})
+        self.assertEqual(resumed, readings[6:])
+
+if __name__ == '__main__':
+    unittest.main()
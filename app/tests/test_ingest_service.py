@@ -0,0 +1,67 @@
+import unittest
+from app.services.change_detector import ChangeDetector
+from app.services.ingest_service import IngestService, CHANGE_FIELDS, OPTIONAL_FIELDS
+
+HEALTH = {"predicted_health": "Healthy", "confidence": {"Healthy": 0.9}}
+
+class StubDataService:
+    def get_history_length(self, plant_id):
+        return 10
+
+class StubModelService:
+    version = 'v1'
+
+class StubForecastService:
+    model_service = StubModelService()
+
+    def get_plant_health_data(self, plant_id):
+        return dict(HEALTH, plant_id=plant_id, timestamp="2024-01-01 00:00:00", current_readings={})
+
+    def generate_plant_forecast_data(self, plant_id):
+        return None
+
+def reading(**values):
+    data = {'Plant_ID': 1, 'Soil_Temperature': 22.0, 'Humidity': 55.0, 'Soil_Moisture': 30.0,
+            'Timestamp': "2024-01-01 00:00:00"}
+    data.update(OPTIONAL_FIELDS)
+    data.update(values)
+    return data
+
+class GatedIngestTest(unittest.TestCase):
+    """Readings the change-detection gate cannot parse still publish their updates"""
+
+    def setUp(self):
+        self.events = []
+        self.service = IngestService(StubDataService(), StubForecastService(),
+                                     change_detector=ChangeDetector(CHANGE_FIELDS))
+        self.service.emit = lambda event, payload: self.events.append((event, payload))
+
+    def assert_published(self, data):
+        self.assertEqual(self.service.process_update(1, data), "Healthy")
+        events = dict(self.events)
+        self.assertIn('plant_health_update', events)
+        self.assertIn('sensor_reading', events)
+        inference = events['plant_health_update']['inference']
+        self.assertFalse(inference['reused'])
+        self.assertEqual(inference['reason'], 'unparsed')
+        return inference
+
+    def test_null_value_on_first_reading(self):
+        inference = self.assert_published(reading(Humidity=None))
+        self.assertIsNone(inference['inferred_at'])
+
+    def test_non_numeric_value(self):
+        self.assert_published(reading(Soil_pH='n/a'))
+
+    def test_nan_value_after_tracked_readings(self):
+        self.service.process_update(1, reading())
+        self.events.clear()
+        inference = self.assert_published(reading(Soil_Moisture=float('nan')))
+        self.assertIsNotNone(inference['inferred_at'])
+
+        # The NaN reading did not poison the plant's statistics
+        state = self.service.change_detector.plants[1]
+        self.assertTrue((state.mean == state.mean).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import time
+import unittest
+import pandas as pd
+from app.services.latest_index import LatestValueIndex
+
+def reading(timestamp):
+    return pd.DataFrame({'Timestamp': [pd.Timestamp(timestamp)], 'Soil_Moisture': [30.0]})
+
+class LatestValueIndexTest(unittest.TestCase):
+    """Overview pages filtered by health after predictions land out of update order"""
+
+    def setUp(self):
+        self.index = LatestValueIndex(stale_after=600.0)
+        now = time.time()
+        self.index.update_reading(1, reading('2024-01-01 00:00'), updated_at=now - 3600)  # Stale
+        self.index.update_reading(2, reading('2024-01-01 04:00'), updated_at=now - 10)
+        self.index.update_reading(3, reading('2024-01-01 08:00'), updated_at=now - 5)
+
+        # The stale plant is predicted last, as when /predict is opened for it
+        for plant_id in (2, 3, 1):
+            self.index.update_health(plant_id, {'predicted_health': 'Healthy', 'confidence': {'Healthy': 0.9}})
+
+    def plant_ids(self, **kwargs):
+        return [row['plant_id'] for row in self.index.page(**kwargs)['plants']]
+
+    def test_fresh_plants_of_a_health(self):
+        self.assertEqual(self.plant_ids(health='Healthy', stale=False, sort='freshest'), [3, 2])
+        self.assertEqual(self.plant_ids(health='Healthy', stale=False, sort='stalest'), [2, 3])
+
+    def test_stale_plants_of_a_health(self):
+        self.assertEqual(self.plant_ids(health='Healthy', stale=True, sort='stalest'), [1])
+        self.assertEqual(self.plant_ids(health='Healthy', stale=True, sort='freshest'), [1])
+
+    def test_health_change_keeps_update_order(self):
+        self.index.update_health(2, {'predicted_health': 'Moderate Stress', 'confidence': {}})
+        self.index.update_health(2, {'predicted_health': 'Healthy', 'confidence': {}})
+        self.assertEqual(self.plant_ids(health='Healthy', sort='stalest'), [1, 2, 3])
+        self.assertEqual(self.index.counts(), {'Healthy': 3})
+
+    def test_new_reading_moves_plant_last(self):
+        self.index.update_reading(1, reading('2024-01-02 00:00'))
+        self.assertEqual(self.plant_ids(health='Healthy', sort='stalest'), [2, 3, 1])
+        self.assertEqual(self.plant_ids(health='Healthy', stale=True), [])
+
+if __name__ == '__main__':
+    unittest.main()
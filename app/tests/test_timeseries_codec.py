@@ -0,0 +1,198 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from app.utils.timeseries_codec import (SeriesReader, SeriesWriter, decode_column, encode_column, pack_bits,
+                                        unpack_bits, _unzigzag, _zigzag)
+
+def round_trip(values):
+    values = np.asarray(values)
+    meta, data = encode_column(values)
+    return meta, decode_column(meta, data, len(values))
+
+def same_bits(a, b):
+    return np.array_equal(np.asarray(a, dtype=np.float64).view(np.uint64),
+                          np.asarray(b, dtype=np.float64).view(np.uint64))
+
+class BitPackingTest(unittest.TestCase):
+    """pack_bits and unpack_bits at every width, on both unpack paths"""
+
+    def test_every_width(self):
+        rng = np.random.default_rng(0)
+        for width in range(1, 65):
+            for count in (1, 7, 64, 1000):
+                codes = rng.integers(0, 2 ** 63, count, dtype=np.uint64, endpoint=True)
+                codes = codes >> np.uint64(64 - width) if width < 64 else codes | np.uint64(1 << 63)
+                unpacked = unpack_bits(pack_bits(codes, width), width, count)
+                self.assertEqual(unpacked.dtype, np.uint64)
+                self.assertTrue(np.array_equal(unpacked, codes), f"width={width} count={count}")
+
+    def test_empty_and_zero_width(self):
+        self.assertEqual(pack_bits(np.zeros(5, dtype=np.uint64), 0), b'')
+        self.assertTrue(np.array_equal(unpack_bits(b'', 0, 5), np.zeros(5, dtype=np.uint64)))
+        self.assertEqual(len(unpack_bits(b'', 12, 0)), 0)
+
+    def test_zigzag(self):
+        values = np.array([0, 1, -1, 2, -2, np.iinfo(np.int64).max, np.iinfo(np.int64).min], dtype=np.int64)
+        codes = _zigzag(values)
+        self.assertEqual(codes[:5].tolist(), [0, 2, 1, 4, 3])
+        self.assertTrue(np.array_equal(_unzigzag(codes), values))
+
+class ColumnTest(unittest.TestCase):
+    """Each column encoding decodes to exactly what was written"""
+
+    def test_timestamps_scale_to_their_unit(self):
+        start = np.datetime64('2024-01-01T00:00:00', 'ns')
+        for unit, step in ((10 ** 9, 5 * 10 ** 9), (10 ** 6, 1500 * 10 ** 6), (10 ** 3, 7000)):
+            jitter = np.array([0, 3, -2, 0, 1, 4]) * unit
+            values = start + (np.arange(6) * step + jitter).astype('timedelta64[ns]')
+            meta, decoded = round_trip(values)
+            self.assertEqual((meta['encoding'], meta['unit']), ('dod', unit))
+            self.assertTrue(np.array_equal(decoded, values))
+
+        # Nanosecond deltas keep unit 1
+        values = start + np.array([0, 1, 3, 4, 9]).astype('timedelta64[ns]')
+        meta, decoded = round_trip(values)
+        self.assertEqual(meta['unit'], 1)
+        self.assertTrue(np.array_equal(decoded, values))
+
+    def test_constant_rate_costs_no_bits(self):
+        values = np.datetime64('2024-01-01', 'ns') + (np.arange(100) * 5 * 10 ** 9).astype('timedelta64[ns]')
+        meta, decoded = round_trip(values)
+        self.assertEqual(meta['width'], 0)
+        self.assertTrue(np.array_equal(decoded, values))
+
+    def test_integers(self):
+        for values in (np.array([5, -3, 12, 12, 0, -40], dtype=np.int32),
+                       np.array([0, 10 ** 18, -10 ** 18, 7], dtype=np.int64),
+                       np.array([np.iinfo(np.int64).min, np.iinfo(np.int64).max, 0]),
+                       np.array([True, False, True])):
+            meta, decoded = round_trip(values)
+            self.assertEqual(meta['encoding'], 'dod')
+            self.assertEqual(decoded.dtype, values.dtype)
+            self.assertTrue(np.array_equal(decoded, values))
+
+    def test_quantized_floats(self):
+        values = np.array([22.5, 22.75, 21.0, -3.125, 0.0])
+        meta, decoded = round_trip(values)
+        self.assertEqual((meta['encoding'], meta['decimals']), ('quantized', 3))
+        self.assertTrue(same_bits(decoded, values))
+
+    def test_xor_floats(self):
+        rng = np.random.default_rng(1)
+        values = rng.normal(20, 5, 500)
+        values[10] = np.nan
+        values[20] = -0.0
+        values[30] = np.inf
+        values[40] = -np.inf
+        values[41] = np.finfo(np.float64).tiny
+        meta, decoded = round_trip(values)
+        self.assertEqual(meta['encoding'], 'xor')
+        self.assertTrue(same_bits(decoded, values))
+
+    def test_xor_repeated_values(self):
+        values = np.full(10, np.pi)
+        meta, decoded = round_trip(values)
+        self.assertEqual((meta['encoding'], meta['width']), ('xor', 0))
+        self.assertTrue(same_bits(decoded, values))
+
+    def test_negative_zero_is_kept(self):
+        meta, decoded = round_trip(np.array([1.5, -0.0, 2.0]))
+        self.assertEqual(meta['encoding'], 'xor')
+        self.assertTrue(np.signbit(decoded[1]))
+
+    def test_dictionary(self):
+        values = np.array(['Healthy', None, 'High Stress', 'Healthy', np.nan, 3, 'Healthy'], dtype=object)
+        meta, decoded = round_trip(values)
+        self.assertEqual(meta['encoding'], 'dictionary')
+        self.assertEqual(decoded.tolist(), ['Healthy', None, 'High Stress', 'Healthy', None, 3, 'Healthy'])
+
+    def test_single_value(self):
+        for values in (np.array([np.datetime64('2024-01-01T00:00:01', 'ns')]), np.array([7]),
+                       np.array([22.5]), np.array([np.nan]), np.array(['x'], dtype=object)):
+            meta, decoded = round_trip(values)
+            self.assertEqual(len(decoded), 1)
+            if values.dtype.kind == 'f':
+                self.assertTrue(same_bits(decoded, values))
+            else:
+                self.assertTrue(np.array_equal(decoded, values))
+
+    def test_empty(self):
+        for values in (np.array([], dtype=np.float64), np.array([], dtype='datetime64[ns]'),
+                       np.array([], dtype=object)):
+            meta, decoded = round_trip(values)
+            self.assertEqual(len(decoded), 0)
+
+class SeriesFileTest(unittest.TestCase):
+    """Frames written across chunk boundaries read back unchanged"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'history.tsc')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def frame(self, rows):
+        rng = np.random.default_rng(rows)
+        moisture = np.round(rng.uniform(20, 40, rows), 2)
+        chlorophyll = rng.normal(30, 2, rows)  # Too many decimals to quantize
+        if rows > 12:
+            moisture[12] = np.nan  # The chunk holding it switches to XOR
+            chlorophyll[5] = -0.0
+        health = np.array(['Healthy', 'Moderate Stress', None] * rows, dtype=object)[:rows]
+        return pd.DataFrame({
+            'Plant_ID': np.full(rows, 3, dtype=np.int64),
+            'Timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(rows) * 5, unit='s'),
+            'Soil_Moisture': moisture,
+            'Chlorophyll_Content': chlorophyll,
+            'Plant_Health_Status': health
+        })
+
+    def write(self, frames, chunk_rows=8):
+        with SeriesWriter(self.path, chunk_rows) as writer:
+            for key, frame in frames.items():
+                writer.write_series(key, frame)
+        return SeriesReader(self.path)
+
+    def assert_same(self, decoded, frame):
+        self.assertEqual(list(decoded.columns), list(frame.columns))
+        self.assertEqual(len(decoded), len(frame))
+        for name in frame.columns:
+            expected = frame[name].to_numpy()
+            actual = decoded[name].to_numpy()
+            if expected.dtype.kind == 'f':
+                self.assertTrue(same_bits(actual, expected), name)
+            elif expected.dtype == object:
+                self.assertEqual(actual.tolist(), expected.tolist(), name)
+            else:
+                self.assertEqual(actual.dtype, expected.dtype, name)
+                self.assertTrue(np.array_equal(actual, expected), name)
+
+    def test_chunk_boundaries(self):
+        for rows in (1, 7, 8, 9, 16, 30):
+            frame = self.frame(rows)
+            reader = self.write({1: frame})
+            self.assertEqual(reader.num_chunks(1), -(-rows // 8))
+            self.assert_same(reader.read_series(1), frame)
+            self.assert_same(pd.concat(list(reader.iter_chunks(1)), ignore_index=True), frame)
+
+    def test_read_chunk_and_columns(self):
+        frame = self.frame(30)
+        reader = self.write({1: frame})
+        self.assert_same(reader.read_chunk(1, 1), frame.iloc[8:16].reset_index(drop=True))
+        self.assert_same(reader.read_series(1, columns=['Timestamp', 'Soil_Moisture']),
+                         frame[['Timestamp', 'Soil_Moisture']])
+
+    def test_several_series_and_empty(self):
+        empty = self.frame(0)
+        reader = self.write({1: self.frame(9), 2: empty, 3: self.frame(1)})
+        self.assertEqual(reader.keys(), ['1', '2', '3'])
+        decoded = reader.read_series(2)
+        self.assertEqual(list(decoded.columns), list(empty.columns))
+        self.assertEqual(len(decoded), 0)
+        self.assert_same(reader.read_series(3), self.frame(1))
+
+if __name__ == '__main__':
+    unittest.main()
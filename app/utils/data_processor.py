@@ -2,6 +2,24 @@ import pandas as pd
 import numpy as np
 import math
 
+# DataFrame.attrs flag set on histories already ordered by a parsed Timestamp
+SORTED_FLAG = 'sorted_by_timestamp'
+
+# Sensor columns that get 24h averages and trends
+AVERAGED_FEATURES = ['Soil_Temperature', 'Humidity', 'Soil_Moisture', 'Light_Intensity',
+                     'Soil_pH', 'Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level',
+                     'Ambient_Temperature', 'Chlorophyll_Content', 'Electrochemical_Signal']
+
+def ensure_sorted(df):
+    """Return history ordered by timestamp; a no-op for DataService's sorted views"""
+    if df.attrs.get(SORTED_FLAG):
+        return df
+    df = df.copy()
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    df = df.sort_values('Timestamp', kind='stable')
+    df.attrs[SORTED_FLAG] = True
+    return df
+
 def process_for_prediction(plant_id, df, plant_data):
     """Process data for traditional model prediction"""
     processed = df.copy()
@@ -16,9 +34,7 @@ def process_for_prediction(plant_id, df, plant_data):
     processed['Month'] = processed['Timestamp'].dt.month
 
     # Get plant history for calculations
-    plant_history = plant_data[plant_id].copy()
-    plant_history['Timestamp'] = pd.to_datetime(plant_history['Timestamp'])
-    plant_history = plant_history.sort_values('Timestamp')
+    plant_history = ensure_sorted(plant_data[plant_id])
 
     # Calculate rolling averages if enough history
     if len(plant_history) >= 6:
@@ -26,9 +42,9 @@ def process_for_prediction(plant_id, df, plant_data):
                         'Soil_pH', 'Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level',
                         'Ambient_Temperature', 'Chlorophyll_Content', 'Electrochemical_Signal']:
             if feature in plant_history.columns:
-                # Calculate 24h average (equivalent to 6 readings at 4-hour intervals)
-                processed[f'{feature}_24h_avg'] = plant_history[feature].rolling(
-                    window=min(6, len(plant_history))).mean().iloc[-1]
+                # Calculate 24h average (equivalent to 6 readings at 4-hour intervals);
+                # only the last window is needed, so skip the full rolling pass
+                processed[f'{feature}_24h_avg'] = plant_history[feature].iloc[-6:].to_numpy().mean()
 
                 # Calculate trend (change per second)
                 if len(plant_history) >= 2:
@@ -99,6 +115,136 @@ def process_for_prediction(plant_id, df, plant_data):
 
     return processed
 
+def project_prediction_features(processed_row, values, timestamps, plant_history):
+    """Vectorized process_for_prediction for many projected readings at once
+    
+    processed_row is one row already run through process_for_prediction; its
+    history-derived columns (24h averages, trends) are shared by every projected
+    row. values maps sensor columns to arrays of projected values and timestamps
+    holds one timestamp per row.
+    """
+    n_rows = len(timestamps)
+    projected = processed_row.iloc[np.zeros(n_rows, dtype=int)].reset_index(drop=True)
+    
+    for feature, feature_values in values.items():
+        if feature in projected.columns:
+            projected[feature] = feature_values
+    
+    timestamps = pd.DatetimeIndex(timestamps)
+    projected['Timestamp'] = timestamps
+    projected['Hour'] = timestamps.hour
+    projected['Day'] = timestamps.day
+    projected['Month'] = timestamps.month
+    
+    # Per-row interaction features
+    projected['Temp_Humidity_Interaction'] = projected['Soil_Temperature'] * projected['Humidity']
+    
+    if all(col in projected.columns for col in ['Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level']):
+        npk_balance = (projected['Nitrogen_Level'] + projected['Phosphorus_Level'] +
+                       projected['Potassium_Level']) / 3
+        safe_balance = npk_balance.where(npk_balance > 0, 1)
+        projected['NPK_Balance'] = npk_balance
+        projected['NPK_Ratio_N'] = (projected['Nitrogen_Level'] / safe_balance).where(npk_balance > 0, 0)
+        projected['NPK_Ratio_P'] = (projected['Phosphorus_Level'] / safe_balance).where(npk_balance > 0, 0)
+        projected['NPK_Ratio_K'] = (projected['Potassium_Level'] / safe_balance).where(npk_balance > 0, 0)
+    
+    # Stress indicators against the plant's historical quantiles
+    if len(plant_history) >= 10:
+        moisture_q25 = plant_history['Soil_Moisture'].quantile(0.25)
+        temp_q25 = plant_history['Soil_Temperature'].quantile(0.25)
+        temp_q75 = plant_history['Soil_Temperature'].quantile(0.75)
+        
+        if 'Light_Intensity' in plant_history.columns:
+            light_q25 = plant_history['Light_Intensity'].quantile(0.25)
+            projected['Light_Stress'] = (projected['Light_Intensity'] < light_q25).astype(int)
+        
+        projected['Moisture_Stress'] = (projected['Soil_Moisture'] < moisture_q25).astype(int)
+        projected['Temperature_Stress'] = ((projected['Soil_Temperature'] > temp_q75) |
+                                           (projected['Soil_Temperature'] < temp_q25)).astype(int)
+    
+    return projected
+
+def featurize_history(history, window=pd.Timedelta(days=30)):
+    """Vectorized process_for_prediction for every row of one plant's history
+    
+    Row i gets the features process_for_prediction would have produced when
+    it was the latest reading, with the stored history being the rows in
+    (t_i - window, t_i], or all rows up to t_i when window is None. history
+    must be ordered by a parsed Timestamp.
+    """
+    processed = history.reset_index(drop=True)
+    timestamps = processed['Timestamp']
+    
+    # New columns are collected and joined once; inserting them one by one copies the frame each time
+    features = {}
+    
+    # Add time-based features
+    features['Hour'] = timestamps.dt.hour.to_numpy()
+    features['Day'] = timestamps.dt.day.to_numpy()
+    features['Month'] = timestamps.dt.month.to_numpy()
+    
+    # Number of readings the service would have held at each row
+    indexed = processed.set_index('Timestamp')
+    
+    def held(column):
+        # Readings held at each row: the trailing window, or everything without retention
+        return column.rolling(window) if window is not None else column.expanding()
+    
+    counts = held(indexed['Plant_ID']).count().to_numpy()
+    has_window = counts >= 6
+    
+    elapsed = (timestamps - timestamps.shift(5)).dt.total_seconds().to_numpy()
+    for feature in AVERAGED_FEATURES:
+        if feature not in processed.columns:
+            continue
+        values = processed[feature]
+        
+        # Last 6 readings when the service held at least 6, else the reading itself
+        average = values.rolling(6).mean().to_numpy()
+        features[f'{feature}_24h_avg'] = np.where(has_window, average, values)
+        
+        change = (values - values.shift(5)).to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            trend = np.where(elapsed > 0, change / elapsed, 0.0)
+        features[f'{feature}_trend'] = np.where(has_window, trend, 0.0)
+    
+    # Calculate interaction features
+    features['Temp_Humidity_Interaction'] = (processed['Soil_Temperature'] * processed['Humidity']).to_numpy()
+    
+    if all(col in processed.columns for col in ['Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level']):
+        npk_balance = (processed['Nitrogen_Level'] + processed['Phosphorus_Level'] +
+                       processed['Potassium_Level']) / 3
+        safe_balance = npk_balance.where(npk_balance > 0, 1)
+        features['NPK_Balance'] = npk_balance.to_numpy()
+        features['NPK_Ratio_N'] = (processed['Nitrogen_Level'] / safe_balance).where(npk_balance > 0, 0).to_numpy()
+        features['NPK_Ratio_P'] = (processed['Phosphorus_Level'] / safe_balance).where(npk_balance > 0, 0).to_numpy()
+        features['NPK_Ratio_K'] = (processed['Potassium_Level'] / safe_balance).where(npk_balance > 0, 0).to_numpy()
+    else:
+        for column in ['NPK_Balance', 'NPK_Ratio_N', 'NPK_Ratio_P', 'NPK_Ratio_K']:
+            features[column] = np.zeros(len(processed), dtype=np.int64)
+    
+    # Stress indicators against the quantiles of the readings held at each row
+    has_quantiles = counts >= 10
+    
+    def rolling_quantile(feature, q):
+        return held(indexed[feature]).quantile(q).to_numpy()
+    
+    moisture_stress = processed['Soil_Moisture'].to_numpy() < rolling_quantile('Soil_Moisture', 0.25)
+    soil_temperature = processed['Soil_Temperature'].to_numpy()
+    temperature_stress = ((soil_temperature > rolling_quantile('Soil_Temperature', 0.75)) |
+                          (soil_temperature < rolling_quantile('Soil_Temperature', 0.25)))
+    features['Moisture_Stress'] = (has_quantiles & moisture_stress).astype(int)
+    features['Temperature_Stress'] = (has_quantiles & temperature_stress).astype(int)
+    if 'Light_Intensity' in processed.columns:
+        light_stress = processed['Light_Intensity'].to_numpy() < rolling_quantile('Light_Intensity', 0.25)
+        features['Light_Stress'] = (has_quantiles & light_stress).astype(int)
+    else:
+        features['Light_Stress'] = np.zeros(len(processed), dtype=int)
+    
+    # Recomputed columns replace any the history already carries
+    processed = processed.drop(columns=[name for name in features if name in processed.columns])
+    return pd.concat([processed, pd.DataFrame(features, index=processed.index)], axis=1)
+
 def process_for_lstm(df):
     """Create features needed for LSTM prediction"""
     processed = df.copy()
@@ -140,47 +286,357 @@ def process_for_lstm(df):
     
     return processed
 
-def prepare_lstm_sequence(plant_id, plant_data, model_service):
-    """Convert latest data to proper sequence format for LSTM"""
-    if not model_service.model_config or not model_service.feature_columns or not model_service.feature_scaler:
-        print("LSTM model not properly loaded")
-        return None
-        
-    try:
-        # Get sequence length from config
-        sequence_length = model_service.get_sequence_length()
+# Sensors process_for_lstm derives rolling means and change rates from
+LSTM_ROLLING_FEATURES = ['Soil_Moisture', 'Soil_Temperature', 'Humidity', 'Light_Intensity']
+
+# process_for_lstm features computed from the Timestamp
+LSTM_TIME_FEATURES = ['Hour', 'Day', 'Month', 'Hour_Sin', 'Hour_Cos', 'Day_Sin', 'Day_Cos',
+                      'Month_Sin', 'Month_Cos']
+
+# Derived process_for_lstm features and the sensor columns each one needs
+LSTM_DERIVED_INPUTS = {
+    'Moisture_Temp_Interaction': ('Soil_Moisture', 'Soil_Temperature'),
+    'Humidity_Temp_Interaction': ('Humidity', 'Ambient_Temperature'),
+    'NPK_Balance': ('Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level'),
+}
+for _feature in LSTM_ROLLING_FEATURES:
+    LSTM_DERIVED_INPUTS[f'{_feature}_rolling_mean'] = (_feature,)
+    LSTM_DERIVED_INPUTS[f'{_feature}_change_rate'] = (_feature,)
+
+# Appends up to this many rows are featurized row by row; larger ones use rolling windows
+INCREMENTAL_FEATURE_ROWS = 64
+
+def prediction_feature_columns(columns):
+    """featurize_history's derived columns for a history with the given raw columns, in its order"""
+    names = ['Hour', 'Day', 'Month']
+    for feature in AVERAGED_FEATURES:
+        if feature in columns:
+            names += [f'{feature}_24h_avg', f'{feature}_trend']
+    return names + ['Temp_Humidity_Interaction', 'NPK_Balance', 'NPK_Ratio_N', 'NPK_Ratio_P', 'NPK_Ratio_K',
+                    'Moisture_Stress', 'Temperature_Stress', 'Light_Stress']
+
+def lstm_feature_columns(columns):
+    """process_for_lstm's derived columns for the given raw columns, beyond the prediction ones"""
+    names = [feature for feature in LSTM_TIME_FEATURES if feature not in ('Hour', 'Day', 'Month')]
+    for feature, needed in LSTM_DERIVED_INPUTS.items():
+        if feature != 'NPK_Balance' and all(name in columns for name in needed):
+            names.append(feature)
+    return names
+
+def stored_feature_columns(columns):
+    """Every feature column materialized for a history with the given raw columns"""
+    return prediction_feature_columns(columns) + lstm_feature_columns(columns)
+
+# Every column the feature store may add to a history
+STORED_FEATURES = frozenset(stored_feature_columns(AVERAGED_FEATURES))
+
+def raw_columns(columns):
+    """The columns that are readings rather than materialized features"""
+    return [column for column in columns if column not in STORED_FEATURES]
+
+def materialize_features(columns, start=0, window=pd.Timedelta(days=30)):
+    """Feature columns for rows start: of one plant's sorted history, as {name: float64 array}
+    
+    columns is a DataFrame or {name: array} of raw readings. Row i gets the
+    featurize_history columns it would get as the newest reading, over the
+    readings in (t_i - window, t_i] (all earlier ones if window is None), and
+    the process_for_lstm columns computed
+    over the plant's continuous history. columns must hold those window
+    readings before start, and at least five earlier rows for the averages,
+    trends and rolling means.
+    """
+    names = [name for name in columns.keys() if name not in STORED_FEATURES]
+    timestamps = np.asarray(columns['Timestamp']).astype('datetime64[ns]')
+    nanoseconds = timestamps.view(np.int64)
+    values = {name: np.asarray(columns[name], dtype=np.float64)
+              for name in AVERAGED_FEATURES if name in names}
+    rows = np.arange(start, len(timestamps))
+    features = {}
+    
+    if len(rows) > INCREMENTAL_FEATURE_ROWS:
+        # Bulk: rolling windows over the whole history
+        history = pd.DataFrame({name: np.asarray(columns[name]) for name in names})
+        history['Timestamp'] = timestamps
+        if 'Plant_ID' not in history.columns:
+            history['Plant_ID'] = 0
+        processed = featurize_history(history, window)
+        for name in prediction_feature_columns(names):
+            features[name] = processed[name].to_numpy(dtype=np.float64)[start:]
+    else:
+        new_times = pd.DatetimeIndex(timestamps[start:])
+        features['Hour'] = new_times.hour.to_numpy()
+        features['Day'] = new_times.day.to_numpy()
+        features['Month'] = new_times.month.to_numpy()
         
-        # Get plant history for sequence
-        plant_history = plant_data[plant_id].copy()
-        plant_history['Timestamp'] = pd.to_datetime(plant_history['Timestamp'])
-        plant_history = plant_history.sort_values('Timestamp')
+        # Readings the service held at each row
+        if window is None:
+            window_start = np.zeros(len(rows), dtype=np.int64)
+        else:
+            window_start = np.searchsorted(nanoseconds, nanoseconds[start:] - pd.Timedelta(window).value,
+                                           side='right')
+        counts = rows - window_start + 1
+        has_window = counts >= 6
         
-        # Need at least sequence_length data points
-        if len(plant_history) < sequence_length:
-            print(f"Not enough history for plant {plant_id} to create sequence")
-            return None
+        earlier = np.maximum(rows - 5, 0)
+        elapsed = np.where(rows >= 5, (nanoseconds[start:] - nanoseconds[earlier]) / 1e9, np.nan)
+        for feature, feature_values in values.items():
+            current = feature_values[start:]
+            
+            # Mean of the last 6 readings; only rows with a full window use it
+            average = np.array([feature_values[i - 5:i + 1].mean() if i >= 5 else np.nan for i in rows])
+            features[f'{feature}_24h_avg'] = np.where(has_window, average, current)
             
-        # Get the last sequence_length records
-        sequence_data = plant_history.iloc[-sequence_length:].copy()
+            change = current - feature_values[earlier]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                trend = np.where(elapsed > 0, change / elapsed, 0.0)
+            features[f'{feature}_trend'] = np.where(has_window, trend, 0.0)
+        
+        features.update(_row_features(values, start))
         
-        # Prepare features with engineering
-        sequence_data = process_for_lstm(sequence_data)
+        # Stress indicators against the quantiles of the readings held at each row
+        def window_quantiles(feature, quantiles):
+            return np.array([np.nanquantile(values[feature][lo:i + 1], quantiles)
+                             for lo, i in zip(window_start, rows)]).reshape(len(rows), -1)
         
-        # Extract just the needed features in the right order
-        X = np.zeros((1, sequence_length, len(model_service.feature_columns)))
+        has_quantiles = counts >= 10
+        soil_moisture = values['Soil_Moisture'][start:]
+        soil_temperature = values['Soil_Temperature'][start:]
+        temperature_q = window_quantiles('Soil_Temperature', [0.25, 0.75])
+        features['Moisture_Stress'] = has_quantiles & (soil_moisture < window_quantiles('Soil_Moisture', [0.25])[:, 0])
+        features['Temperature_Stress'] = has_quantiles & ((soil_temperature > temperature_q[:, 1]) |
+                                                          (soil_temperature < temperature_q[:, 0]))
+        if 'Light_Intensity' in values:
+            light_q25 = window_quantiles('Light_Intensity', [0.25])[:, 0]
+            features['Light_Stress'] = has_quantiles & (values['Light_Intensity'][start:] < light_q25)
+        else:
+            features['Light_Stress'] = np.zeros(len(rows), dtype=bool)
+    
+    # process_for_lstm columns over the continuous history
+    periods = {'Hour': 24, 'Day': 31, 'Month': 12}
+    for unit, period in periods.items():
+        features[f'{unit}_Sin'] = np.sin(features[unit] * (2 * np.pi / period))
+        features[f'{unit}_Cos'] = np.cos(features[unit] * (2 * np.pi / period))
+    if 'Soil_Moisture' in values and 'Soil_Temperature' in values:
+        features['Moisture_Temp_Interaction'] = values['Soil_Moisture'][start:] * values['Soil_Temperature'][start:] / 100
+    if 'Humidity' in values and 'Ambient_Temperature' in values:
+        features['Humidity_Temp_Interaction'] = values['Humidity'][start:] * values['Ambient_Temperature'][start:] / 100
+    for feature in LSTM_ROLLING_FEATURES:
+        if feature not in values:
+            continue
+        feature_values = values[feature]
+        current = feature_values[start:]
+        previous = np.where(rows >= 1, feature_values[np.maximum(rows - 1, 0)], np.nan)
         
-        for i, feature in enumerate(model_service.feature_columns):
-            if feature in sequence_data.columns:
-                X[0, :, i] = sequence_data[feature].values
-            # If feature is missing, leave as zeros
+        # rolling(3).mean().fillna(values): the plant's first two readings keep their own value
+        mean = np.where(rows >= 2, (feature_values[np.maximum(rows - 2, 0)] + previous + current) / 3, np.nan)
+        features[f'{feature}_rolling_mean'] = np.where(np.isnan(mean), current, mean)
         
-        # Scale features
-        X_reshaped = X.reshape(-1, X.shape[-1])
-        X_scaled = model_service.feature_scaler.transform(X_reshaped)
-        X_scaled = X_scaled.reshape(X.shape)
+        # pct_change().fillna(0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = current / previous - 1
+        features[f'{feature}_change_rate'] = np.nan_to_num(rate, nan=0.0, posinf=np.inf, neginf=-np.inf)
+    
+    return {name: np.asarray(features[name], dtype=np.float64) for name in stored_feature_columns(names)}
+
+def _row_features(values, start):
+    """featurize_history's per-row interaction and NPK columns for rows start:"""
+    features = {}
+    features['Temp_Humidity_Interaction'] = values['Soil_Temperature'][start:] * values['Humidity'][start:]
+    if all(col in values for col in ['Nitrogen_Level', 'Phosphorus_Level', 'Potassium_Level']):
+        nitrogen = values['Nitrogen_Level'][start:]
+        phosphorus = values['Phosphorus_Level'][start:]
+        potassium = values['Potassium_Level'][start:]
+        npk_balance = (nitrogen + phosphorus + potassium) / 3
+        safe_balance = np.where(npk_balance > 0, npk_balance, 1)
+        features['NPK_Balance'] = npk_balance
+        features['NPK_Ratio_N'] = np.where(npk_balance > 0, nitrogen / safe_balance, 0)
+        features['NPK_Ratio_P'] = np.where(npk_balance > 0, phosphorus / safe_balance, 0)
+        features['NPK_Ratio_K'] = np.where(npk_balance > 0, potassium / safe_balance, 0)
+    else:
+        for column in ['NPK_Balance', 'NPK_Ratio_N', 'NPK_Ratio_P', 'NPK_Ratio_K']:
+            features[column] = np.zeros(len(values['Soil_Temperature']) - start)
+    return features
+
+class LSTMFeatureLayout:
+    """Column index map from a model's feature columns to process_for_lstm features
+    
+    Built once per feature column list, so the sequence builder knows up front
+    which sensor columns to stack and where each feature lands in X.
+    """
+    
+    def __init__(self, feature_columns):
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+        self.time_features = [(i, f) for i, f in enumerate(self.feature_columns) if f in LSTM_TIME_FEATURES]
+        self.derived_features = [(i, f, LSTM_DERIVED_INPUTS[f]) for i, f in enumerate(self.feature_columns)
+                                 if f in LSTM_DERIVED_INPUTS]
+        self.raw_features = [(i, f) for i, f in enumerate(self.feature_columns)
+                             if f not in LSTM_TIME_FEATURES and f not in LSTM_DERIVED_INPUTS]
+        
+        # Every sensor column the features read, derived ones falling back to a raw column
+        inputs = {f for _, f in self.raw_features}
+        for _, feature, needed in self.derived_features:
+            inputs.update(needed)
+            inputs.add(feature)
+        self.inputs = sorted(inputs - {'Timestamp'})
+
+_lstm_layouts = {}
+
+def get_lstm_layout(feature_columns):
+    """Cached LSTMFeatureLayout for a feature column list"""
+    key = tuple(feature_columns)
+    layout = _lstm_layouts.get(key)
+    if layout is None:
+        layout = _lstm_layouts[key] = LSTMFeatureLayout(key)
+    return layout
+
+def _history_tail(history, n):
+    """Last n rows of a sorted DataFrame or HistorySnapshot as {column: array}"""
+    if isinstance(history, pd.DataFrame):
+        history = ensure_sorted(history)
+        return {name: history[name].to_numpy()[-n:] for name in history.columns}
+    return history.tail(n)
+
+def _scaler_affine(scaler):
+    """(scale, offset, clip range) so scaler.transform(X) == X * scale + offset, or None"""
+    if hasattr(scaler, 'min_') and hasattr(scaler, 'scale_'):
+        # MinMaxScaler
+        clip = scaler.feature_range if getattr(scaler, 'clip', False) else None
+        return scaler.scale_, scaler.min_, clip
+    if hasattr(scaler, 'mean_') or hasattr(scaler, 'var_'):
+        # StandardScaler
+        scale = getattr(scaler, 'scale_', None)
+        scale = 1.0 / scale if scale is not None else 1.0
+        mean = getattr(scaler, 'mean_', None)
+        offset = -mean * scale if mean is not None else 0.0
+        return scale, offset, None
+    return None
+
+def _lstm_group_features(X, rows, tails, layout, columns):
+    """Fill X[rows] for plants sharing one column set, one stacked array per column"""
+    stacked = {name: np.stack([tail[name] for tail in tails]).astype(np.float64)
+               for name in layout.inputs if name in columns}
+    
+    if layout.time_features:
+        timestamps = pd.DatetimeIndex(np.concatenate([tail['Timestamp'] for tail in tails]))
+        shape = (len(tails), -1)
+        calendar = {'Hour': timestamps.hour.to_numpy().reshape(shape),
+                    'Day': timestamps.day.to_numpy().reshape(shape),
+                    'Month': timestamps.month.to_numpy().reshape(shape)}
+        periods = {'Hour': 24, 'Day': 31, 'Month': 12}
+        for i, feature in layout.time_features:
+            unit, _, wave = feature.partition('_')
+            values = calendar[unit]
+            if wave == 'Sin':
+                values = np.sin(values * (2 * np.pi / periods[unit]))
+            elif wave == 'Cos':
+                values = np.cos(values * (2 * np.pi / periods[unit]))
+            X[rows, :, i] = values
+    
+    for i, feature in layout.raw_features:
+        if feature in stacked:
+            X[rows, :, i] = stacked[feature]
+        # If feature is missing, leave as zeros
+    
+    sequence_length = X.shape[1]
+    for i, feature, needed in layout.derived_features:
+        if feature in stacked:
+            # Stored with the history (FeatureStore), computed over the continuous history like in training
+            X[rows, :, i] = stacked[feature]
+            continue
+        
+        rolling = feature.endswith(('_rolling_mean', '_change_rate'))
+        if not all(name in stacked for name in needed) or (rolling and sequence_length <= 2):
+            # process_for_lstm skips the feature
+            continue
+        
+        if feature.endswith('_rolling_mean'):
+            # rolling(3).mean().fillna(values): the first two readings keep their own value
+            values = stacked[needed[0]]
+            mean = values.copy()
+            mean[:, 2:] = (values[:, :-2] + values[:, 1:-1] + values[:, 2:]) / 3
+            X[rows, :, i] = np.where(np.isnan(mean), values, mean)
+        elif feature.endswith('_change_rate'):
+            # pct_change().fillna(0)
+            values = stacked[needed[0]]
+            rate = np.zeros_like(values)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rate[:, 1:] = values[:, 1:] / values[:, :-1] - 1
+            X[rows, :, i] = np.nan_to_num(rate, nan=0.0, posinf=np.inf, neginf=-np.inf)
+        elif feature == 'NPK_Balance':
+            X[rows, :, i] = (stacked['Nitrogen_Level'] + stacked['Phosphorus_Level'] +
+                             stacked['Potassium_Level']) / 3
+        else:
+            # Interaction features
+            X[rows, :, i] = stacked[needed[0]] * stacked[needed[1]] / 100
+
+def build_lstm_sequences(histories, model_service):
+    """Scaled LSTM input for many plants at once
+    
+    histories maps plant IDs to sorted DataFrames or HistorySnapshots. Only the
+    last sequence_length rows of each are read; plants sharing a column set are
+    stacked per column and their process_for_lstm features computed together.
+    The scaler is applied to the whole tensor as one affine transform.
+    
+    Returns (plant_ids, X) with X shaped (len(plant_ids), sequence_length,
+    n_features); plants without sequence_length readings are left out.
+    """
+    if not model_service.model_config or not model_service.feature_columns or not model_service.feature_scaler:
+        print("LSTM model not properly loaded")
+        return None
+    
+    try:
+        sequence_length = model_service.get_sequence_length()
+        layout = get_lstm_layout(model_service.feature_columns)
         
-        return X_scaled
+        # Group the tails by column set so each group stacks into dense arrays
+        plant_ids = []
+        groups = {}
+        for plant_id, history in histories.items():
+            tail = _history_tail(history, sequence_length)
+            if len(tail.get('Timestamp', ())) < sequence_length:
+                continue
+            groups.setdefault(frozenset(tail), []).append((len(plant_ids), tail))
+            plant_ids.append(plant_id)
         
+        X = np.zeros((len(plant_ids), sequence_length, layout.n_features))
+        for columns, members in groups.items():
+            rows = np.array([row for row, _ in members])
+            _lstm_group_features(X, rows, [tail for _, tail in members], layout, columns)
+
+        # The scaler rejects infinite change rates (a reading after a zero); skip those plants
+        infinite = np.isinf(X).any(axis=(1, 2))
+        if infinite.any():
+            for k in np.flatnonzero(infinite):
+                print(f"Error preparing LSTM sequence for plant {plant_ids[k]}: infinite feature value")
+            plant_ids = [plant_id for plant_id, bad in zip(plant_ids, infinite) if not bad]
+            X = X[~infinite]
+
+        # Scale features
+        affine = _scaler_affine(model_service.feature_scaler)
+        if affine is None:
+            X_scaled = model_service.feature_scaler.transform(X.reshape(-1, layout.n_features))
+            return plant_ids, X_scaled.reshape(X.shape)
+        
+        scale, offset, clip = affine
+        X *= scale
+        X += offset
+        if clip is not None:
+            np.clip(X, clip[0], clip[1], out=X)
+        return plant_ids, X
+    
     except Exception as e:
-        print(f"Error preparing LSTM sequence: {e}")
-        return None
\ No newline at end of file
+        print(f"Error preparing LSTM sequences: {e}")
+        return None
+
+def prepare_lstm_sequence(plant_id, plant_data, model_service):
+    """Convert latest data to proper sequence format for LSTM"""
+    result = build_lstm_sequences({plant_id: plant_data[plant_id]}, model_service)
+    if result is None:
+        return None
+    
+    plant_ids, X = result
+    if not plant_ids:
+        print(f"Not enough history for plant {plant_id} to create sequence")
+        return None
+    return X
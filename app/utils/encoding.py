@@ -0,0 +1,122 @@
+import gzip
+import json
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Binary encoding is optional
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_JSON_MIMETYPE = 'application/vnd.plant-health.columnar+json'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+ENCODING_VERSION = 'columnar/v1'
+JSON_FLOAT_DIGITS = 4
+
+def available_mimetypes():
+    """Mimetypes we can produce, JSON first so it wins for */*"""
+    mimetypes = [JSON_MIMETYPE, COLUMNAR_JSON_MIMETYPE]
+    if msgpack is not None:
+        mimetypes.append(MSGPACK_MIMETYPE)
+    return mimetypes
+
+def _flatten(record, prefix=''):
+    """Flatten nested dicts into dotted keys"""
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+def _pack_array(values, dtype, binary):
+    """Raw little-endian bytes for binary formats, rounded lists for JSON"""
+    array = np.asarray(values, dtype=dtype)
+    if binary:
+        return {"dtype": array.dtype.str, "data": array.tobytes()}
+    if array.dtype.kind == 'f':
+        rounded = np.round(array.astype(np.float64), JSON_FLOAT_DIGITS).tolist()
+        if np.isnan(array).any():
+            return [None if v != v else v for v in rounded]
+        return rounded
+    return array.tolist()
+
+def _encode_timestamps(values, binary):
+    """Shared base plus a fixed step, or base plus per-entry offsets
+    
+    Naive timestamps are encoded as epoch seconds as if they were UTC.
+    """
+    epochs = np.array(values, dtype='datetime64[s]').astype(np.int64)
+    base = int(epochs[0])
+    offsets = epochs - base
+    steps = np.diff(offsets)
+    if len(steps) == 0 or (steps == steps[0]).all():
+        return {"base": base, "step": int(steps[0]) if len(steps) else 0, "count": len(epochs)}
+    return {"base": base, "offsets": _pack_array(offsets, '<i4', binary)}
+
+def records_to_columnar(records, binary=False):
+    """Convert a list of flat-ish dicts into one array per field"""
+    flattened = [_flatten(record) for record in records]
+    keys = list(dict.fromkeys(key for record in flattened for key in record))
+
+    columns = {}
+    for key in keys:
+        values = [record.get(key) for record in flattened]
+        present = [v for v in values if v is not None]
+
+        if key == 'date':
+            # Duplicate of timestamp in forecast entries
+            continue
+        if not present:
+            columns[key] = values
+        elif isinstance(present[0], str) and all(type(v) is str for v in present):
+            if key == 'timestamp' and len(present) == len(values):
+                columns[key] = _encode_timestamps(values, binary)
+                continue
+            # Dictionary-encode repeated strings
+            dictionary = list(dict.fromkeys(present))
+            lookup = {value: code for code, value in enumerate(dictionary)}
+            codes = [lookup.get(v, -1) for v in values]
+            columns[key] = {"dictionary": dictionary, "codes": _pack_array(codes, '<i2', binary)}
+        elif isinstance(present[0], (int, float, np.number)) and not isinstance(present[0], bool):
+            try:
+                numeric = np.array([np.nan if v is None else v for v in values], dtype='<f4')
+                columns[key] = _pack_array(numeric, '<f4', binary)
+            except (TypeError, ValueError):
+                columns[key] = values
+        else:
+            columns[key] = values
+
+    return {"length": len(records), "columns": columns}
+
+def to_columnar(payload, binary=False):
+    """Replace every list of records in a response payload with a columnar block"""
+    encoded = {"encoding": ENCODING_VERSION}
+    for key, value in payload.items():
+        if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+            encoded[key] = records_to_columnar(value, binary)
+        else:
+            encoded[key] = value
+    return encoded
+
+def _default(value):
+    """Serialize numpy scalars"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value)}")
+
+def encode_payload(payload, mimetype, compress=False):
+    """Serialize a response payload in the negotiated format"""
+    if mimetype == MSGPACK_MIMETYPE:
+        body = msgpack.packb(to_columnar(payload, binary=True), use_single_float=True, default=_default)
+    elif mimetype == COLUMNAR_JSON_MIMETYPE:
+        body = json.dumps(to_columnar(payload), separators=(',', ':'), default=_default).encode()
+    else:
+        body = json.dumps(payload, default=_default).encode()
+
+    if compress:
+        body = gzip.compress(body, compresslevel=5)
+    return body
@@ -0,0 +1,125 @@
+import json
+import pandas as pd
+from app.utils.timeseries_codec import CODEC_EXTENSION, SeriesReader
+
+# Bytes read from disk at a time by the streaming JSON reader
+READ_BLOCK_SIZE = 1 << 20
+
+def iter_readings(path, chunk_rows=50000):
+    """Stream readings from an exported history file as DataFrame chunks
+
+    Supports the service's history JSON ({plant_id: [reading, ...]}) and
+    compressed .tsc history, the raw Kaggle CSV under data/raw and NDJSON with
+    one reading per line. Memory is bounded by chunk_rows whatever the file size.
+    """
+    if path.endswith(CODEC_EXTENSION):
+        yield from _iter_compressed(path, chunk_rows)
+    elif path.endswith('.csv'):
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    elif path.endswith(('.ndjson', '.jsonl')):
+        yield from pd.read_json(path, lines=True, chunksize=chunk_rows, convert_dates=False)
+    else:
+        yield from _iter_history_json(path, chunk_rows)
+
+def iter_stream_readings(stream, data_format, chunk_rows=50000):
+    """Stream readings from an open file or request body as DataFrame chunks
+
+    data_format is 'csv' (the raw Kaggle schema) or 'ndjson' (one reading per line).
+    """
+    if data_format == 'csv':
+        yield from pd.read_csv(stream, chunksize=chunk_rows)
+    elif data_format == 'ndjson':
+        yield from pd.read_json(stream, lines=True, chunksize=chunk_rows, convert_dates=False)
+    else:
+        raise ValueError(f"Unsupported reading format: {data_format}")
+
+def _iter_compressed(path, chunk_rows):
+    """Decode a .tsc history file series by series, regrouped into chunk_rows frames"""
+    reader = SeriesReader(path)
+    frames = []
+    rows = 0
+    for key in reader.keys():
+        for frame in reader.iter_chunks(key):
+            if 'Plant_ID' not in frame.columns:
+                frame['Plant_ID'] = int(key)
+            frames.append(frame)
+            rows += len(frame)
+            if rows >= chunk_rows:
+                yield pd.concat(frames, ignore_index=True)
+                frames = []
+                rows = 0
+    if frames:
+        yield pd.concat(frames, ignore_index=True)
+
+def _iter_history_json(path, chunk_rows):
+    """Incrementally parse {plant_id: [reading, ...], ...} without loading the file"""
+    decoder = json.JSONDecoder()
+    records = []
+
+    with open(path, 'r') as f:
+        buffer = ''
+        position = 0
+        eof = False
+        plant_id = None
+        state = 'object'  # object -> key -> array -> record -> ... -> key
+
+        while True:
+            # Skip whitespace and separators, refilling the buffer as needed
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,:':
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                buffer, position = buffer[position:], 0
+                block = f.read(READ_BLOCK_SIZE)
+                eof = not block
+                buffer += block
+
+            if position >= len(buffer):
+                break
+            char = buffer[position]
+
+            if state == 'object':
+                if char != '{':
+                    raise ValueError(f"Expected a JSON object in {path}")
+                position += 1
+                state = 'key'
+            elif state == 'key':
+                if char == '}':
+                    break
+                buffer, position, plant_id = _decode(decoder, f, buffer, position)
+                state = 'array'
+            elif state == 'array':
+                if char != '[':
+                    raise ValueError(f"Expected a list of readings for plant {plant_id}")
+                position += 1
+                state = 'record'
+            elif char == ']':
+                position += 1
+                state = 'key'
+            else:
+                buffer, position, record = _decode(decoder, f, buffer, position)
+                record.setdefault('Plant_ID', int(plant_id))
+                records.append(record)
+                if len(records) >= chunk_rows:
+                    yield pd.DataFrame(records)
+                    records = []
+
+    if records:
+        yield pd.DataFrame(records)
+
+def _decode(decoder, f, buffer, position):
+    """Decode one JSON value at position, reading more of the file until it is complete
+
+    Returns (buffer, end, value); the buffer may have been extended and rebased.
+    """
+    while True:
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+            return buffer, end, value
+        except json.JSONDecodeError:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                raise
+            buffer = buffer[position:] + block
+            position = 0
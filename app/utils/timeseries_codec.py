@@ -0,0 +1,290 @@
+import os
+import json
+import struct
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Compressed sensor history files
+CODEC_EXTENSION = '.tsc'
+MAGIC = b'TSC1'
+CHUNK_ROWS = 1024
+
+# Decimal places tried when quantizing floats; sensor readings rarely carry more
+MAX_DECIMALS = 6
+
+# Footer: index length and offset, then the magic again
+_FOOTER = struct.Struct('<QQ4s')
+
+def _zigzag(values):
+    """Map signed int64 to uint64 so small magnitudes get small codes"""
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+def _unzigzag(codes):
+    return (codes >> np.uint64(1)).view(np.int64) ^ -(codes & np.uint64(1)).view(np.int64)
+
+def _bit_width(codes):
+    if len(codes) == 0:
+        return 0
+    return int(codes.max()).bit_length()
+
+def pack_bits(codes, width):
+    """Pack uint64 codes into width bits each, vectorized"""
+    if width == 0 or len(codes) == 0:
+        return b''
+    bits = np.unpackbits(codes.astype('>u8').view(np.uint8).reshape(-1, 8), axis=1)
+    return np.packbits(bits[:, 64 - width:]).tobytes()
+
+def unpack_bits(buffer, width, count):
+    """Inverse of pack_bits"""
+    if width == 0 or count == 0:
+        return np.zeros(count, dtype=np.uint64)
+    if width <= 57:
+        # Gather the 8 bytes holding each code and shift it out of the big-endian word
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        padded = np.zeros(len(raw) + 8, dtype=np.uint8)
+        padded[:len(raw)] = raw
+        starts = np.arange(count, dtype=np.int64) * width
+        words = sliding_window_view(padded, 8)[starts >> 3].view('>u8').ravel().astype(np.uint64)
+        return (words << (starts & 7).astype(np.uint64)) >> np.uint64(64 - width)
+    bits = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8), count=count * width).reshape(count, width)
+    padded = np.zeros((count, 64), dtype=np.uint8)
+    padded[:, 64 - width:] = bits
+    return np.packbits(padded, axis=1).view('>u8').ravel().astype(np.uint64)
+
+def _encode_deltas(integers, order):
+    """Zigzag-coded deltas (order 1) or delta-of-deltas (order 2); the leading values go in the meta
+
+    Deltas are divided by the largest power of ten they share, so timestamps
+    recorded to the second or microsecond do not pay for nanosecond bits.
+    """
+    meta = {'first': int(integers[0])}
+    residuals = np.diff(integers)
+    unit = 1
+    if len(residuals) and residuals.any():
+        for candidate in (10 ** 9, 10 ** 6, 10 ** 3):
+            if not np.any(residuals % candidate):
+                unit = candidate
+                residuals = residuals // unit
+                break
+    meta['unit'] = unit
+    if order == 2 and len(residuals):
+        meta['delta'] = int(residuals[0])
+        residuals = np.diff(residuals)
+    codes = _zigzag(residuals)
+    meta['width'] = _bit_width(codes)
+    return meta, pack_bits(codes, meta['width'])
+
+def _decode_deltas(meta, buffer, count, order):
+    residuals = _unzigzag(unpack_bits(buffer, meta['width'], max(0, count - order)))
+    if order == 2 and count > 1:
+        residuals = np.cumsum(np.concatenate([[meta['delta']], residuals]), dtype=np.int64)
+    if meta['unit'] != 1:
+        residuals = residuals * meta['unit']
+    return np.cumsum(np.concatenate([[meta['first']], residuals]), dtype=np.int64)[:count]
+
+def _decimals(values):
+    """Fewest decimal places that reproduce every value exactly, or None"""
+    if not np.all(np.isfinite(values)) or np.any(np.signbit(values) & (values == 0)):
+        return None
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        quantized = np.round(values * scale)
+        if np.all(np.abs(quantized) < 2 ** 53) and np.array_equal(quantized / scale, values):
+            return decimals
+    return None
+
+def encode_column(values):
+    """Encode one column chunk; returns (meta, bytes)
+
+    Datetimes and integers store delta-of-deltas, floats with few decimals store
+    quantized deltas, other floats XOR each value with the previous one
+    (Gorilla-style) and everything else is dictionary coded. Residuals are
+    bit-packed at the chunk's widest width, so decoding is a few vectorized
+    NumPy passes.
+    """
+    values = np.asarray(values)
+    count = len(values)
+    kind = values.dtype.kind
+
+    if count and kind == 'M':
+        meta, data = _encode_deltas(values.astype('datetime64[ns]').view(np.int64), 2)
+        meta.update(encoding='dod', dtype='datetime64[ns]')
+    elif count and kind in 'iub':
+        meta, data = _encode_deltas(values.astype(np.int64), 2)
+        meta.update(encoding='dod', dtype=values.dtype.str)
+    elif count and kind == 'f':
+        values = values.astype(np.float64)
+        decimals = _decimals(values)
+        if decimals is not None:
+            meta, data = _encode_deltas(np.round(values * 10.0 ** decimals).astype(np.int64), 1)
+            meta.update(encoding='quantized', dtype='<f8', decimals=decimals)
+        else:
+            bits = values.view(np.uint64)
+            xored = bits[1:] ^ bits[:-1]
+            nonzero = xored[xored != 0]
+            # Shared trailing zeros are dropped from every XOR
+            trailing = _common_trailing_zeros(nonzero) if len(nonzero) else 0
+            codes = xored >> np.uint64(trailing)
+            width = _bit_width(codes)
+            meta = {'encoding': 'xor', 'dtype': '<f8', 'first': int(bits[0]), 'trailing': trailing,
+                    'width': width}
+            data = pack_bits(codes, width)
+    else:
+        labels, codes = _dictionary(values)
+        width = _bit_width(codes.astype(np.uint64))
+        meta = {'encoding': 'dictionary', 'dtype': 'object', 'labels': labels, 'width': width}
+        data = pack_bits(codes.astype(np.uint64), width)
+
+    return meta, data
+
+def decode_column(meta, buffer, count):
+    """Decode a column chunk written by encode_column into a NumPy array"""
+    encoding = meta['encoding']
+    if encoding == 'dod':
+        integers = _decode_deltas(meta, buffer, count, 2)
+        if meta['dtype'] == 'datetime64[ns]':
+            return integers.view('datetime64[ns]')
+        return integers.astype(np.dtype(meta['dtype']))
+    if encoding == 'quantized':
+        return _decode_deltas(meta, buffer, count, 1).astype(np.float64) / 10.0 ** meta['decimals']
+    if encoding == 'xor':
+        codes = unpack_bits(buffer, meta['width'], count - 1) << np.uint64(meta['trailing'])
+        bits = np.bitwise_xor.accumulate(np.concatenate([np.array([meta['first']], dtype=np.uint64), codes]))
+        return bits.view(np.float64)
+    labels = np.empty(len(meta['labels']), dtype=object)
+    labels[:] = meta['labels']
+    return labels[unpack_bits(buffer, meta['width'], count).astype(np.intp)]
+
+def _common_trailing_zeros(codes):
+    """Trailing zero bits shared by every nonzero code"""
+    combined = np.bitwise_or.reduce(codes)
+    return (int(combined) & -int(combined)).bit_length() - 1
+
+def _dictionary(values):
+    """(labels, codes) for a column of arbitrary objects, NaN as None"""
+    index = {}
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            value = None
+        elif isinstance(value, np.generic):
+            value = value.item()
+        codes[i] = index.setdefault(value, len(index))
+    return list(index), codes
+
+class SeriesWriter:
+    """Writes frames keyed by series (e.g. plant ID) as compressed column chunks
+
+    Layout: magic, column blocks, a JSON index of every chunk's block offsets
+    and decode parameters, then the index position and the magic again, so a
+    reader can fetch any chunk of any series without scanning the file.
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.index = {'chunk_rows': chunk_rows, 'series': {}}
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+
+    def write_series(self, key, frame):
+        """Append one series; its rows are split into chunks of chunk_rows"""
+        columns = list(frame.columns)
+        arrays = [frame[name].to_numpy() for name in columns]
+        chunks = []
+        for start in range(0, len(frame), self.chunk_rows):
+            blocks = []
+            for values in arrays:
+                meta, data = encode_column(values[start:start + self.chunk_rows])
+                meta['offset'] = self._file.tell()
+                meta['length'] = len(data)
+                self._file.write(data)
+                blocks.append(meta)
+            chunks.append({'rows': min(self.chunk_rows, len(frame) - start), 'columns': blocks})
+        self.index['series'][str(key)] = {'columns': columns, 'rows': len(frame), 'chunks': chunks}
+
+    def close(self):
+        index = json.dumps(self.index).encode('utf-8')
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_FOOTER.pack(len(index), offset, MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SeriesReader:
+    """Random access to the series and chunks of a file written by SeriesWriter"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compressed history file")
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            length, offset, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is truncated")
+            f.seek(offset)
+            self.index = json.loads(f.read(length))
+        self.series = self.index['series']
+
+    def keys(self):
+        return list(self.series)
+
+    def num_chunks(self, key):
+        return len(self.series[str(key)]['chunks'])
+
+    def read_chunk(self, key, chunk, columns=None):
+        """One chunk of a series as a DataFrame, reading only the requested columns"""
+        series = self.series[str(key)]
+        entry = series['chunks'][chunk]
+        with open(self.path, 'rb') as f:
+            return self._decode_chunk(f, series, entry, columns)
+
+    def iter_chunks(self, key, columns=None):
+        """Yield a series chunk by chunk"""
+        series = self.series[str(key)]
+        with open(self.path, 'rb') as f:
+            for entry in series['chunks']:
+                yield self._decode_chunk(f, series, entry, columns)
+
+    def read_series(self, key, columns=None):
+        """A whole series as one DataFrame"""
+        series = self.series[str(key)]
+        names = [name for name in series['columns'] if columns is None or name in columns]
+        if not series['chunks']:
+            return pd.DataFrame(columns=names)
+
+        parts = {name: [] for name in names}
+        with open(self.path, 'rb') as f:
+            for entry in series['chunks']:
+                for name, meta in zip(series['columns'], entry['columns']):
+                    if name in parts:
+                        f.seek(meta['offset'])
+                        parts[name].append(decode_column(meta, f.read(meta['length']), entry['rows']))
+        return pd.DataFrame({name: values[0] if len(values) == 1 else np.concatenate(values)
+                             for name, values in parts.items()}, copy=False)
+
+    def _decode_chunk(self, f, series, entry, columns):
+        wanted = set(columns) if columns is not None else None
+        decoded = {}
+        for name, meta in zip(series['columns'], entry['columns']):
+            if wanted is not None and name not in wanted:
+                continue
+            f.seek(meta['offset'])
+            decoded[name] = decode_column(meta, f.read(meta['length']), entry['rows'])
+        return pd.DataFrame(decoded, copy=False)
+
+def write_frame(path, frame, chunk_rows=CHUNK_ROWS):
+    """Write a single frame as a one-series file"""
+    with SeriesWriter(path, chunk_rows) as writer:
+        writer.write_series('0', frame)
+
+def read_frame(path):
+    """Read a file written by write_frame"""
+    return SeriesReader(path).read_series('0')
@@ -48,6 +48,17 @@ const plantApi = {
     }
   },
 
+  // Get newest reading and health of many plants without running models
+  getPlantsOverview: async (params = {}) => {
+    try {
+      const response = await axios.get(`${BASE_URL}/plants/overview`, { params });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching plants overview:', error);
+      throw error;
+    }
+  },
+
   // Send sensor reading (could be used to simulate IoT devices)
   sendSensorReading: async (sensorData) => {
     try {